@@ -311,6 +311,10 @@ class TerminalApplication(GOApplication):
         # So we can keep track and avoid sending unnecessary messages:
         self.titles = {}
         self.em_dimensions = None
+        # Used to apply only the last of a burst of resize() calls:
+        self.resize_timeout = None
+        self.resize_term = None
+        self.resize_ctrl_l = False
         GOApplication.__init__(self, ws)
 
     def initialize(self):
@@ -505,6 +509,9 @@ class TerminalApplication(GOApplication):
         # Remove all attached callbacks so we're not wasting memory/CPU on
         # disconnected clients
         user = self.current_user
+        if self.resize_timeout:
+            tornado.ioloop.IOLoop.instance().remove_timeout(self.resize_timeout)
+            self.resize_timeout = None
         if not hasattr(self.ws, 'location'):
             return # Connection closed before authentication completed
         if self.ws.location in SESSIONS[self.ws.session]['locations']:
@@ -518,6 +525,9 @@ class TerminalApplication(GOApplication):
                         term_emulator = multiplex.term
                         term_emulator.remove_all_callbacks(self.callback_id)
                         # Remove anything associated with the client_id
+                        term_emulator.remove_scrollback_reader(
+                            self.ws.client_id)
+                        multiplex.prev_output.pop(self.ws.client_id, None)
                         multiplex.io_loop.remove_timeout(
                             client_dict['refresh_timeout'])
                         del self.loc_terms[term][self.ws.client_id]
@@ -636,7 +646,12 @@ class TerminalApplication(GOApplication):
             debug=debug,
             syslog=syslog_logging,
             syslog_facility=facility,
-            syslog_host=self.settings['syslog_host']
+            syslog_host=self.settings['syslog_host'],
+            scrollback_lines=policies.get('scrollback_lines', None),
+            output_rate=policies.get('output_rate', None),
+            user_output_rate=policies.get('user_output_rate', None),
+            contiguous_screen=policies.get('contiguous_screen', False),
+            reflow=policies.get('reflow', False)
         )
         if self.plugin_new_multiplex_hooks:
             for func in self.plugin_new_multiplex_hooks:
@@ -1101,8 +1116,7 @@ class TerminalApplication(GOApplication):
                 'termupdate': {
                     'term': term,
                     'scrollback': scrollback,
-                    'screen' : screen,
-                    'ratelimiter': multiplex.ratelimiter_engaged
+                    'screen' : screen
                 }
             }
             try:
@@ -1186,6 +1200,10 @@ class TerminalApplication(GOApplication):
         Example *resize_obj*::
 
             {'rows': 24, 'cols': 80}
+
+        Browsers fire lots of resize events while a window is being dragged so
+        the terminals don't actually get resized until no more resize() calls
+        have come in for 100ms (see :meth:`TerminalApplication._resize`).
         """
         logging.debug("resize(%s)" % repr(resize_obj))
         term = None
@@ -1207,6 +1225,26 @@ class TerminalApplication(GOApplication):
             # Fall back to a standard default:
             self.rows = 24
             self.cols = 80
+        io_loop = tornado.ioloop.IOLoop.instance()
+        if self.resize_timeout:
+            io_loop.remove_timeout(self.resize_timeout)
+            if term != self.resize_term:
+                term = None # More than one terminal changed; resize them all
+            # Don't lose a Ctrl-L that was asked for earlier in the burst:
+            ctrl_l = ctrl_l or self.resize_ctrl_l
+        self.resize_term = term
+        self.resize_ctrl_l = ctrl_l
+        self.resize_timeout = io_loop.add_timeout(
+            timedelta(milliseconds=100), partial(self._resize, term, ctrl_l))
+
+    def _resize(self, term, ctrl_l):
+        """
+        Resizes *term* (or all terminals if *term* is None) to the most recent
+        dimensions given to :meth:`TerminalApplication.resize`.
+        """
+        self.resize_timeout = None
+        self.resize_term = None
+        self.resize_ctrl_l = False
         # If the user already has a running session, set the new terminal size:
         try:
             if term:
@@ -1223,7 +1261,8 @@ class TerminalApplication(GOApplication):
                         self.loc_terms[term]['multiplex'].resize(
                             self.rows,
                             self.cols,
-                            self.em_dimensions
+                            self.em_dimensions,
+                            ctrl_l=ctrl_l
                         )
         except KeyError: # Session doesn't exist yet, no biggie
             pass
@@ -1842,6 +1881,8 @@ def init(settings):
                 "file.\n"))
             s.write(new_term_settings)
     term_settings = settings['*']['terminal']
+    # Output budget (bytes/sec) shared by all terminals (see termio.py)
+    termio.OUTPUT_SCHEDULER.rate = term_settings.get('output_rate_total', None)
     if options.kill:
         from utils import killall
         go_settings = settings['*']['gateone']
@@ -66,6 +66,8 @@ class HTMLOutput(terminal.FileType):
       "(?i)<\/?\w+((\s+\w+(\s*=\s*(?:\".*?\"|'.*?'|[^'\">\s]+))?)+\s*|\s*)\/?>")
     re_header = re.compile('.*\x90;HTML\|', re.DOTALL)
     re_capture = re.compile('(\x90;HTML\|.+?\x90)', re.DOTALL)
+    signature = '\x90;HTML|'
+    terminator = '\x90'
     # Why have a tag whitelist?  So programs like 'wall' don't enable XSS
     # exploits.
     tag_whitelist = set([
@@ -861,16 +861,12 @@ go.Base.update(GateOne.Terminal, {
             v = go.Visual,
             prefix = go.prefs.prefix,
             term = termUpdateObj['term'],
-            ratelimiter = termUpdateObj['ratelimiter'],
             scrollback = go.Terminal.terminals[term]['scrollback'],
             textTransforms = go.Terminal.textTransforms,
             checkBackspace = null,
             message = null;
 //         logDebug('GateOne.Utils.updateTerminalAction() termUpdateObj: ' + u.items(termUpdateObj));
         logDebug("screen length: " + termUpdateObj['screen'].length);
-        if (ratelimiter) {
-            v.displayMessage("WARNING: The rate limiter was engaged on terminal " + term + ".  Output will be severely slowed until you press a key (e.g. Ctrl-C).");
-        }
         if (go.Input.sentBackspace) {
             checkBackspace = go.Terminal.terminals[term]['backspace'];
             go.Input.sentBackspace = false; // Prevent a potential race condition
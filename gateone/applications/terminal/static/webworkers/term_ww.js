@@ -75,7 +75,6 @@ var processScreen = function(scrollback, termUpdateObj, prefs, textTransforms, c
     var term = termUpdateObj['term'],
         screen = [],
         incoming_scrollback = termUpdateObj['scrollback'],
-        rateLimiter = termUpdateObj['ratelimiter'],
         backspace = "",
         outputObj = {'term': term};
     // If there's no scrollback buffer, try filling it with what was preserved in localStorage
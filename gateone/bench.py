@@ -0,0 +1,483 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#       Copyright 2011 Liftoff Software Corporation
+#
+
+# Meta
+__version__ = '1.0'
+__license__ = "AGPLv3 or Proprietary (see LICENSE.txt)"
+__version_info__ = (1, 0)
+__author__ = 'Dan McDougall <daniel.mcdougall@liftoffsoftware.com>'
+
+__doc__ = """\
+.. _bench:
+
+Benchmarks
+==========
+Feeds terminal output through Gate One's terminal emulator and measures how
+fast it goes.  To view usage information, run it with the --help switch:
+
+.. ansi-block::
+
+    \x1b[1;31mroot\x1b[0m@host\x1b[1;34m:/opt/gateone $\x1b[0m python -m bench --help
+    Usage:  python -m bench [options] terminal [workload.golog|directory ...]
+
+Each workload is a Gate One log (.golog) which gets replayed frame by frame
+through :meth:`terminal.Terminal.write` (a frame is whatever the terminal
+program managed to output in one go so the chunk sizes are realistic).  After
+every frame :meth:`terminal.Terminal.dump_html` is called just like it would be
+when a client gets updated.  For each workload the following gets reported:
+
+    * Throughput (MB/s) of :meth:`~terminal.Terminal.write` (including decoding).
+    * The 50th, 90th, and 99th percentile (and max) latency of
+      :meth:`~terminal.Terminal.dump_html` in milliseconds.
+    * The peak memory (resident set size) of the process in KB.  Every workload
+      gets run in its own process (unless --no-fork is given) so they don't
+      affect each other.
+
+If no workloads are given a set of built-in ones are generated (ls with
+colors, top, vim editing, a 256-color test, a large cat, and image output).
+They can be saved as .golog files (--record) to be replayed later or recorded
+for real using Gate One's session logging.
+
+Use --json to get the results as JSON so they can be saved and compared between
+commits:
+
+.. ansi-block::
+
+    \x1b[1;31mroot\x1b[0m@host\x1b[1;34m:/opt/gateone $\x1b[0m python -m bench --json terminal > before.json
+    \x1b[1;31mroot\x1b[0m@host\x1b[1;34m:/opt/gateone $\x1b[0m # ...make some changes...
+    \x1b[1;31mroot\x1b[0m@host\x1b[1;34m:/opt/gateone $\x1b[0m python -m bench --compare before.json terminal
+
+.. note:: Gate One isn't installed as a Python package so this needs to be run from within the directory containing terminal.py (where `python -m bench` and `python bench.py` both work).
+
+Class Docstrings
+================
+"""
+
+# Import stdlib stuff
+import os, sys, gzip, time, json, math, random, struct, zlib, logging
+import platform
+from optparse import OptionParser
+
+# Globals
+SEPARATOR = u"\U000f0f0f" # The character used to separate frames in the log
+BENCHMARKS = {} # Filled in below (name: function)
+
+def read_golog(golog_path):
+    """
+    Returns the frames in the .golog at *golog_path* as a list of
+    `(timestamp, bytes)` tuples.  The metadata frame (if present) is skipped.
+    """
+    encoded_separator = SEPARATOR.encode('UTF-8')
+    with open(golog_path, 'rb') as f:
+        data = gzip.GzipFile(fileobj=f).read()
+    frames = []
+    for frame in data.split(encoded_separator):
+        if len(frame) < 14:
+            continue # Empty (e.g. the last one)
+        stream = frame[14:] # Skips the timestamp and the colon
+        if not frames and stream.startswith(b'{'):
+            try:
+                json.loads(stream.decode('UTF-8'))
+                continue # Metadata
+            except ValueError:
+                pass # Just terminal output that happens to look like JSON
+        frames.append((int(frame[:13]), stream))
+    return frames
+
+def write_golog(golog_path, frames, rows=24, cols=80):
+    """
+    Saves *frames* (a list of `(timestamp, bytes)` tuples) as a .golog at
+    *golog_path* (in the same format :class:`termio.BaseMultiplex` uses).
+    """
+    import golog
+    start = frames[0][0] if frames else int(time.time() * 1000)
+    metadata = {
+        'version': golog.VERSION,
+        'rows': rows,
+        'cols': cols,
+        'start_date': str(start),
+        'end_date': str(frames[-1][0] if frames else start),
+    }
+    with open(golog_path, 'wb') as f:
+        writer = golog.BlockWriter(f)
+        writer.write_block([
+            str(start).encode('UTF-8') + b":" +
+            json.dumps(metadata).encode('UTF-8') + golog.ENCODED_SEPARATOR])
+        writer.write_frames(
+            str(timestamp).encode('UTF-8') + b":" + stream
+            for timestamp, stream in frames)
+        writer.finish()
+
+def _chunked(data, size=4096, start=1356998400000, interval=10):
+    """
+    Splits *data* into *size*-byte frames (like reads from a pty) with
+    timestamps starting at *start* and *interval* milliseconds apart.
+    """
+    return [(start + i * interval, data[pos:pos+size])
+        for i, pos in enumerate(xrange(0, len(data), size))]
+
+def _ls_workload(rand):
+    """Colorized `ls` output."""
+    colors = ['01;34', '01;32', '00', '01;36', '40;33;01', '01;35']
+    out = []
+    for i in xrange(2000):
+        for j in xrange(4):
+            name = 'file_%d_%d%s' % (i, j, rand.choice(['', '.txt', '.tar.gz']))
+            out.append('\x1b[%sm%s\x1b[0m  ' % (rand.choice(colors), name))
+        out.append('\r\n')
+    return _chunked(''.join(out))
+
+def _top_workload(rand):
+    """Full screen redraws of `top` (one frame per screen)."""
+    frames = []
+    for frame in xrange(300):
+        out = ['\x1b[H\x1b[7m  PID USER      PR  NI  VIRT  RES  SHR S  %CPU '
+               '%MEM     TIME+ COMMAND\x1b[m\x1b[K\r\n']
+        for row in xrange(22):
+            out.append(
+                '%5d root      20   0 %5d %4d %4d S %5.1f %4.1f %9s '
+                '\x1b[1m%s\x1b[m\x1b[K\r\n' % (
+                rand.randint(1, 30000), rand.randint(0, 99999),
+                rand.randint(0, 9999), rand.randint(0, 999),
+                rand.random() * 100, rand.random() * 100,
+                '0:00.%02d' % rand.randint(0, 99),
+                rand.choice(['bash', 'python', 'top'])))
+        out.append('\x1b[J')
+        frames.append((1356998400000 + frame * 1000, ''.join(out)))
+    return frames
+
+def _vim_workload(rand):
+    """Editing a file in vim (lots of small updates in the alternate screen)."""
+    frames = [(1356998400000, '\x1b[?1049h\x1b[1;24r\x1b[H\x1b[2J' + ''.join(
+        '\x1b[%d;1H\x1b[94m~\x1b[0m\x1b[K' % (i + 2) for i in xrange(23)))]
+    keywords = ['def', 'class', 'return', 'import', 'if', 'else']
+    for k in xrange(3000):
+        y, x = rand.randint(1, 23), rand.randint(1, 60)
+        op = rand.randint(0, 5)
+        out = '\x1b[%d;%dH' % (y, x)
+        if op == 0:
+            out += '\x1b[L' # Insert a line
+        elif op == 1:
+            out += '\x1b[M' # Delete a line
+        elif op == 2:
+            out += '\x1b[K'
+        elif op == 3:
+            out += '\x1b[%dP' % rand.randint(1, 5)
+        out += '\x1b[1m\x1b[38;5;208m%s\x1b[0m %s_%d \x1b[38;5;70m# %d\x1b[0m' % (
+            rand.choice(keywords), 'name', k, k)
+        out += '\x1b[24;1H-- INSERT --\x1b[24;60H%d,%d' % (y, x)
+        frames.append((1356998400000 + (k + 1) * 50, out))
+    frames.append((1356998400000 + 3002 * 50, '\x1b[?1049l'))
+    return frames
+
+def _colors256_workload(rand):
+    """A 256-color test (lots of rendition changes)."""
+    out = []
+    for repeat in xrange(20):
+        for color in xrange(256):
+            out.append('\x1b[48;5;%dm  \x1b[38;5;%dm%3d' % (
+                color, 255 - color, color))
+            if color % 16 == 15:
+                out.append('\x1b[0m\r\n')
+        out.append('\x1b[0m\r\n')
+    return _chunked(''.join(out))
+
+def _cat_workload(rand):
+    """`cat` of a large (~4MB) plain text file."""
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', '{', '}',
+        'self.foo', '=', '(', ')', '\t', 'return', '# comment']
+    out = []
+    size = 0
+    while size < 4 * 1024 * 1024:
+        line = ' '.join(
+            rand.choice(words) for i in xrange(rand.randint(0, 30))) + '\r\n'
+        out.append(line)
+        size += len(line)
+    return _chunked(''.join(out))
+
+def _png(width, height):
+    """Returns a *width* by *height* gradient as a PNG (no PIL required)."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    rows = ''.join(
+        '\x00' + ''.join(chr((x + y) & 0xff) * 3 for x in xrange(width))
+        for y in xrange(height))
+    return ('\x89PNG\r\n\x1a\n' +
+        chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+        chunk('IDAT', zlib.compress(rows)) + chunk('IEND', ''))
+
+def _image_workload(rand):
+    """Images being cat'd to the terminal (in between some regular output)."""
+    out = []
+    for i in xrange(20):
+        out.append('$ cat image%d.png\r\n' % i)
+        out.append(_png(rand.randint(64, 512), rand.randint(64, 512)))
+        out.append('\r\n')
+    return _chunked(''.join(out))
+
+WORKLOADS = [ # (name, generator) in the order they get run
+    ('ls', _ls_workload),
+    ('top', _top_workload),
+    ('vim', _vim_workload),
+    ('colors256', _colors256_workload),
+    ('cat', _cat_workload),
+    ('image', _image_workload),
+]
+
+def builtin_workloads(names=None, seed=0):
+    """
+    Returns the built-in workloads as a list of `(name, frames)` tuples.  If
+    *names* is given only those workloads will be generated.
+    """
+    workloads = []
+    for name, generator in WORKLOADS:
+        if names and name not in names:
+            continue
+        workloads.append((name, generator(random.Random(seed))))
+    return workloads
+
+def find_workloads(paths):
+    """
+    Returns the .golog files in *paths* (files or directories) as a list of
+    `(name, frames)` tuples.
+    """
+    golog_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            golog_paths.extend(sorted(
+                os.path.join(path, f) for f in os.listdir(path)
+                if f.endswith('.golog')))
+        else:
+            golog_paths.append(path)
+    return [(os.path.basename(path).rsplit('.golog', 1)[0], read_golog(path))
+        for path in golog_paths]
+
+def percentile(values, percent):
+    """
+    Returns the *percent* (0-100) percentile of *values* (nearest-rank).
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+def peak_memory():
+    """
+    Returns the peak resident set size of this process in KB (or None if it
+    can't be determined on this platform).
+    """
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024 # Reported in bytes on OS X
+    return peak
+
+def run_terminal_workload(frames, rows=24, cols=80, repeat=1, **kwargs):
+    """
+    Replays *frames* through a new :class:`terminal.Terminal` (*rows* by *cols*
+    plus any *kwargs*) *repeat* times and returns a dict of results.  The
+    fastest run is the one that gets reported.
+    """
+    import terminal
+    total = sum(len(stream) for timestamp, stream in frames)
+    best = None
+    for i in xrange(repeat):
+        term = terminal.Terminal(rows, cols, **kwargs)
+        write_time = 0.0
+        latencies = []
+        timer = time.time
+        for timestamp, stream in frames:
+            start = timer()
+            term.write(stream)
+            middle = timer()
+            term.dump_html()
+            latencies.append((timer() - middle) * 1000)
+            write_time += middle - start
+        term.close_captured_fds()
+        if best is None or write_time < best[0]:
+            best = (write_time, latencies)
+    write_time, latencies = best
+    return {
+        'bytes': total,
+        'frames': len(frames),
+        'write_seconds': round(write_time, 4),
+        'mb_per_sec': round(total / max(write_time, 1e-9) / 1048576, 3),
+        'dump_html_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies or [0]), 3),
+        },
+        'peak_memory_kb': peak_memory(),
+    }
+
+def _run_forked(conn, func, args, kwargs):
+    """
+    Used by :func:`run_isolated` to call *func* in a child process and send the
+    result back over *conn*.
+    """
+    logging.disable(logging.CRITICAL)
+    try:
+        conn.send(func(*args, **kwargs))
+    except Exception as e:
+        conn.send({'error': repr(e)})
+    conn.close()
+
+def run_isolated(func, *args, **kwargs):
+    """
+    Calls *func* with the given arguments in a separate process (so that peak
+    memory usage can be measured independently) and returns the result.
+    """
+    from multiprocessing import Process, Pipe
+    parent_conn, child_conn = Pipe(duplex=False)
+    process = Process(
+        target=_run_forked, args=(child_conn, func, args, kwargs))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+def bench_terminal(workloads, options):
+    """
+    Runs the terminal emulator benchmark on *workloads* (a list of
+    `(name, frames)` tuples) and returns the results as a dict.
+    """
+    results = {}
+    kwargs = {
+        'rows': options.rows,
+        'cols': options.cols,
+        'repeat': options.repeat,
+    }
+    if options.contiguous:
+        kwargs['contiguous_screen'] = True
+    for name, frames in workloads:
+        if options.fork:
+            results[name] = run_isolated(
+                run_terminal_workload, frames, **kwargs)
+        else:
+            results[name] = run_terminal_workload(frames, **kwargs)
+    return results
+BENCHMARKS['terminal'] = bench_terminal
+
+def git_revision():
+    """
+    Returns the current git commit (if we're in a git checkout) or None.
+    """
+    import subprocess
+    try:
+        revision = subprocess.Popen(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).communicate()[0].strip()
+    except OSError:
+        return None
+    return revision or None
+
+def format_results(results, baseline=None):
+    """
+    Returns *results* as a human-readable table.  If *baseline* (previously
+    saved results) is given the change in throughput and latency is included.
+    """
+    lines = ["%-12s %10s %9s %9s %9s %9s %12s" % (
+        'workload', 'MB/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'peak KB')]
+    for name in sorted(results):
+        result = results[name]
+        if 'error' in result:
+            lines.append("%-12s ERROR: %s" % (name, result['error']))
+            continue
+        latency = result['dump_html_ms']
+        lines.append("%-12s %10.2f %9.3f %9.3f %9.3f %9.3f %12s" % (
+            name, result['mb_per_sec'], latency['p50'], latency['p90'],
+            latency['p99'], latency['max'], result['peak_memory_kb']))
+        if baseline and name in baseline and 'error' not in baseline[name]:
+            before = baseline[name]
+            def change(new, old):
+                if not old:
+                    return '      n/a'
+                return '%+8.1f%%' % ((new - old) * 100.0 / old)
+            lines.append("%-12s %10s %9s %9s %9s %9s" % ('  vs. before',
+                change(result['mb_per_sec'], before['mb_per_sec']).strip(),
+                change(latency['p50'], before['dump_html_ms']['p50']),
+                change(latency['p90'], before['dump_html_ms']['p90']),
+                change(latency['p99'], before['dump_html_ms']['p99']),
+                change(latency['max'], before['dump_html_ms']['max'])))
+    return "\n".join(lines)
+
+def main(args=None):
+    """Parse command line arguments and run the requested benchmark."""
+    usage = ('\tpython -m bench [options] terminal '
+             '[workload.golog|directory ...]')
+    parser = OptionParser(usage=usage, version=__version__)
+    parser.disable_interspersed_args()
+    parser.add_option("--rows", dest="rows", default=24, type="int",
+        help="Number of rows in the terminal.  Default: 24")
+    parser.add_option("--cols", dest="cols", default=80, type="int",
+        help="Number of columns in the terminal.  Default: 80")
+    parser.add_option("-r", "--repeat", dest="repeat", default=3, type="int",
+        help="Run each workload this many times and report the fastest run. "
+             "Default: 3")
+    parser.add_option("-w", "--workload", dest="names", action="append",
+        default=[],
+        help="Only run the given built-in workload (can be given more than "
+             "once).  Choices: %s" % ", ".join(name for name, g in WORKLOADS))
+    parser.add_option("--contiguous", dest="contiguous", default=False,
+        action="store_true",
+        help="Use a contiguous screen buffer (contiguous_screen=True).")
+    parser.add_option("--no-fork", dest="fork", default=True,
+        action="store_false",
+        help="Run everything in this process (peak memory will be "
+             "cumulative).")
+    parser.add_option("--json", dest="json", default=False,
+        action="store_true", help="Output the results as JSON.")
+    parser.add_option("--compare", dest="compare", default=None,
+        metavar="FILE",
+        help="Compare the results to those saved (via --json) in FILE.")
+    parser.add_option("--record", dest="record", default=None,
+        metavar="DIR",
+        help="Save the built-in workloads as .golog files in DIR and exit.")
+    (options, args) = parser.parse_args(args)
+    if options.record:
+        for name, frames in builtin_workloads(options.names):
+            write_golog(os.path.join(options.record, '%s.golog' % name),
+                frames, options.rows, options.cols)
+        return 0
+    if not args or args[0] not in BENCHMARKS:
+        print("ERROR: You must specify a benchmark to run (%s)." %
+            ", ".join(sorted(BENCHMARKS)))
+        parser.print_help()
+        return 1
+    logging.disable(logging.CRITICAL) # Warnings would mess up the output
+    if args[1:]:
+        workloads = find_workloads(args[1:])
+    else:
+        workloads = builtin_workloads(options.names)
+    results = BENCHMARKS[args[0]](workloads, options)
+    if options.json:
+        print(json.dumps({
+            'benchmark': args[0],
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'rows': options.rows,
+            'cols': options.cols,
+            'results': results,
+        }, indent=4, sort_keys=True))
+    else:
+        baseline = None
+        if options.compare:
+            with open(options.compare) as f:
+                baseline = json.load(f)['results']
+        print(format_results(results, baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
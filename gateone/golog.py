@@ -0,0 +1,518 @@
+# -*- coding: utf-8 -*-
+#
+#       Copyright 2011 Liftoff Software Corporation
+#
+# For license information see LICENSE.txt
+
+# Meta
+__version__ = '1.0'
+__version_info__ = (1, 0)
+__license__ = "AGPLv3 or Proprietary (see LICENSE.txt)"
+__author__ = 'Dan McDougall <daniel.mcdougall@liftoffsoftware.com>'
+
+__doc__ = """\
+Reading and writing Gate One logs (.golog) with random access.
+
+Version 1.0 logs are a single gzip stream of frames which means the only way to
+get to a given frame (or the end of the log) is to decompress everything that
+comes before it.  Version 2.0 logs are made up of *blocks* instead:  Each block
+is an independently compressed gzip member holding about :data:`BLOCK_SIZE`
+bytes worth of (complete) frames.  The first block only ever holds the metadata
+frame so it can be read (and replaced) without touching the rest of the log.
+
+After the last block comes the index:  A list of `(offset, first frame number,
+first timestamp)` entries (one per block) so that finding a frame by number or
+by time means decompressing exactly one block.  The index is stored in the
+"extra" field of empty gzip members followed by a fixed-size footer member that
+says where the index starts.  Because gzip allows any number of members in a
+file (and readers skip the extra field) a version 2.0 log is still a perfectly
+valid gzip file containing the exact same frames as its version 1.0 equivalent.
+`gzip.open()` (and zcat) will read either one just fine.
+
+Logs without an index (version 1.0 logs and logs that are still being written)
+can still be read with :class:`Golog`; the index just gets rebuilt (by
+decompressing the whole thing) when they're opened.  The last block of a log
+that is still being written is usually unfinished (see :meth:`BlockWriter.add`)
+but everything in it up to the last flush can be read anyway.
+"""
+
+# Import stdlib stuff
+import gzip, zlib, struct, shutil
+from bisect import bisect_right
+
+# Globals
+SEPARATOR = u"\U000f0f0f" # The character used to separate frames in the log
+ENCODED_SEPARATOR = SEPARATOR.encode('UTF-8')
+VERSION = u"2.0" # Goes in the metadata frame of logs written by this module
+BLOCK_SIZE = 65536 # How many bytes of frames (roughly) go into each block
+INDEX_ID = b"GI" # Subfield ID of the extra field holding index entries
+FOOTER_ID = b"GF" # Subfield ID of the extra field holding the footer
+# Index entries:  Offset of the block, number of its first frame, and the
+# timestamp of its first frame.
+INDEX_ENTRY = struct.Struct(">QQQ")
+# The footer:  Offset of the index, number of blocks, and total frames.
+FOOTER = struct.Struct(">QQQ")
+# Each gzip extra field can only hold 65535 bytes (including the subfield
+# header)
+MAX_ENTRIES = (65535 - 4) // INDEX_ENTRY.size
+# The header of a gzip member with an extra field:  Magic, deflate, FEXTRA, no
+# mtime, no extra flags, unknown OS.
+MEMBER_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff"
+# Compressed nothing (an empty deflate stream) followed by its CRC and size
+EMPTY_DEFLATE = b"\x03\x00" + struct.pack("<II", 0, 0)
+FOOTER_MEMBER_SIZE = (
+    len(MEMBER_HEADER) + 2 + 4 + FOOTER.size + len(EMPTY_DEFLATE))
+
+def timestamp(frame):
+    """
+    Returns the timestamp (milliseconds since the epoch) of *frame* as an int
+    (0 if it doesn't have one).
+    """
+    try:
+        return int(frame[:13])
+    except ValueError:
+        return 0
+
+def compress_block(data):
+    """
+    Returns *data* compressed as a complete (standalone) gzip member.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def _extra_member(subfield_id, data):
+    """
+    Returns an empty gzip member with *data* stored in its extra field (in a
+    subfield identified by *subfield_id*).
+    """
+    extra = subfield_id + struct.pack("<H", len(data)) + data
+    return MEMBER_HEADER + struct.pack("<H", len(extra)) + extra + EMPTY_DEFLATE
+
+def _read_extra(f):
+    """
+    Reads the empty gzip member (as written by :func:`_extra_member`) at the
+    current position of *f* and returns `(subfield_id, data)`.  Returns `None`
+    if it isn't one of ours.
+    """
+    header = f.read(len(MEMBER_HEADER) + 2)
+    if len(header) != len(MEMBER_HEADER) + 2:
+        return None
+    if header[:4] != MEMBER_HEADER[:4]:
+        return None
+    extra_length = struct.unpack("<H", header[-2:])[0]
+    extra = f.read(extra_length)
+    if f.read(len(EMPTY_DEFLATE)) != EMPTY_DEFLATE or len(extra) < 4:
+        return None
+    data_length = struct.unpack("<H", extra[2:4])[0]
+    if data_length != extra_length - 4:
+        return None
+    return (extra[:2], extra[4:])
+
+def read_trailer(f):
+    """
+    Reads the index at the end of the (version 2.0) golog open as *f* and
+    returns `(index, frames, end)` where *index* is a list of `(offset, first
+    frame number, first timestamp)` tuples (one per block), *frames* is the
+    total number of frames in the log, and *end* is where the last block ends.
+
+    Returns `None` if the log doesn't have an index (e.g. it's a version 1.0
+    log or it is still being written).
+    """
+    f.seek(0, 2)
+    size = f.tell()
+    if size < FOOTER_MEMBER_SIZE:
+        return None
+    f.seek(size - FOOTER_MEMBER_SIZE)
+    footer = _read_extra(f)
+    if not footer or footer[0] != FOOTER_ID or len(footer[1]) != FOOTER.size:
+        return None
+    end, blocks, frames = FOOTER.unpack(footer[1])
+    if end > size - FOOTER_MEMBER_SIZE:
+        return None
+    f.seek(end)
+    index = []
+    while f.tell() < size - FOOTER_MEMBER_SIZE:
+        member = _read_extra(f)
+        if not member or member[0] != INDEX_ID:
+            return None
+        data = member[1]
+        for pos in range(0, len(data), INDEX_ENTRY.size):
+            index.append(INDEX_ENTRY.unpack(data[pos:pos+INDEX_ENTRY.size]))
+    if len(index) != blocks:
+        return None
+    return (index, frames, end)
+
+def scan_index(f, chunk_size=131072):
+    """
+    Builds the index of the golog open as *f* the hard way:  By decompressing
+    every gzip member in it and counting the frames.  Returns `(index, frames,
+    end)` just like :func:`read_trailer`.
+
+    If the last block is unfinished (the log is still being written or it got
+    cut off) it is included in *index* (and its complete frames in *frames*)
+    but *end* is where the last *complete* block ends.
+
+    A version 1.0 log is a single gzip member so it winds up as a single block.
+    Raises `IOError` if the log is corrupt.
+    """
+    f.seek(0)
+    index = []
+    frames = 0
+    end = 0
+    offset = 0 # Where in the file we are (compressed)
+    decompressor = None
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        while chunk:
+            if not decompressor:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                start = offset
+                head = b"" # Enough of the first frame to get its timestamp
+                tail = b"" # In case the separator gets split between chunks
+                count = 0
+                empty = True
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise IOError("Corrupt golog: %s" % e)
+            if data:
+                empty = False
+                if len(head) < 13:
+                    head = (head + data)[:13]
+                data = tail + data
+                count += data.count(ENCODED_SEPARATOR)
+                tail = data[-(len(ENCODED_SEPARATOR) - 1):]
+            remainder = decompressor.unused_data
+            offset += len(chunk) - len(remainder)
+            chunk = remainder
+            if remainder: # End of this member
+                decompressor = None
+                if not empty: # Empty members are just the old index
+                    index.append((start, frames, timestamp(head)))
+                    frames += count
+                    end = offset
+    if decompressor and not empty: # The last block (may still be growing)
+        index.append((start, frames, timestamp(head)))
+        frames += count
+        if _member_complete(decompressor):
+            end = offset
+    return (index, frames, end)
+
+def _member_complete(decompressor):
+    """
+    Returns True if *decompressor* (a `zlib.decompressobj`) has reached the end
+    of the gzip member it was given.
+    """
+    # Anything given to a decompressor after the end of its member winds up in
+    # unused_data (there's no decompressobj.eof in Python 2)
+    probe = decompressor.copy()
+    try:
+        probe.decompress(b"\x00")
+    except zlib.error:
+        return False
+    return bool(probe.unused_data)
+
+def iter_frames(golog_path, chunk_size=131072):
+    """
+    A generator that iterates over the frames in the golog at *golog_path*
+    (any version) from start to finish, returning them as strings (without
+    separators).
+    """
+    golog = gzip.open(golog_path)
+    frame = b""
+    try:
+        while True:
+            chunk = golog.read(chunk_size)
+            frame += chunk
+            if ENCODED_SEPARATOR in chunk:
+                split_frames = frame.split(ENCODED_SEPARATOR)
+                next_frame = split_frames[-1]
+                for fr in split_frames[:-1]:
+                    yield fr
+                frame = next_frame
+            if len(chunk) < chunk_size:
+                # Write last frame
+                if frame:
+                    yield frame
+                break
+    finally:
+        golog.close()
+
+class BlockWriter(object):
+    """
+    Writes blocks of frames to *f* (a file object open for writing) in the
+    version 2.0 format.  If *f* already holds some blocks their *index* and
+    number of *frames* should be given (and *f* positioned where the last one
+    ends) so new blocks can be added to them (see :meth:`resume`).
+
+    The index doesn't get written until :meth:`finish` is called.
+    """
+    def __init__(self, f, index=None, frames=0):
+        self.file = f
+        self.index = index or []
+        self.frames = frames
+        self.compressor = None # The unfinished block (see add())
+        self.block_size = 0 # Bytes of frames in the unfinished block
+
+    @classmethod
+    def resume(cls, f):
+        """
+        Returns a BlockWriter that adds blocks to the golog open (for reading
+        and writing) as *f*.  Its index gets removed (:meth:`finish` writes a
+        new one) and if its last block is unfinished (e.g. Gate One was killed
+        while writing it) that block gets replaced with the complete frames it
+        holds (in a new unfinished block).
+        """
+        trailer = read_trailer(f)
+        salvaged = []
+        if trailer:
+            index, frames, end = trailer
+        else:
+            index, frames, end = scan_index(f)
+            if index and index[-1][0] >= end: # Last block is unfinished
+                offset, frames, when = index.pop()
+                f.seek(offset)
+                data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+                    f.read())
+                # Whatever comes after the last separator is incomplete
+                salvaged = [
+                    frame + ENCODED_SEPARATOR
+                    for frame in data.split(ENCODED_SEPARATOR)[:-1]]
+        f.seek(end)
+        f.truncate()
+        writer = cls(f, index, frames)
+        writer.add(salvaged)
+        return writer
+
+    def add(self, frames, block_size=BLOCK_SIZE):
+        """
+        Adds *frames* (a list of frames with their separators) to the
+        unfinished block (starting a new one if there isn't one) and finishes
+        it once it holds at least *block_size* bytes.  An unfinished block
+        always gets flushed (see `zlib.Z_SYNC_FLUSH`) so all of its frames can
+        be read back even if it never gets finished.
+
+        This is for adding frames a few at a time (e.g. as they come in) while
+        still ending up with blocks of about *block_size* bytes.
+        """
+        if not frames:
+            return
+        if not self.compressor:
+            self.index.append(
+                (self.file.tell(), self.frames, timestamp(frames[0])))
+            self.compressor = zlib.compressobj(
+                9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.block_size = 0
+        data = b"".join(frames)
+        self.file.write(self.compressor.compress(data))
+        self.frames += len(frames)
+        self.block_size += len(data)
+        if self.block_size >= block_size:
+            self.end_block()
+        else:
+            self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def end_block(self):
+        """
+        Finishes the block started by :meth:`add` (if there is one).
+        """
+        if self.compressor:
+            self.file.write(self.compressor.flush())
+            self.compressor = None
+
+    def write_block(self, frames):
+        """
+        Writes *frames* (a list of frames with their separators) as a single
+        block.
+        """
+        if not frames:
+            return
+        self.end_block()
+        self.index.append(
+            (self.file.tell(), self.frames, timestamp(frames[0])))
+        self.file.write(compress_block(b"".join(frames)))
+        self.frames += len(frames)
+
+    def write_frames(self, frames, block_size=BLOCK_SIZE):
+        """
+        Writes *frames* (an iterable of frames without their separators) as
+        however many blocks of about *block_size* bytes it takes.
+        """
+        block = []
+        size = 0
+        for frame in frames:
+            block.append(frame + ENCODED_SEPARATOR)
+            size += len(block[-1])
+            if size >= block_size:
+                self.write_block(block)
+                block = []
+                size = 0
+        self.write_block(block)
+
+    def finish(self):
+        """
+        Writes the index (and the footer pointing to it) after the last block.
+        """
+        self.end_block()
+        end = self.file.tell()
+        for pos in range(0, len(self.index), MAX_ENTRIES):
+            entries = self.index[pos:pos+MAX_ENTRIES]
+            self.file.write(_extra_member(INDEX_ID, b"".join(
+                INDEX_ENTRY.pack(*entry) for entry in entries)))
+        self.file.write(_extra_member(
+            FOOTER_ID, FOOTER.pack(end, len(self.index), self.frames)))
+
+def rewrite(golog_path, first_frame, replace=True):
+    """
+    Re-saves the golog at *golog_path* (any version) in the version 2.0 format
+    with *first_frame* (bytes, including the separator) as its first frame.  If
+    *replace* is True *first_frame* takes the place of the log's existing first
+    frame (i.e. the metadata).
+
+    If the log is already in the version 2.0 format only the first block gets
+    replaced; the rest get copied over without being decompressed.
+    """
+    temp_path = "%s.tmp" % golog_path
+    with open(golog_path, 'rb') as old:
+        trailer = read_trailer(old)
+        with open(temp_path, 'wb') as new:
+            writer = BlockWriter(new)
+            writer.write_block([first_frame])
+            if trailer and replace and len(trailer[0]) > 1 \
+                and trailer[0][1][1] == 1: # First block is just the metadata
+                index, frames, end = trailer
+                shift = new.tell() - index[1][0]
+                old.seek(index[1][0])
+                remaining = end - index[1][0]
+                while remaining:
+                    chunk = old.read(min(remaining, BLOCK_SIZE))
+                    if not chunk:
+                        raise IOError("%s is truncated" % golog_path)
+                    new.write(chunk)
+                    remaining -= len(chunk)
+                writer.index.extend(
+                    (offset + shift, number, when)
+                    for offset, number, when in index[1:])
+                writer.frames = frames
+            else:
+                frames = iter_frames(golog_path)
+                if replace:
+                    next(frames, None)
+                writer.write_frames(frames)
+            writer.finish()
+    shutil.move(temp_path, golog_path)
+
+class Golog(object):
+    """
+    Random access to the frames in the golog at *path* (any version).  Frames
+    are numbered from 0 (the metadata frame) and returned as strings without
+    their separators::
+
+        >>> golog = Golog('/path/to/some.golog')
+        >>> len(golog) # Total number of frames
+        1000
+        >>> golog.frame(500)
+        '1317344836086:\\r\\nPort [22]: '
+        >>> golog.frame_at(1317344836086) # Frame on screen at the given time
+        500
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            trailer = read_trailer(self.file)
+            self.indexed = bool(trailer)
+            if not trailer:
+                trailer = scan_index(self.file)
+        except IOError:
+            self.file.close()
+            raise
+        self.index, self.frames, self.end = trailer
+        self.numbers = [entry[1] for entry in self.index]
+        self.times = [entry[2] for entry in self.index]
+
+    def __len__(self):
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the golog.
+        """
+        self.file.close()
+
+    def block(self, number):
+        """
+        Returns the frames in block *number* as a list.
+        """
+        offset = self.index[number][0]
+        size = -1 # An unfinished last block goes all the way to the end
+        if number + 1 < len(self.index):
+            size = self.index[number + 1][0] - offset
+        elif self.end > offset:
+            size = self.end - offset
+        self.file.seek(offset)
+        try:
+            data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+                self.file.read(size))
+        except zlib.error as e:
+            raise IOError("Block %s of %s is corrupt: %s" % (
+                number, self.path, e))
+        frames = data.split(ENCODED_SEPARATOR)
+        if not frames[-1]:
+            frames.pop() # Nothing after the last separator
+        return frames
+
+    def find_block(self, number):
+        """
+        Returns the number of the block containing frame *number*.
+        """
+        return max(0, bisect_right(self.numbers, number) - 1)
+
+    def frame(self, number):
+        """
+        Returns frame *number*.  Raises `IndexError` if there's no such frame.
+        """
+        if number < 0:
+            number += self.frames
+        if not self.index or not 0 <= number < self.frames:
+            raise IndexError("Frame %s is out of range" % number)
+        block = self.find_block(number)
+        return self.block(block)[number - self.numbers[block]]
+
+    def frame_at(self, when):
+        """
+        Returns the number of the frame that was the latest one at *when*
+        (milliseconds since the epoch).
+        """
+        if not self.index:
+            raise IndexError("%s has no frames" % self.path)
+        block = max(0, bisect_right(self.times, when) - 1)
+        number = self.numbers[block]
+        for i, frame in enumerate(self.block(block)):
+            if i and timestamp(frame) > when:
+                break
+            number = self.numbers[block] + i
+        return number
+
+    def iter_frames(self, start=0):
+        """
+        A generator that iterates over the frames in the log starting at frame
+        number *start* (only decompressing from the block containing it).
+        """
+        if not self.index:
+            return
+        first = self.find_block(start)
+        for block in range(first, len(self.index)):
+            frames = self.block(block)
+            if block == first:
+                frames = frames[start - self.numbers[block]:]
+            for frame in frames:
+                yield frame
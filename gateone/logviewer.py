@@ -11,13 +11,14 @@ __version_info__ = (1, 0)
 __author__ = 'Dan McDougall <daniel.mcdougall@liftoffsoftware.com>'
 
 # Import stdlib stuff
-import os, sys, re, gzip, fcntl, termios, struct
+import os, sys, re, fcntl, termios, struct
 from time import sleep
 from datetime import datetime
 from optparse import OptionParser
 
 # Import our own stuff
 from utils import raw
+from golog import Golog, iter_frames, read_trailer
 from gateone import PLUGINS
 
 # 3rd party imports
@@ -80,7 +81,12 @@ Here are two example .golog frames demonstrating the format::
 
     1317344834868:\\x1b[H\\x1b[2JHost/IP or SSH URL [localhost]: <U+F0F0F>1317344836086:\\r\\nPort [22]: <U+F0F0F>
 
-Gate One logs can be opened, decoded, and parsed in Python fairly easily::
+Version 2.0 logs store the frames in independently compressed blocks (gzip
+members) of about 64KB each followed by an index of those blocks so that any
+frame can be found (by number or by time) without having to decompress the
+whole log.  See :mod:`golog` for the details and :class:`golog.Golog` for a
+convenient way to read them.  Since concatenated gzip members are still gzip,
+both versions can be opened, decoded, and parsed in Python fairly easily::
 
     import gzip
     golog = gzip.open(path_to_golog).read()
@@ -104,28 +110,26 @@ RE_TITLE_SEQ = re.compile(
     r'.*\x1b\][0-2]\;(.+?)(\x07|\x1b\\)', re.DOTALL|re.MULTILINE)
 
 # TODO: Support Fast forward/rewind/pause like Gate One itself.
-def get_frames(golog_path, chunk_size=131072):
+def get_frames(golog_path, chunk_size=131072, start=0):
     """
     A generator that iterates over the frames in a .golog file, returning them
     as strings.
+
+    If *start* is given frames before that frame number will be skipped.  If
+    the log has an index (version 2.0 logs) only the block containing that
+    frame and the ones after it get decompressed.
     """
-    encoded_separator = SEPARATOR.encode('UTF-8')
-    golog = gzip.open(golog_path)
-    frame = ""
-    while True:
-        chunk = golog.read(chunk_size)
-        frame += chunk
-        if encoded_separator in chunk:
-            split_frames = frame.split(encoded_separator)
-            next_frame = split_frames[-1]
-            for fr in split_frames[:-1]:
-                yield fr
-            frame = next_frame
-        if len(chunk) < chunk_size:
-            # Write last frame
-            if frame:
-                yield frame
-            break
+    if start:
+        with open(golog_path, 'rb') as f:
+            indexed = read_trailer(f)
+        if indexed:
+            with Golog(golog_path) as log:
+                for frame in log.iter_frames(start):
+                    yield frame
+            return
+    for i, frame in enumerate(iter_frames(golog_path, chunk_size)):
+        if i >= start:
+            yield frame
 
 def playback_log(log_path, file_like, show_esc=False):
     """
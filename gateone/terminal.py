@@ -128,8 +128,16 @@ The Terminal class implements a scrollback buffer.  Here's how it works:
 Whenever a :meth:`Terminal.scroll_up` event occurs, the line (or lines) that
 will be removed from the top of the screen will be placed into
 :attr:`Terminal.scrollback_buf`. Then whenever :meth:`Terminal.dump_html` is
-called the scrollback buffer will be returned along with the screen output and
-reset to an empty state.
+called the lines that were added to the scrollback buffer since the last call
+will be returned along with the screen output.
+
+The scrollback buffer is a ring buffer that holds the last
+:attr:`Terminal.scrollback_lines` lines (see
+:meth:`Terminal.set_scrollback_lines`).  Each client (the *client_id* passed to
+:meth:`Terminal.dump_html`) gets its own read position so a client that
+connects to an existing terminal will receive the recent history and multiple
+clients viewing the same terminal will each get every line.  Lines only get
+converted to HTML the first time a client asks for them.
 
 Why do this?  In the event that a very large :meth:`Terminal.write` occurs (e.g.
 'ps aux'), it gives the controlling program the ability to capture what went
@@ -139,8 +147,6 @@ past the screen without some fancy tracking logic surrounding
 More information about how this works can be had by looking at the
 :meth:`Terminal.dump_html` function itself.
 
-.. note:: There's more than one function that empties :attr:`Terminal.scrollback_buf` when called.  You'll just have to have a look around =)
-
 Class Docstrings
 ================
 """
@@ -149,7 +155,7 @@ Class Docstrings
 import os, sys, re, logging, base64, StringIO, codecs, unicodedata, tempfile
 from array import array
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
 try:
     from collections import OrderedDict
 except ImportError: # Python <2.7 didn't have OrderedDict in collections
@@ -162,7 +168,10 @@ except ImportError: # Python <2.7 didn't have OrderedDict in collections
         logging.error(
             "...or download it from http://pypi.python.org/pypi/ordereddict")
         sys.exit(1)
-from itertools import imap, izip
+from itertools import imap, izip, islice, chain
+
+# Import our own stuff
+from widths import char_width, FIRST as WIDTH_FIRST
 
 # Inernationalization support
 import gettext
@@ -292,6 +301,13 @@ for i in xrange(256):
     RENDITION_CLASSES[(i+10000)] = "bx%s" % i
 del i # Cleanup
 
+# Double-width characters take up two cells on the screen:  The character itself
+# and this placeholder (which gets left out of the output) to the right of it.
+# It's a Unicode noncharacter (reserved for internal use) that write() ignores
+# so it can't be mistaken for real output or for the NUL padding that
+# _set_rendition() adds to the end of rows.
+WIDE_PLACEHOLDER = u'\ufdd0'
+
 try:
     unichr(0x10000) # Will throw a ValueError on narrow Python builds
     SPECIAL = 1048576 # U+100000 or unichr(SPECIAL) (start of Plane 16)
@@ -580,7 +596,7 @@ def unicode_counter():
     while True:
         yield unichr(n)
         if n == 65535: # The end of unicode in narrow builds of Python
-            n = 0 # Reset
+            n = 1000 # Reset (but leave the lower characters alone)
         else:
             n += 1
 
@@ -624,6 +640,16 @@ class FileType(object):
     thumbnail = None
     html_template = "" # Must be overridden
     html_icon_template = "" # Must be overridden
+    # A fixed string that every file of this type starts with (e.g. '%PDF-').
+    # If set, the terminal only bothers checking re_header against output that
+    # contains it.  Otherwise re_header gets checked against all output.
+    signature = None
+    # A fixed string that every file of this type ends with (e.g. '%%EOF').
+    # If set, the terminal only searches newly-arrived output for it (instead
+    # of checking re_capture against everything captured so far).
+    terminator = None
+    # True while the file is being processed via Terminal.run_in_executor()
+    processing = False
     def __init__(self,
         name, mimetype, re_header, re_capture, suffix="", path="", linkpath="", icondir=None):
         """
@@ -694,18 +720,57 @@ class FileType(object):
         """
         Closes :attr:`self.file_obj`
         """
-        self.file_obj.close()
+        if self.file_obj:
+            self.file_obj.close()
+
+def thumbnail_size(size, max_size=(640, 480)):
+    """
+    Returns the (width, height) an image of the given *size* will have once it
+    has been shrunk to fit within *max_size* (preserving its aspect ratio) the
+    same way PIL's `Image.thumbnail()` does it.
+    """
+    width, height = size
+    if width > max_size[0]:
+        height = max(height * max_size[0] / width, 1)
+        width = max_size[0]
+    if height > max_size[1]:
+        width = max(width * max_size[1] / height, 1)
+        height = max_size[1]
+    return (width, height)
+
+def _thumbnail_image(data, max_size=(640, 480)):
+    """
+    Returns the image in *data* (a string) re-encoded in its original format
+    and shrunk to fit within *max_size* if it was larger.  This is the slow part
+    of capturing images so it gets called via :meth:`Terminal.run_in_executor`.
+    """
+    im = Image.open(StringIO.StringIO(data))
+    image_format = im.format
+    if im.size[0] > max_size[0] or im.size[1] > max_size[1]:
+        im.thumbnail(max_size, Image.ANTIALIAS)
+    out = StringIO.StringIO()
+    im.save(out, image_format)
+    return out.getvalue()
 
 class ImageFile(FileType):
     """
     A subclass of :class:`FileType` for images (specifically to override
     :meth:`self.html` and :meth:`self.capture`).
     """
+    # Images bigger than this (in bytes) get linked to via self.linkpath (if
+    # set) instead of being included in the HTML as a data::URI:
+    max_inline_size = 65536
+    linkpath = ""
+    html_cache = None # Output of self.html() (reset whenever the file changes)
     def capture(self, data, term_instance):
         """
         Captures the image contained within *data*.  Will use *term_instance*
         to make room for the image in the terminal screen.
 
+        Decoding and thumbnailing the image happens via
+        :meth:`Terminal.run_in_executor` so if *term_instance* has an executor
+        :meth:`self.html` will return a placeholder until it's done.
+
         .. note::  Unlike :class:`FileType`, *term_instance* is mandatory.
         """
         logging.debug('ImageFile.capture()')
@@ -714,24 +779,21 @@ class ImageFile(FileType):
         if Image: # PIL is loaded--try to guess how many lines the image takes
             i = StringIO.StringIO(data)
             try:
-                im = Image.open(i)
+                im = Image.open(i) # Only reads the header (fast)
             except IOError:
                 # i.e. PIL couldn't identify the file
                 logging.error(_("PIL couldn't process the image"))
                 return # Don't do anything--bad image
         else: # No PIL means no images.  Don't bother wasting memory.
             return
-        # Resize the image to be small enough to fit within a typical terminal
-        if im.size[0] > 640 or im.size[1] > 480:
-            im.thumbnail((640, 480), Image.ANTIALIAS)
+        # The image will be resized to fit within a typical terminal
+        width, height = thumbnail_size(im.size)
         # Get the current image location and reference so we can move it around
         img_Y = term_instance.cursorY
         img_X = term_instance.cursorX
         ref = term_instance.screen[img_Y][img_X]
         if term_instance.em_dimensions:
             # Make sure the image will fit properly in the screen
-            width = im.size[0]
-            height = im.size[1]
             if height <= term_instance.em_dimensions['height']:
                 # Fits within a line.  No need for a newline
                 num_chars = int(width/term_instance.em_dimensions['width'])
@@ -775,9 +837,21 @@ class ImageFile(FileType):
                     self.file_obj = open(self.path, 'rb+')
         else:
             self.file_obj = tempfile.TemporaryFile()
-        try:
-            im.save(self.file_obj, im.format)
-        except IOError:
+        self.processing = True
+        term_instance.run_in_executor(
+            ref, self._save_image, _thumbnail_image, data)
+        return self.file_obj
+
+    def _save_image(self, image):
+        """
+        Writes *image* (the result of :func:`_thumbnail_image`) to
+        :attr:`self.file_obj`.  If *image* is None (processing failed)
+        :attr:`self.file_obj` will be closed instead.
+        """
+        self.processing = False
+        if not self.file_obj or self.file_obj.closed:
+            return # No longer on the screen so it got closed in the meantime
+        if image is None:
             # PIL was compiled without (complete) support for this format
             logging.error(_(
                 "PIL is missing support for this image type (%s).  You probably"
@@ -785,34 +859,55 @@ class ImageFile(FileType):
                 "it with 'pip install --upgrade PIL' or 'pip install "
                 "--upgrade Pillow'" % self.name))
             self.file_obj.close() # Can't do anything with it
-            return None
+            self.file_obj = None
+            return
+        self.file_obj.write(image)
         self.file_obj.flush()
         self.file_obj.seek(0) # Go back to the start
-        return self.file_obj
+        self.html_cache = None
 
     def html(self):
         """
         Returns :attr:`self.file_obj` as an <img> tag with the src set to a
-        data::URI.
+        data::URI.  While the image is still being processed a placeholder is
+        returned instead.
+
+        If the image is larger than :attr:`self.max_inline_size` and can be
+        downloaded via :attr:`self.linkpath` the src will be set to that URL
+        instead.
+
+        The result is cached in :attr:`self.html_cache` since this gets called
+        every time a line containing the image is rendered.
         """
+        if self.processing:
+            return u"<i>%s</i>" % _("Processing image...")
         if not self.file_obj:
             return u""
+        if self.html_cache:
+            return self.html_cache
         self.file_obj.seek(0)
         try:
             im = Image.open(self.file_obj)
         except IOError:
             # i.e. PIL couldn't identify the file
             return u"<i>Error displaying image</i>"
+        size = os.fstat(self.file_obj.fileno()).st_size
+        if (size > self.max_inline_size and self.linkpath
+            and os.path.isfile(self.path)):
+            src = "%s/%s" % (self.linkpath, os.path.split(self.path)[1])
+        else:
+            self.file_obj.seek(0)
+            # Need to encode base64 to create a data URI
+            encoded = base64.b64encode(self.file_obj.read())
+            src = "data:image/%s;base64,%s" % (im.format.lower(), encoded)
         self.file_obj.seek(0)
-        # Need to encode base64 to create a data URI
-        encoded = base64.b64encode(self.file_obj.read())
-        data_uri = "data:image/%s;base64,%s" % (
-            im.format.lower(), encoded)
         if self.thumbnail:
-            return self.html_icon_template.format(
-                src=data_uri, width=im.size[0], height=im.size[1])
-        return self.html_template.format(
-            src=data_uri, width=im.size[0], height=im.size[1])
+            self.html_cache = self.html_icon_template.format(
+                src=src, width=im.size[0], height=im.size[1])
+        else:
+            self.html_cache = self.html_template.format(
+                src=src, width=im.size[0], height=im.size[1])
+        return self.html_cache
 
 class PNGFile(ImageFile):
     """
@@ -824,13 +919,17 @@ class PNGFile(ImageFile):
     suffix = ".png"
     re_header = re.compile('.*\x89PNG\r', re.DOTALL)
     re_capture = re.compile('(\x89PNG\r.+IEND\xaeB`\x82)', re.DOTALL)
+    signature = '\x89PNG\r'
+    terminator = 'IEND\xaeB`\x82'
     html_template = '<img src="{src}" width="{width}" height="{height}">'
 
-    def __init__(self, path="", **kwargs):
+    def __init__(self, path="", linkpath="", **kwargs):
         """
         **path:** (optional) The path to a file or directory where the file should be stored.  If *path* is a directory a random filename will be chosen.
+        **linkpath:** (optional) The path to use when linking to large images in HTML output.
         """
         self.path = path
+        self.linkpath = linkpath
         self.file_obj = None
         # Images will be displayed inline so no icons unless overridden:
         self.html_icon_template = self.html_template
@@ -848,12 +947,16 @@ class JPEGFile(ImageFile):
     re_capture = re.compile(
         '(\xff\xd8\xff.+\xff\xd9)', re.DOTALL
     )
+    signature = '\xff\xd8\xff'
+    terminator = '\xff\xd9'
     html_template = '<img src="{src}" width="{width}" height="{height}">'
-    def __init__(self, path="", **kwargs):
+    def __init__(self, path="", linkpath="", **kwargs):
         """
         **path:** (optional) The path to a file or directory where the file should be stored.  If *path* is a directory a random filename will be chosen.
+        **linkpath:** (optional) The path to use when linking to large images in HTML output.
         """
         self.path = path
+        self.linkpath = linkpath
         self.file_obj = None
         # Images will be displayed inline so no icons unless overridden:
         self.html_icon_template = self.html_template
@@ -871,6 +974,8 @@ class PDFFile(FileType):
     suffix = ".pdf"
     re_header = re.compile(r'.*%PDF-[0-9]\.[0-9]{1,2}.+?obj', re.DOTALL)
     re_capture = re.compile(r'(%PDF-[0-9]\.[0-9]{1,2}.+%%EOF)', re.DOTALL)
+    signature = '%PDF-'
+    terminator = '%%EOF'
     icon = "pdf.svg" # Name of the file inside of self.icondir
     # NOTE:  Using two separate links below so the whitespace doesn't end up
     # underlined.  Looks much nicer this way.
@@ -961,20 +1066,23 @@ class PDFFile(FileType):
             self.path = self.file_obj.name
         self.file_obj.write(data)
         self.file_obj.flush()
-        # Ghostscript-based thumbnail generation disabled due to its slow,
-        # blocking nature.  Works great though!
-        #self.thumbnail = self.generate_thumbnail()
-        # TODO: Figure out a way to do non-blocking thumbnail generation
+        ref = term_instance.screen[term_instance.cursorY][term_instance.cursorX]
+        if term_instance.executor:
+            # Ghostscript-based thumbnail generation is too slow to perform
+            # inside of write() but works great in the background.  The icon
+            # (below) will be displayed until it's done.
+            self.processing = True
+            term_instance.run_in_executor(
+                ref, self._save_thumbnail, self.generate_thumbnail)
         if self.icondir:
             pdf_icon = os.path.join(self.icondir, self.icon)
             if os.path.exists(pdf_icon):
                 with open(pdf_icon) as f:
                     self.thumbnail = f.read()
-        if self.thumbnail:
+        if self.thumbnail or self.processing:
             # Make room for our link
             img_Y = term_instance.cursorY
             img_X = term_instance.cursorX
-            ref = term_instance.screen[img_Y][img_X]
             term_instance.screen[img_Y][img_X] = u' ' # No longer at this loc
             if term_instance.cursorY < 8: # Icons are about ~8 newlines high
                 for line in xrange(8 - term_instance.cursorY):
@@ -990,6 +1098,15 @@ class PDFFile(FileType):
         # Leave it open
         return self.file_obj
 
+    def _save_thumbnail(self, thumbnail):
+        """
+        Replaces :attr:`self.thumbnail` with *thumbnail* (the result of
+        :meth:`self.generate_thumbnail`) if one could be generated.
+        """
+        self.processing = False
+        if thumbnail:
+            self.thumbnail = thumbnail
+
     def html(self):
         """
         Returns a link to download the PDF using :attr:`self.linkpath` for the
@@ -1004,6 +1121,254 @@ class PDFFile(FileType):
         return self.html_template.format(
             link=link, icon=self.thumbnail, name=self.name)
 
+class ScreenRow(object):
+    """
+    A fixed-width view of a single row inside a :class:`ScreenBuffer`.  It
+    behaves like the `array('u')` rows that :class:`Terminal` normally uses
+    (e.g. `row[x]`, `row[x:y] = some_array`, `row.tounicode()`) but reads and
+    writes go straight to the buffer that contains it.
+
+    Since rows can't change their width :meth:`ScreenRow.pop` fills the cell it
+    vacates at the end of the row with the buffer's fill character and
+    :meth:`ScreenRow.append` does nothing.
+    """
+    __slots__ = ('buffer', 'offset')
+
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+
+    def __len__(self):
+        return self.buffer.cols
+
+    def _index(self, i):
+        """
+        Returns the position of column *i* inside of the buffer's data.
+        """
+        cols = self.buffer.cols
+        if i < 0:
+            i += cols
+        if not 0 <= i < cols:
+            raise IndexError("ScreenRow index out of range")
+        return self.offset + i
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.buffer.cols)
+            if step == 1:
+                offset = self.offset
+                return self.buffer.data[offset+start:offset+max(start, stop)]
+            return self.toarray()[key]
+        return self.buffer.data[self._index(key)]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.buffer.cols)
+            stop = max(start, stop)
+            if step != 1 or len(value) != stop - start:
+                raise ValueError("ScreenRow slices can't change the width")
+            offset = self.offset
+            self.buffer.data[offset+start:offset+stop] = value
+        else:
+            self.buffer.data[self._index(key)] = value
+
+    def __iter__(self):
+        return iter(self.toarray())
+
+    def __contains__(self, char):
+        return char in self.tounicode()
+
+    def __repr__(self):
+        return "ScreenRow(%r)" % self.tounicode()
+
+    def toarray(self):
+        """
+        Returns a copy of this row as an `array('u')`.
+        """
+        offset = self.offset
+        return self.buffer.data[offset:offset+self.buffer.cols]
+
+    def tounicode(self):
+        """
+        Returns this row as a unicode string (just like `array.tounicode()`).
+        """
+        return self.toarray().tounicode()
+
+    def pop(self, i=-1):
+        """
+        Removes and returns the character at column *i*, shifting everything to
+        the right of it one column to the left.
+        """
+        data = self.buffer.data
+        start = self._index(i)
+        end = self.offset + self.buffer.cols
+        char = data[start]
+        data[start:end-1] = data[start+1:end]
+        data[end-1] = self.buffer.fill
+        return char
+
+    def insert(self, i, char):
+        """
+        Inserts *char* at column *i*, shifting everything to the right of it
+        one column to the right (the last character falls off the end).
+        """
+        data = self.buffer.data
+        cols = self.buffer.cols
+        i = min(max(i + cols if i < 0 else i, 0), cols - 1)
+        start = self.offset + i
+        end = self.offset + cols
+        data[start+1:end] = data[start:end-1]
+        data[start] = char
+
+    def append(self, char):
+        """
+        Does nothing since rows have a fixed width.  See the class docstring.
+        """
+        pass
+
+class ScreenBuffer(object):
+    """
+    An alternative to the list of `array('u')` rows that :class:`Terminal`
+    uses to store its screen and renditions.  All the rows are stored in a
+    single contiguous `array('u')` (:attr:`ScreenBuffer.data`) and
+    :attr:`ScreenBuffer.rows` keeps track of where each row starts inside of
+    it.  Scrolling (see :meth:`ScreenBuffer.rotate`) just shuffles that table
+    around and blanks out the rows that come into view; no new rows get
+    allocated.
+
+    Indexing works just like it does with a list of arrays (`screen[y][x]`).
+    Each row is a :class:`ScreenRow`.  Slicing returns a new
+    :class:`ScreenBuffer` containing copies of the rows.
+
+    .. note:: :class:`Terminal` only uses this if *contiguous_screen* is True.
+    """
+    def __init__(self, rows, cols, fill=u' '):
+        self.cols = cols
+        self.fill = fill
+        self.data = array('u', fill * (rows * cols))
+        self.rows = [ScreenRow(self, y * cols) for y in xrange(rows)]
+        self.free = [] # Offsets of rows that have been pop()'d
+        self.blank = array('u', fill * cols) # Used to clear rows
+
+    @classmethod
+    def from_rows(cls, rows, cols, fill=u' '):
+        """
+        Returns a new :class:`ScreenBuffer` that is *cols* wide containing
+        copies of *rows* (arrays or :class:`ScreenRow` objects).  Rows that are
+        too short will be padded with *fill* and rows that are too long will be
+        truncated.
+        """
+        buf = cls(len(rows), cols, fill)
+        for y, row in enumerate(rows):
+            buf[y] = row
+        return buf
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ScreenBuffer.from_rows(self.rows[key], self.cols, self.fill)
+        return self.rows[key]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            rows = self.rows[key]
+            if len(rows) != len(value):
+                raise ValueError(
+                    "Can't change the number of rows in a ScreenBuffer slice")
+            for row, line in izip(rows, value):
+                self._fill_row(row, line)
+        else:
+            self._fill_row(self.rows[key], value)
+
+    def _fill_row(self, row, line):
+        """
+        Copies *line* into *row*, padding or truncating it as necessary.
+        """
+        cols = self.cols
+        if isinstance(line, ScreenRow):
+            line = line.toarray()
+        if len(line) != cols:
+            line = array('u', line[:cols])
+            line.fromunicode(self.fill * (cols - len(line)))
+        self.data[row.offset:row.offset+cols] = line
+
+    def _new_row(self):
+        """
+        Returns a blank :class:`ScreenRow` using a previously freed slot in
+        :attr:`self.data` if there is one.
+        """
+        if self.free:
+            row = ScreenRow(self, self.free.pop())
+        else:
+            row = ScreenRow(self, len(self.data))
+            self.data.fromunicode(self.fill * self.cols)
+        return row
+
+    def pop(self, y=-1):
+        """
+        Removes row *y* and returns a copy of it (as an `array('u')`).
+        """
+        row = self.rows.pop(y)
+        self.free.append(row.offset)
+        return row.toarray()
+
+    def insert(self, y, line):
+        """
+        Inserts a copy of *line* before row *y*.
+        """
+        row = self._new_row()
+        self._fill_row(row, line)
+        self.rows.insert(y, row)
+
+    def append(self, line):
+        """
+        Adds a copy of *line* to the bottom.
+        """
+        self.insert(len(self.rows), line)
+
+    def rotate(self, top, bottom, n):
+        """
+        Moves the rows between *top* and *bottom* (inclusive) up by *n* rows
+        (down if *n* is negative).  The rows that get moved off of one end of
+        that region are cleared and brought back in on the other end.
+        """
+        region = self.rows[top:bottom+1]
+        n = max(-len(region), min(n, len(region)))
+        if not n:
+            return
+        region = region[n:] + region[:n]
+        self.rows[top:bottom+1] = region
+        if n > 0:
+            cleared = region[-n:]
+        else:
+            cleared = region[:-n]
+        cols = self.cols
+        blank = self.blank
+        data = self.data
+        for row in cleared:
+            data[row.offset:row.offset+cols] = blank
+
+    def set_cols(self, cols):
+        """
+        Changes the width of every row to *cols*, truncating or padding each
+        row with :attr:`self.fill` as necessary.
+        """
+        if cols == self.cols:
+            return
+        rows = [row.toarray() for row in self.rows]
+        self.cols = cols
+        self.data = array('u', self.fill * (len(rows) * cols))
+        self.rows = [ScreenRow(self, y * cols) for y in xrange(len(rows))]
+        self.free = []
+        self.blank = array('u', self.fill * cols)
+        for row, line in izip(self.rows, rows):
+            self._fill_row(row, line)
+
 class NotFoundError(Exception):
     """
     Raised by :meth:`Terminal.remove_magic` if a given filetype was not found in
@@ -1032,6 +1397,15 @@ class Terminal(object):
     ASCII_ESC = 27    # Escape
     ASCII_CSI = 155   # Control Sequence Introducer (that nothing uses)
     ASCII_HTS = 210   # Horizontal Tab Stop (HTS)
+    # Escape sequence parser states (see http://vt100.net/emu/dec_ansi_parser)
+    STATE_GROUND = 0            # Regular characters
+    STATE_ESCAPE = 1            # Got an ESC
+    STATE_ESCAPE_INTERMEDIATE = 2 # Got an ESC and an intermediate (e.g. ESC ( )
+    STATE_CSI = 3               # Collecting CSI parameters and intermediates
+    STATE_CSI_IGNORE = 4        # Malformed CSI; ignore up to the final char
+    STATE_OSC = 5               # Operating System Command string
+    STATE_DCS = 6               # Device Control String
+    STATE_IGNORE_STRING = 7     # SOS, PM, and APC strings (ignored)
 
     charsets = {
         'B': {}, # Default is USA (aka 'B')
@@ -1071,16 +1445,41 @@ class Terminal(object):
         }
     }
 
-    RE_CSI_ESC_SEQ = re.compile(r'\x1B\[([?A-Za-z0-9>;@:\!]*)([A-Za-z@_])')
-    RE_ESC_SEQ = re.compile(r'\x1b(.*\x1b\\|[ABCDEFGHIJKLMNOQRSTUVWXYZa-z0-9=<>]|[()# %*+].)')
-    RE_TITLE_SEQ = re.compile(r'\x1b\][0-2]\;(.*?)(\x07|\x1b\\)')
-    # The below regex is used to match our optional (non-standard) handler
-    RE_OPT_SEQ = re.compile(r'\x1b\]_\;(.+?)(\x07|\x1b\\)')
+    # Matches CSI parameter characters (e.g. the '?1;2' in '\x1b[?1;2h')
+    RE_CSI_PARAMS = re.compile(u'[\x30-\x3f]+')
+    # Matches the characters that can end (or cancel) an OSC, DCS, SOS, PM, or
+    # APC string:  BEL, CAN, ESC (for ESC \), and the 8-bit ST.
+    RE_STRING_END = re.compile(u'[\x07\x18\x1b\x9c]')
+    # Matches runs of plain, printable characters that can be written to the
+    # screen in bulk.  None of these are in self.specials and none of them are
+    # combining characters (diacritics).
+    RE_PLAIN_RUN = re.compile(u'[\x20-\x7e\xa0-\u02ff\u2500-\u259f]+')
+    # Matches a (possibly empty) run of plain characters followed by a linefeed
+    # (with or without a carriage return).  Used to handle lots of lines at the
+    # bottom of the screen in bulk (see _write_lines()).
+    RE_PLAIN_LINE = re.compile(
+        u'([\x20-\x7e\xa0-\u02ff\u2500-\u259f]*)\r?\n')
+    # Matches runs of identical characters (e.g. rendition references)
+    RE_RUNS = re.compile(u'(.)\\1*', re.DOTALL)
+    # Matches the characters we use as references to captured files
+    RE_SPECIAL = re.compile(
+        u'[%s-%s]' % (unichr(SPECIAL), unichr(sys.maxunicode)))
     RE_NUMBERS = re.compile('\d*') # Matches any number
+    # How many (cur_rendition, SGR parameters) combinations to remember in
+    # self.rendition_cache
+    RENDITION_CACHE_SIZE = 1024
+    # Unreferenced renditions will be removed from self.renditions_store
+    # whenever it grows past this many (or twice as many as were in use the
+    # last time it was cleaned up, whichever is greater).
+    RENDITIONS_GC_THRESHOLD = 4096
+    # The default number of lines kept in the scrollback buffer (see
+    # set_scrollback_lines())
+    SCROLLBACK_LINES = 1000
     RE_SIGINT = re.compile('.*\^C', re.MULTILINE|re.DOTALL)
 
     def __init__(self, rows=24, cols=80, em_dimensions=None, temppath='/tmp',
-        linkpath='/tmp', icondir=None, encoding='utf-8', debug=False):
+        linkpath='/tmp', icondir=None, encoding='utf-8', debug=False,
+        contiguous_screen=False, reflow=False):
         """
         Initializes the terminal by calling *self.initialize(rows, cols)*.  This
         is so we can have an equivalent function in situations where __init__()
@@ -1129,6 +1528,15 @@ class Terminal(object):
         and the icon it is looking for happens to be available at *icondir*.
 
         If *debug* is True, the root logger will have its level set to DEBUG.
+
+        If *contiguous_screen* is True the screen and renditions will be stored
+        in a :class:`ScreenBuffer` (one contiguous array per screen) instead of
+        a list of arrays (one per row).  Scrolling won't allocate new rows that
+        way but accessing individual characters is a bit slower.
+
+        If *reflow* is True lines that were wrapped because they were too long
+        to fit on the screen will be re-wrapped to fit the new width when the
+        terminal is resized (see :meth:`Terminal.resize`).
         """
         if debug:
             logger = logging.getLogger()
@@ -1137,15 +1545,21 @@ class Terminal(object):
         self.linkpath = linkpath
         self.icondir = icondir
         self.encoding = encoding
+        self.contiguous_screen = contiguous_screen
+        self.reflow = reflow
         # This controls how often we send a message to the client when capturing
         # a special file type.  The default is to update the user of progress
         # once every 1.5 seconds.
         self.message_interval = timedelta(seconds=1.5)
         self.notified = False # Used to tell if we have notified the user before
         self.cancel_capture = False
-        # Used by cursor_left() and cursor_right() to handle double-width chars:
-        self.double_width_right = False
-        self.double_width_left = False
+        self.executor = None # See set_executor()
+        self.call_soon = None # See set_scheduler()
+        # Events waiting for the next flush_updates():
+        self.pending_events = set()
+        self.flush_scheduled = False
+        self.fd_check_scheduled = False # See _schedule_fd_check()
+        self.fast_forward = False # See set_fast_forward()
         self.initialize(rows, cols, em_dimensions)
 
     def initialize(self, rows=24, cols=80, em_dimensions=None):
@@ -1155,15 +1569,27 @@ class Terminal(object):
         self.cols = cols
         self.rows = rows
         self.em_dimensions = em_dimensions
-        self.scrollback_buf = []
-        self.scrollback_renditions = []
+        self.scrollback_lines = self.SCROLLBACK_LINES
+        # The total number of lines that have ever been added to the scrollback
+        # buffer.  Used to keep track of where each reader left off:
+        self.scrollback_total = 0
+        self.scrollback_readers = {} # Reader (client) ID: scrollback_total
+        self.init_scrollback()
         self.title = "Gate One"
         # This variable can be referenced by programs implementing Terminal() to
         # determine if anything has changed since the last dump*()
         self.modified = False
+        # Set by newline() whenever the screen gets scrolled up.  write() uses
+        # this to call CALLBACK_SCROLL_UP once per write instead of once per
+        # line.
+        self.scrolled = False
         self.local_echo = True
         self.insert_mode = False
-        self.esc_buffer = '' # For holding escape sequences as they're typed.
+        # Escape sequence parser state (see write())
+        self.esc_state = self.STATE_GROUND
+        self.esc_params = '' # e.g. '0;1;37' in '\x1b[0;1;37m'
+        self.esc_intermediate = '' # e.g. '(' in '\x1b(B'
+        self.esc_string = [] # Pieces of an OSC or DCS string
         self.show_cursor = True
         self.cursor_home = 0
         self.cur_rendition = unichr(1000) # Should always be reset ([0])
@@ -1179,6 +1605,7 @@ class Terminal(object):
         self.timeout_capture = None
         self.specials = {
             self.ASCII_NUL: self.__ignore,
+            ord(WIDE_PLACEHOLDER): self.__ignore,
             self.ASCII_BEL: self.bell,
             self.ASCII_BS: self.backspace,
             self.ASCII_HT: self.horizontal_tab,
@@ -1264,6 +1691,27 @@ class Terminal(object):
             #'t': self.window_manipulation, # TODO
             #'z': self.locator, # TODO: DECELR "Enable locator reporting"
         }
+        # Handlers for each escape sequence parser state.  They get called by
+        # write() with the incoming chars and the current position like so:
+        #   pos = self.esc_states[self.esc_state](chars, pos)
+        self.esc_states = {
+            self.STATE_ESCAPE: self._parse_escape,
+            self.STATE_ESCAPE_INTERMEDIATE: self._parse_escape_intermediate,
+            self.STATE_CSI: self._parse_csi,
+            self.STATE_CSI_IGNORE: self._parse_csi_ignore,
+            self.STATE_OSC: self._parse_string,
+            self.STATE_DCS: self._parse_string,
+            self.STATE_IGNORE_STRING: self._parse_string,
+        }
+        # Characters that follow an ESC and start a longer sequence
+        self.esc_transitions = {
+            '[': self.STATE_CSI,
+            ']': self.STATE_OSC,
+            'P': self.STATE_DCS,
+            'X': self.STATE_IGNORE_STRING, # Start of String (SOS)
+            '^': self.STATE_IGNORE_STRING, # Privacy Message (PM)
+            '_': self.STATE_IGNORE_STRING, # Application Program Command (APC)
+        }
         self.expanded_modes = {
             # Expanded modes take a True/False argument for set/reset
             '1': self.set_application_mode,
@@ -1334,6 +1782,10 @@ class Terminal(object):
         # magic_map is like magic except it is in the format of:
         #   'beginning': <filetype class>
         self.magic_map = {}
+        # These get (re)built by _build_magic_detector() whenever the supported
+        # magic changes:
+        self.magic_detector = None # Matches any FileType.signature
+        self.magic_signatures = [] # [(re_header, signature), ...] in order
         # Supported magic (defaults)
         self.add_magic(PDFFile)
         self.add_magic(PNGFile)
@@ -1347,6 +1799,7 @@ class Terminal(object):
         # an "alternate buffer"
         self.alt_screen = None
         self.alt_renditions = None
+        self.alt_wrapped_rows = {}
         self.autowrap = False
         self.alt_cursorX = 0
         self.alt_cursorY = 0
@@ -1354,7 +1807,10 @@ class Terminal(object):
         self.saved_cursorY = 0
         self.saved_rendition = [None]
         self.application_keys = False
-        self.capture = ""
+        # Output is spooled here while a file is being captured:
+        self.capture = bytearray()
+        # The (start, end) of the most recent re_capture match in self.capture
+        self.capture_match = None
         self.captured_files = {}
         self.file_counter = pua_counter()
         # This is for creating a new point of reference every time there's a new
@@ -1365,10 +1821,39 @@ class Terminal(object):
             u' ': [], # Nada, nothing, no rendition.  Not the same as below
             self.rend_counter.next(): [0] # Default is actually reset
         }
-        self.prev_dump = [] # A cache to speed things up
-        self.prev_dump_rend = [] # Ditto
-        self.html_cache = [] # Ditto
-        self.watcher = None # Placeholder for the file watcher thread (if used)
+        # The reverse of the above (tuple(renditions) -> reference char) so we
+        # don't have to search renditions_store for existing renditions:
+        self.renditions_index = dict(
+            (tuple(v), k) for k, v in self.renditions_store.items())
+        # Maps (self.cur_rendition, <SGR parameters>) to the resulting
+        # rendition reference for the most recently used combinations:
+        self.rendition_cache = OrderedDict()
+        # Reference chars that were freed by collect_renditions() (for reuse)
+        self.renditions_free = []
+        self.renditions_gc_threshold = self.RENDITIONS_GC_THRESHOLD
+        self.html_cache = [] # A cache to speed things up
+        # Maps (previous rendition ref, rendition ref) to the markup required
+        # to go from one to the other (e.g. '</span><span class="bold">'):
+        self.span_cache = {}
+        # Rows that need to be re-rendered by the next dump_html().  Every
+        # method that modifies self.screen or self.renditions adds to this.
+        self.dirty_rows = set()
+        self.cursor_row = None # The row the cursor was last rendered on
+        # The captured file references in each row of the screen (that has any)
+        # and in the saved screen (see close_captured_fds()):
+        self.screen_files = {}
+        self.alt_screen_files = set()
+        self.full_scan = None # The html_cache last seen by a full screen check
+        # Set once a double-width character gets written so we don't have to
+        # check for them (see _clear_wide()) until then:
+        self.wide_chars = False
+        # Plain-text copy of the screen (see dump_text()) and the rows of it
+        # that dump_html() found to be dirty since it was last brought up to
+        # date:
+        self.text_cache = []
+        self.text_rows = set()
+        self.text_scan = None # The html_cache last seen by a full text rebuild
+        self.text_dump = None # self.text_cache joined (None if out of date)
 
     def add_magic(self, filetype):
         """
@@ -1388,6 +1873,7 @@ class Terminal(object):
         # mean referencing filetypes that match the supported magic numbers.
         for Type in self.supported_magic:
             self.magic_map.update({Type.re_header: Type})
+        self._build_magic_detector()
 
     def remove_magic(self, filetype):
         """
@@ -1416,6 +1902,7 @@ class Terminal(object):
         self.supported_magic.remove(Type)
         del self.magic[Type.re_header]
         del self.magic_map[Type.re_header]
+        self._build_magic_detector()
 
     def update_magic(self, filetype, mimetype):
         """
@@ -1441,6 +1928,41 @@ class Terminal(object):
         self.magic_map.update({filetype.re_header: filetype})
         # Finally replace the existing filetype in supported_magic
         self.supported_magic[i] = filetype
+        self._build_magic_detector()
+
+    def _build_magic_detector(self):
+        """
+        Combines the signatures of everything in :attr:`self.supported_magic`
+        into a single regular expression (:attr:`self.magic_detector`) so that
+        :meth:`Terminal._detect_magic` can check incoming output for all of
+        them in a single pass.
+        """
+        self.magic_signatures = []
+        signatures = set()
+        for Type in self.supported_magic:
+            signature = getattr(Type, 'signature', None)
+            self.magic_signatures.append((Type.re_header, signature))
+            if signature:
+                signatures.add(re.escape(signature))
+        self.magic_detector = None
+        if signatures:
+            self.magic_detector = re.compile('|'.join(sorted(signatures)))
+
+    def _detect_magic(self, chars):
+        """
+        Returns the *re_header* of the first :class:`FileType` in
+        :attr:`self.supported_magic` that matches *chars* (a str) or None if
+        there's no match.  The regular expressions in :attr:`self.magic` only
+        get checked if the signature of their :class:`FileType` was found by
+        :attr:`self.magic_detector` (or if it doesn't have a signature).
+        """
+        found = ()
+        if self.magic_detector:
+            found = set(self.magic_detector.findall(chars))
+        for magic_header, signature in self.magic_signatures:
+            if signature is None or signature in found:
+                if magic_header.match(chars):
+                    return magic_header
 
     def init_screen(self):
         """
@@ -1450,16 +1972,19 @@ class Terminal(object):
         .. note:: Just because each line starts out with a uniform length does not mean it will stay that way.  Processing of escape sequences is handled when an output function is called.
         """
         logging.debug('init_screen()')
-        self.screen = [array('u', u' ' * self.cols) for a in xrange(self.rows)]
+        self.screen = self._new_screen(u' ')
+        # Rows that were wrapped onto the next row because they didn't fit (as
+        # opposed to ending with a newline) and how many of their columns were
+        # used (fewer than self.cols if a double-width character didn't fit in
+        # the last one).  Used when reflowing the screen:
+        self.wrapped_rows = {}
         # Tabstops
         self.tabstops = set(range(7, self.cols, 8))
         # Base cursor position
         self.cursorX = 0
         self.cursorY = 0
         self.rendition_set = False
-        self.prev_dump = [] # Force a full dump with an init
-        self.prev_dump_rend = []
-        self.html_cache = [] # Force this to be reset as well
+        self.html_cache = [] # Force a full dump with an init
 
     def init_renditions(self, rendition=unichr(1000)): # Match unicode_counter
         """
@@ -1468,16 +1993,110 @@ class Terminal(object):
         """
         logging.debug("init_renditions(%s)" % repr(rendition))
         # The actual renditions at various coordinates:
-        self.renditions = [
-            array('u', rendition * self.cols) for a in xrange(self.rows)]
+        self.renditions = self._new_screen(rendition)
+
+    def _new_screen(self, char):
+        """
+        Returns a new screen (:attr:`self.rows` by :attr:`self.cols`) filled
+        with *char*.  It will be a :class:`ScreenBuffer` if
+        :attr:`self.contiguous_screen` is True or a list of arrays otherwise.
+        """
+        if self.contiguous_screen:
+            return ScreenBuffer(self.rows, self.cols, char)
+        return [array('u', char * self.cols) for a in xrange(self.rows)]
 
     def init_scrollback(self):
         """
-        Empties the scrollback buffers (:attr:`self.scrollback_buf` and
-        :attr:`self.scrollback_renditions`).
+        Empties the scrollback buffers (:attr:`self.scrollback_buf`,
+        :attr:`self.scrollback_renditions`, and :attr:`self.scrollback_html`).
+
+        The scrollback buffers are ring buffers that hold the last
+        :attr:`self.scrollback_lines` lines that scrolled off the top of the
+        screen.  :attr:`self.scrollback_html` holds the HTML version of each
+        line once it has been rendered (False until then).
+        """
+        maxlen = self.scrollback_lines
+        self.scrollback_buf = deque(maxlen=maxlen)
+        self.scrollback_renditions = deque(maxlen=maxlen)
+        self.scrollback_html = deque(maxlen=maxlen)
+        # How many lines in the scrollback buffer reference each captured file
+        self.scrollback_files = {}
+
+    def set_scrollback_lines(self, lines):
+        """
+        Sets the number of lines that will be kept in the scrollback buffer to
+        *lines*.  The most recent lines will be preserved if the buffer is
+        shrunk.
+        """
+        lines = int(lines)
+        if lines == self.scrollback_lines:
+            return
+        self.scrollback_lines = lines
+        buf = self.scrollback_buf
+        renditions = self.scrollback_renditions
+        html = self.scrollback_html
+        self.init_scrollback()
+        self.scrollback_buf.extend(buf)
+        self.scrollback_renditions.extend(renditions)
+        self.scrollback_html.extend(html)
+        if self.captured_files:
+            self._count_file_refs(self.scrollback_buf, 1)
+
+    def _add_scrollback(self, lines, renditions):
+        """
+        Adds *lines* and their *renditions* (lists of arrays) to the end of the
+        scrollback buffer.  The oldest lines will be discarded if the buffer is
+        full.  Lines won't be converted to HTML until someone asks for them
+        (see :meth:`Terminal._spanify_scrollback`).
+        """
+        if self.captured_files:
+            self._count_file_refs(lines, 1)
+            discarded = (
+                len(self.scrollback_buf) + len(lines) - self.scrollback_lines)
+            if discarded > 0:
+                self._count_file_refs(
+                    islice(chain(self.scrollback_buf, lines), discarded), -1)
+        self.scrollback_buf.extend(lines)
+        self.scrollback_renditions.extend(renditions)
+        self.scrollback_html.extend([False] * len(lines)) # Not rendered yet
+        self.scrollback_total += len(lines)
+
+    def _count_file_refs(self, lines, n):
+        """
+        Adds *n* to the count in :attr:`self.scrollback_files` of every captured
+        file referenced in *lines* (e.g. -1 for lines leaving the scrollback
+        buffer).
+        """
+        scrollback_files = self.scrollback_files
+        find_refs = self.RE_SPECIAL.findall
+        for line in lines:
+            for ref in set(find_refs(line.tounicode())):
+                count = scrollback_files.get(ref, 0) + n
+                if count > 0:
+                    scrollback_files[ref] = count
+                else:
+                    scrollback_files.pop(ref, None)
+
+    def _read_scrollback(self, reader=None):
+        """
+        Returns the position (index) in the scrollback buffer of the first line
+        that *reader* hasn't seen yet and marks all lines as read by *reader*.
+        Readers that haven't read anything yet (e.g. a client that just
+        connected) will start with the oldest line in the buffer.
+        """
+        total = self.scrollback_total
+        oldest = total - len(self.scrollback_buf)
+        position = max(self.scrollback_readers.get(reader, oldest), oldest)
+        self.scrollback_readers[reader] = total
+        return position - oldest
+
+    def remove_scrollback_reader(self, reader):
+        """
+        Forgets the read position of *reader* in the scrollback buffer (e.g.
+        when a client disconnects).  If *reader* comes back it will start over
+        with the oldest line in the buffer.
         """
-        self.scrollback_buf = []
-        self.scrollback_renditions = []
+        self.scrollback_readers.pop(reader, None)
 
     def add_callback(self, event, callback, identifier=None):
         """
@@ -1538,25 +2157,91 @@ class Terminal(object):
 
     def send_update(self):
         """
-        A convenience function for calling all CALLBACK_CHANGED callbacks.
+        A convenience function for calling all CALLBACK_CHANGED callbacks (via
+        :meth:`flush_updates`).
         """
         #logging.debug('send_update()')
-        try:
-            for callback in self.callbacks[CALLBACK_CHANGED].values():
-                callback()
-        except TypeError as e:
-            pass
+        self._schedule_flush(CALLBACK_CHANGED)
 
     def send_cursor_update(self):
         """
-        A convenience function for calling all CALLBACK_CURSOR_POS callbacks.
+        A convenience function for calling all CALLBACK_CURSOR_POS callbacks
+        (via :meth:`flush_updates`).
         """
         #logging.debug('send_cursor_update()')
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError as e:
-            pass
+        self._schedule_flush(CALLBACK_CURSOR_POS)
+
+    def set_scheduler(self, call_soon):
+        """
+        Makes the terminal pass functions that should be called "soon" (but not
+        right now) to *call_soon* (e.g. :meth:`IOLoop.add_callback`).  It must
+        call them in the thread that owns this terminal.
+
+        This is used to coalesce change notifications:  Instead of calling the
+        CALLBACK_CHANGED, CALLBACK_CURSOR_POS, and CALLBACK_SCROLL_UP callbacks
+        every time something changes (which can be dozens of times per burst of
+        output) they'll get called once by :meth:`flush_updates`.  It is also
+        used to apply the results of :meth:`run_in_executor`.
+        """
+        self.call_soon = call_soon
+
+    def _schedule_flush(self, event):
+        """
+        Marks *event* (e.g. CALLBACK_CHANGED) as having happened and schedules
+        a call to :meth:`flush_updates` (if one isn't already scheduled).  If
+        there's no scheduler (see :meth:`set_scheduler`) :meth:`flush_updates`
+        gets called immediately.
+        """
+        self.pending_events.add(event)
+        if self.fast_forward:
+            return # They'll be flushed when fast-forwarding stops
+        if not self.call_soon:
+            self.flush_updates()
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.call_soon(self.flush_updates)
+
+    def set_fast_forward(self, enabled):
+        """
+        Turns fast-forward mode on or off.  Output still gets processed as
+        usual (the screen, scrollback buffer, and dirty rows are all kept up to
+        date) but the extras get skipped:  Incoming output isn't checked for
+        files (e.g. images) unless one is already being captured, bells are
+        ignored, and the CALLBACK_SCROLL_UP, CALLBACK_CHANGED, and
+        CALLBACK_CURSOR_POS callbacks don't get called.
+        When fast-forwarding stops they get called once for everything that
+        happened in the meantime.
+
+        This is meant to be used when a program is producing output much
+        faster than anyone could possibly watch it (see
+        :meth:`termio.BaseMultiplex.term_write`).  Most of what gets saved is
+        the rendering those callbacks would trigger; :meth:`write` itself is
+        only a little faster.
+        """
+        self.fast_forward = enabled
+        if not enabled and self.pending_events:
+            self._schedule_flush(CALLBACK_CHANGED)
+
+    def flush_updates(self):
+        """
+        Calls the callbacks of every event that happened since the last flush
+        (once each) in this order:  CALLBACK_SCROLL_UP, CALLBACK_CHANGED, and
+        CALLBACK_CURSOR_POS.  The rows that changed are in
+        :attr:`self.dirty_rows` until the screen gets rendered (e.g. by
+        :meth:`dump_html`).
+        """
+        self.flush_scheduled = False
+        events = self.pending_events
+        if not events:
+            return
+        self.pending_events = set()
+        for event in (CALLBACK_SCROLL_UP, CALLBACK_CHANGED, CALLBACK_CURSOR_POS):
+            if event in events:
+                try:
+                    for callback in self.callbacks[event].values():
+                        callback()
+                except TypeError:
+                    pass
 
     def reset(self, *args, **kwargs):
         """
@@ -1574,7 +2259,7 @@ class Terminal(object):
         }
         self.local_echo = True
         self.title = "Gate One"
-        self.esc_buffer = ''
+        self._cancel_esc_sequence()
         self.show_cursor = True
         self.insert_mode = False
         self.rendition_set = False
@@ -1586,6 +2271,7 @@ class Terminal(object):
         self.bottom_margin = self.rows - 1
         self.alt_screen = None
         self.alt_renditions = None
+        self.alt_wrapped_rows = {}
         self.autowrap = False
         self.alt_cursorX = 0
         self.alt_cursorY = 0
@@ -1596,8 +2282,6 @@ class Terminal(object):
         self.init_screen()
         self.init_renditions()
         self.init_scrollback()
-        self.prev_dump = []
-        self.prev_dump_rend = []
         self.html_cache = []
         try:
             self.callbacks[CALLBACK_RESET]()
@@ -1616,19 +2300,28 @@ class Terminal(object):
         Resizes the terminal window, adding or removing *rows* or *cols* as
         needed.  If *em_dimensions* are provided they will be stored in
         *self.em_dimensions* (which is currently only used by image output).
+
+        If :attr:`self.reflow` is True and the number of columns changed, lines
+        that were wrapped will be re-wrapped to fit the new width (see
+        :meth:`Terminal._reflow`).
         """
         logging.debug("resize(%s, %s)" % (rows, cols))
         if em_dimensions:
             self.em_dimensions = em_dimensions
         if rows == self.rows and cols == self.cols:
             return # Nothing to do--don't mess with the margins or the cursor
+        if self.reflow and cols != self.cols and self.alt_screen is None:
+            self._reflow(rows, cols)
+            return
         if rows < self.rows: # Remove rows from the top
-            for i in xrange(self.rows - rows):
-                line = self.screen.pop(0)
-                # Add it to the scrollback buffer so it isn't lost forever
-                self.scrollback_buf.append(line)
-                rend = self.renditions.pop(0)
-                self.scrollback_renditions.append(rend)
+            n = self.rows - rows
+            lines = [self.screen.pop(0) for i in xrange(n)]
+            rends = [self.renditions.pop(0) for i in xrange(n)]
+            # Add them to the scrollback buffer so they aren't lost forever
+            self._add_scrollback(lines, rends)
+            if self.wrapped_rows:
+                self._move_wrapped_rows(0, self.rows, n)
+            self.cursorY = max(0, self.cursorY - n)
         elif rows > self.rows: # Add rows at the bottom
             for i in xrange(rows - self.rows):
                 line = array('u', u' ' * self.cols)
@@ -1641,17 +2334,126 @@ class Terminal(object):
         # Fix the cursor location:
         if self.cursorY >= self.rows:
             self.cursorY = self.rows - 1
-        if cols > self.cols: # Add cols to the right
-            for i in xrange(self.rows):
-                for j in xrange(cols - self.cols):
-                    self.screen[i].append(u' ')
-                    self.renditions[i].append(unichr(1000))
+        if self.contiguous_screen: # Rows are always exactly self.cols wide
+            self.screen.set_cols(cols)
+            self.renditions.set_cols(cols)
+        elif cols > self.cols: # Add cols to the right
+            spaces = array('u', u' ' * (cols - self.cols))
+            renditions = array('u', unichr(1000) * (cols - self.cols))
+            for line, rendition in izip(self.screen, self.renditions):
+                line.extend(spaces)
+                rendition.extend(renditions)
+        if cols != self.cols:
+            self.wrapped_rows = {} # They no longer line up with anything
         self.cols = cols
 
         # Fix the cursor location:
         if self.cursorX >= self.cols:
             self.cursorX = self.cols - 1
         self.rendition_set = False
+        self.html_cache = [] # Force a full dump
+
+    def _reflow(self, rows, cols):
+        """
+        Resizes the screen to *rows* and *cols* by joining the rows that were
+        wrapped (:attr:`self.wrapped_rows`) back into whole lines and wrapping
+        them again at *cols*.  The cursor stays with the character it was on.
+
+        If the result doesn't fit on the screen blank lines below the cursor are
+        dropped first then lines are moved from the top of the screen into the
+        scrollback buffer.
+
+        .. note:: Only the screen gets reflowed; lines that are already in the scrollback buffer are left alone.
+        """
+        old_cols = self.cols
+        blank = unichr(1000)
+        trailing = blank + u' '
+        # Join the wrapped rows back together into (chars, renditions) lines
+        lines = []
+        cursor = (0, 0) # (Line, offset)
+        chars, rends = array('u'), array('u')
+        screen = self.screen
+        for y, (line, rendition) in enumerate(izip(screen, self.renditions)):
+            if y == self.cursorY:
+                cursor = (len(lines), len(chars) + self.cursorX)
+            if y in self.wrapped_rows:
+                # Anything after where the row wrapped is just padding
+                end = min(self.wrapped_rows[y], old_cols)
+                chars.extend(line[:end])
+                rends.extend(rendition[:end])
+                continue
+            chars.extend(line[:])
+            rends.extend(rendition[:])
+            # Trailing whitespace doesn't need to be kept (unless it's colored)
+            end = max(
+                len(chars.tounicode().rstrip(u' \x00')),
+                len(rends.tounicode().rstrip(trailing)))
+            del chars[end:]
+            del rends[end:]
+            lines.append((chars, rends))
+            chars, rends = array('u'), array('u')
+        if chars:
+            lines.append((chars, rends))
+        # Now wrap them again at the new width
+        screen, renditions = [], []
+        wrapped_rows = {}
+        cursorY, cursorX = 0, 0
+        for i, (chars, rends) in enumerate(lines):
+            if i == cursor[0] and cursor[1] > len(chars):
+                # The cursor needs something to sit on
+                pad = cursor[1] - len(chars)
+                chars.fromunicode(u' ' * pad)
+                rends.fromunicode(blank * pad)
+            start = 0
+            while True:
+                end = start + cols
+                if end < len(chars) and chars[end] == WIDE_PLACEHOLDER and (
+                        end - 1 > start):
+                    end -= 1 # Don't split up double-width characters
+                if i == cursor[0] and start <= cursor[1] <= end:
+                    cursorY, cursorX = len(screen), cursor[1] - start
+                screen.append(chars[start:end])
+                renditions.append(rends[start:end])
+                if end >= len(chars):
+                    break
+                wrapped_rows[len(screen) - 1] = end - start
+                start = end
+        # Make it fit
+        while len(screen) > rows and len(screen) - 1 > cursorY and not (
+                screen[-1].tounicode().strip() or
+                renditions[-1].tounicode().strip(trailing)):
+            screen.pop()
+            renditions.pop()
+        if len(screen) > rows: # Move the lines at the top into the scrollback
+            n = len(screen) - rows
+            for line, rendition in izip(screen[:n], renditions[:n]):
+                line.fromunicode(u' ' * (cols - len(line)))
+                rendition.fromunicode(blank * (cols - len(rendition)))
+            self._add_scrollback(screen[:n], renditions[:n])
+            del screen[:n]
+            del renditions[:n]
+            wrapped_rows = dict(
+                (y - n, end) for y, end in wrapped_rows.items() if y >= n)
+            cursorY -= n
+        for line, rendition in izip(screen, renditions):
+            line.fromunicode(u' ' * (cols - len(line)))
+            rendition.fromunicode(blank * (cols - len(rendition)))
+        for i in xrange(rows - len(screen)):
+            screen.append(array('u', u' ' * cols))
+            renditions.append(array('u', blank * cols))
+        if self.contiguous_screen:
+            screen = ScreenBuffer.from_rows(screen, cols)
+            renditions = ScreenBuffer.from_rows(
+                renditions, cols, self.renditions.fill)
+        self.screen, self.renditions = screen, renditions
+        self.rows, self.cols = rows, cols
+        self.wrapped_rows = wrapped_rows
+        self.top_margin = 0
+        self.bottom_margin = rows - 1
+        self.cursorY = max(0, cursorY)
+        self.cursorX = min(cursorX, cols - 1)
+        self.rendition_set = False
+        self.html_cache = [] # Force a full dump
 
     def _set_top_bottom(self, settings):
         """
@@ -1774,8 +2576,8 @@ class Terminal(object):
         if param == 8:
             # Screen alignment test
             self.init_renditions()
-            self.screen = [
-                array('u', u'E' * self.cols) for a in xrange(self.rows)]
+            self.screen = self._new_screen(u'E')
+            self.html_cache = [] # Force a full dump
         # TODO: Get this handling double line height stuff...  For kicks
 
     def set_G0_charset(self, char):
@@ -1886,42 +2688,47 @@ class Terminal(object):
 
         # Speedups (don't want dots in loops if they can be avoided)
         specials = self.specials
-        esc_handlers = self.esc_handlers
-        csi_handlers = self.csi_handlers
-        RE_ESC_SEQ = self.RE_ESC_SEQ
-        RE_CSI_ESC_SEQ = self.RE_CSI_ESC_SEQ
+        esc_states = self.esc_states
+        RE_PLAIN_RUN = self.RE_PLAIN_RUN
         magic = self.magic
         magic_map = self.magic_map
         changed = False
         # This is commented because of how noisy it is.  Uncomment to debug the
         # terminal emualtor:
         #logging.debug('handling chars: %s' % repr(chars))
+        if special_checks and self.fast_forward:
+            # Only finish captures that are already underway
+            special_checks = bool(self.capture or self.matched_header)
         if special_checks:
             before_chars = ""
             after_chars = ""
             if not self.capture:
-                for magic_header in magic:
-                    try:
-                        if magic_header.match(str(chars)):
-                            self.matched_header = magic_header
-                            self.capture_regex = magic[magic_header]
-                            self.timeout_capture = datetime.now()
-                            self.progress_timer = datetime.now()
-                            break
-                    except UnicodeEncodeError:
-                        # Gibberish; drop it and pretend it never happened
-                        logging.debug(_(
-                            "Got UnicodeEncodeError trying to check FileTypes"))
-                        self.esc_buffer = ""
-                        # Make it so it won't barf below
-                        chars = chars.encode(self.encoding, 'ignore')
+                try:
+                    magic_header = self._detect_magic(str(chars))
+                except UnicodeEncodeError:
+                    # Gibberish; drop it and pretend it never happened
+                    logging.debug(_(
+                        "Got UnicodeEncodeError trying to check FileTypes"))
+                    self._cancel_esc_sequence()
+                    # Make it so it won't barf below
+                    chars = chars.encode(self.encoding, 'ignore')
+                    magic_header = self._detect_magic(chars)
+                if magic_header:
+                    self.matched_header = magic_header
+                    self.capture_regex = magic[magic_header]
+                    self.timeout_capture = datetime.now()
+                    self.progress_timer = datetime.now()
             if self.capture or self.matched_header:
+                if isinstance(chars, unicode):
+                    chars = chars.encode(self.encoding, 'ignore')
+                spooled = len(self.capture)
                 self.capture += chars
                 if self.cancel_capture:
                     # Try to split the garbage from the post-ctrl-c output
                     split_capture = self.RE_SIGINT.split(self.capture)
-                    after_chars = split_capture[-1]
-                    self.capture = ''
+                    after_chars = str(split_capture[-1])
+                    self.capture = bytearray()
+                    self.capture_match = None
                     self.matched_header = None
                     self.cancel_capture = False
                     self.write(u'^C\r\n', special_checks=False)
@@ -1946,54 +2753,55 @@ class Terminal(object):
                     self.notified = True
                     self.send_message(message)
                     self.progress_timer = datetime.now()
-                match = self.capture_regex.search(self.capture)
-                if match:
-                    logging.debug(
-                        "Matched %s format (%s, %s).  Capturing..." % (
-                        self.magic_map[self.matched_header].name,
-                        self.cursorY, self.cursorX))
-                    split_capture = self.capture_regex.split(self.capture, 1)
-                    before_chars = split_capture[0]
-                    capture_length = len(split_capture[1])
-                    self.capture = split_capture[1]
-                    after_chars = "".join(split_capture[2:])
-                if after_chars:
-                    if len(after_chars) > 500:
-                        # Could be more to this file.  Let's wait until output
-                        # slows down before attempting to perform a match
-                        return
-                    else:
-                        # These needs to be written before the capture so that
-                        # the FileType.capture() method can position things
-                        # appropriately.
-                        if before_chars:
-                            # Empty out self.capture temporarily so these chars
-                            # get handled properly
-                            cap_temp = self.capture
-                            self.capture = ""
-                            self.write(before_chars, special_checks=False)
-                            # Put it back for the rest of the processing
-                            self.capture = cap_temp
-                        # Perform the capture and start anew
-                        self._capture_file()
-                        if self.notified:
-                            # Send a final notice of how big the file was (just
-                            # to keep things consistent).
-                            ft = magic_map[self.matched_header].name
-                            indicator = 'K'
-                            size = float(len(self.capture))/1024 # Kb
-                            if size > 1024: # Switch to Mb
-                                size = size/1024
-                                indicator = 'M'
-                            message = _(
-                                "%s: Capture complete (%.2f%s)" % (
-                                ft, size, indicator))
-                            self.notified = False
-                            self.send_message(message)
-                        self.capture = "" # Empty it now that is is captured
-                        self.matched_header = None # Ditto
-                    self.write(after_chars, special_checks=True)
+                previous_match = self.capture_match
+                self._find_capture(spooled)
+                if not self.capture_match:
+                    return
+                start, end = self.capture_match
+                after_length = len(self.capture) - end
+                if not after_length:
                     return
+                if after_length > 500 and self.capture_match != previous_match:
+                    # Could be more to this file.  Let's wait for the next
+                    # write before performing the capture.  If that doesn't
+                    # move the end of the match the file really did end there.
+                    return
+                before_chars = str(self.capture[:start])
+                after_chars = str(self.capture[end:])
+                # Trim the spool down to just the file (in place to avoid
+                # making yet another copy of it)
+                del self.capture[end:]
+                del self.capture[:start]
+                self.capture_match = None
+                # These needs to be written before the capture so that the
+                # FileType.capture() method can position things appropriately.
+                if before_chars:
+                    # Empty out self.capture temporarily so these chars get
+                    # handled properly
+                    cap_temp = self.capture
+                    self.capture = bytearray()
+                    self.write(before_chars, special_checks=False)
+                    # Put it back for the rest of the processing
+                    self.capture = cap_temp
+                # Perform the capture and start anew
+                self._capture_file()
+                if self.notified:
+                    # Send a final notice of how big the file was (just to keep
+                    # things consistent).
+                    ft = magic_map[self.matched_header].name
+                    indicator = 'K'
+                    size = float(len(self.capture))/1024 # Kb
+                    if size > 1024: # Switch to Mb
+                        size = size/1024
+                        indicator = 'M'
+                    message = _(
+                        "%s: Capture complete (%.2f%s)" % (
+                        ft, size, indicator))
+                    self.notified = False
+                    self.send_message(message)
+                self.capture = bytearray() # Empty it now that is is captured
+                self.matched_header = None # Ditto
+                self.write(after_chars, special_checks=True)
                 return
         # Have to convert to unicode
         try:
@@ -2010,70 +2818,73 @@ class Terminal(object):
             # In Python 3 strings don't have .decode()
             pass # Already Unicode
         backspaced = False
-        for char in chars:
+        pos = 0
+        slow_until = 0 # Used to skip the fast path if it can't be used
+        length = len(chars)
+        while pos < length:
+            # Fast path:  Runs of plain, printable characters (the vast
+            # majority of all terminal output) get written in bulk via
+            # _write_run() instead of being handled one character at a time.
+            if pos >= slow_until and not (self.esc_state or self.insert_mode):
+                if self.cursorY == self.bottom_margin:
+                    # Lines of plain text at the bottom of the screen (e.g.
+                    # build logs) get scrolled up all at once.
+                    end = self._write_lines(chars, pos)
+                    if end != pos:
+                        changed = True
+                        pos = end
+                        continue
+                match_obj = RE_PLAIN_RUN.match(chars, pos)
+                if match_obj:
+                    run = match_obj.group()
+                    written = self._write_run(run)
+                    if written:
+                        changed = True
+                    if written < len(run):
+                        # Handle the rest of the run one char at a time
+                        slow_until = match_obj.end()
+                    pos += written
+                    if pos >= slow_until:
+                        continue
+            if self.esc_state:
+                # We've got an escape sequence going on...  Let the handler for
+                # the current parser state consume as much as it can.
+                pos = esc_states[self.esc_state](chars, pos)
+                continue
+            char = chars[pos]
+            pos += 1
             charnum = ord(char)
             if charnum in specials:
                 specials[charnum]()
             else:
-                # Now handle the regular characters and escape sequences
-                if self.esc_buffer: # We've got an escape sequence going on...
-                    try:
-                        self.esc_buffer += char
-                        # First try to handle non-CSI ESC sequences (the basics)
-                        match_obj = RE_ESC_SEQ.match(self.esc_buffer)
-                        if match_obj:
-                            seq_type = match_obj.group(1) # '\x1bA' -> 'A'
-                            # Call the matching ESC handler
-                            #logging.debug('ESC seq: %s' % seq_type)
-                            if len(seq_type) == 1: # Single-character sequnces
-                                esc_handlers[seq_type]()
-                            else: # Multi-character stuff like '\x1b)B'
-                                esc_handlers[seq_type[0]](seq_type[1:])
-                            self.esc_buffer = '' # All done with this one
-                            continue
-                        # Next try to handle CSI ESC sequences
-                        match_obj = RE_CSI_ESC_SEQ.match(self.esc_buffer)
-                        if match_obj:
-                            csi_values = match_obj.group(1) # e.g. '0;1;37'
-                            csi_type = match_obj.group(2) # e.g. 'm'
-                            #logging.debug(
-                                #'CSI: %s, %s' % (csi_type, csi_values))
-                            # Call the matching CSI handler
-                            try:
-                                csi_handlers[csi_type](csi_values)
-                            except ValueError:
-                            # Commented this out because it can be super noisy
-                                #logging.error(_(
-                                    #"CSI Handler Error: Type: %s, Values: %s" %
-                                    #(csi_type, csi_values)
-                                #))
-                                pass
-                            self.esc_buffer = ''
-                            continue
-                    except KeyError:
-                        # No handler for this, try some alternatives
-                        if self.esc_buffer.endswith('\x1b\\'):
-                            self._osc_handler()
-                        else:
-                            logging.warning(_(
-                                "Warning: No ESC sequence handler for %s"
-                                % `self.esc_buffer`
-                            ))
-                            self.esc_buffer = ''
-                    continue # We're done here
+                # Now handle the regular characters
                 changed = True
-                if self.cursorX >= self.cols:
+                if charnum in self.charset:
+                    char = self.charset[charnum]
+                    width = 1
+                elif charnum < WIDTH_FIRST: # Saves a lookup for most chars
+                    width = 1
+                else:
+                    width = char_width(char)
+                    if not width:
+                        # This is a unicode diacritic (accent) which simply
+                        # modifies the character before it
+                        self._combine_char(char)
+                        continue
+                if self.cursorX + width > self.cols:
                     # Non-autowrap has been disabled due to issues with browser
                     # wrapping.
                     #if self.autowrap:
+                    self.wrapped_rows[self.cursorY] = self.cursorX
                     self.cursorX = 0
                     self.newline()
                     #else:
                         #self.screen[self.cursorY].append(u' ') # Make room
                         #self.renditions[self.cursorY].append(u' ')
                 try:
-                    self.renditions[self.cursorY][
-                        self.cursorX] = self.cur_rendition
+                    cursorX = self.cursorX
+                    rendition = self.renditions[self.cursorY]
+                    rendition[cursorX] = self.cur_rendition
                     if self.insert_mode:
                         # Insert mode dictates that we move everything to the
                         # right for every character we insert.  Normally the
@@ -2081,45 +2892,149 @@ class Terminal(object):
                         # programs and shells will simply set call ESC[4h,
                         # insert the character, then call ESC[4i to return the
                         # terminal to its regular state.
-                        self.insert_characters(1)
-                    if charnum in self.charset:
-                        char = self.charset[charnum]
-                        self.screen[self.cursorY][self.cursorX] = char
-                    else:
-                        # Double check this isn't a unicode diacritic (accent)
-                        # which simply modifies the character before it
-                        if unicodedata.combining(char):
-                            # This is a diacritic.  Combine it with existing:
-                            current = self.screen[self.cursorY][self.cursorX]
-                            combined = unicodedata.normalize(
-                                'NFC', u'%s%s' % (current, char))
-                            # Sometimes a joined combining char can still result
-                            # a string of length > 1.  So we need to handle that
-                            if len(combined) > 1:
-                                for i, c in enumerate(combined):
-                                    self.screen[self.cursorY][
-                                        self.cursorX] = c
-                                    if i < len(combined) - 1:
-                                        self.cursorX += 1
-                            else:
-                                self.screen[self.cursorY][
-                                    self.cursorX] = combined
-                        else:
-                            # Normal character
-                            self.screen[self.cursorY][self.cursorX] = char
+                        self.insert_characters(width)
+                    line = self.screen[self.cursorY]
+                    if width == 2: # Double-width (e.g. CJK) takes two cells
+                        self.wide_chars = True
+                        line[cursorX+1] = WIDE_PLACEHOLDER
+                        rendition[cursorX+1] = self.cur_rendition
+                    if self.wide_chars:
+                        self._clear_wide(line, cursorX, cursorX + width)
+                    line[cursorX] = char
                 except IndexError as e:
                     # This can happen when escape sequences go haywire
                     logging.error(_(
                         "IndexError in write(): %s" % e))
                     import traceback, sys
                     traceback.print_exc(file=sys.stdout)
-                self.cursorX += 1
+                self.dirty_rows.add(self.cursorY)
+                self.cursorX += width
+        if self.scrolled:
+            self.scrolled = False
+            changed = True
+            self._send_scroll_update()
+        if self.captured_files:
+            self._schedule_fd_check()
         if changed:
             self.modified = True
             # Execute our callbacks
             self.send_update()
             self.send_cursor_update()
 
+    def _write_lines(self, chars, pos):
+        """
+        Handles as many lines of plain text (as matched by
+        :attr:`RE_PLAIN_LINE`) as possible in *chars* starting at *pos* when
+        the cursor is on the bottom margin.  Instead of writing each line,
+        scrolling the screen, and clearing the new line for every linefeed the
+        first line gets written at the cursor position and the rest get
+        scrolled into view all at once via :meth:`Terminal._scroll_up`.  The
+        end result is exactly the same.
+
+        Returns the position in *chars* where it stopped (which will be *pos*
+        if nothing could be handled this way).
+        """
+        cols = self.cols
+        match = self.RE_PLAIN_LINE.match
+        match_obj = match(chars, pos)
+        if not match_obj:
+            return pos
+        first = match_obj.group(1)
+        if not 0 <= self.cursorX <= cols - len(first):
+            return pos # It would wrap; let write() handle it
+        if first and self._write_run(first) != len(first):
+            return pos + len(first) # Should never happen but just in case
+        pos = match_obj.end()
+        lines = []
+        while True:
+            match_obj = match(chars, pos)
+            if not match_obj or len(match_obj.group(1)) > cols:
+                break
+            lines.append(match_obj.group(1))
+            pos = match_obj.end()
+        if self.charset: # e.g. Line drawing mode
+            lines = [line.translate(self.charset) for line in lines]
+        # Each linefeed scrolls up one line.  All but the last of the new lines
+        # get a line of text:
+        self._scroll_up(len(lines) + 1, self.cur_rendition, lines)
+        self.scrolled = True
+        self.cursorX = 0
+        return pos
+
+    def _write_run(self, run):
+        """
+        Writes *run* (a string of plain, printable characters as matched by
+        :attr:`RE_PLAIN_RUN`) to the screen at the current cursor position using
+        slice assignment, wrapping at :attr:`self.cols` exactly like
+        :meth:`Terminal.write` does for individual characters.
+
+        Returns the number of characters that were written.  If that is less
+        than `len(run)` the caller is expected to handle the remainder the slow
+        way (e.g. when the cursor has wandered off the screen).
+        """
+        cols = self.cols
+        cur_rendition = self.cur_rendition
+        if self.charset: # e.g. Line drawing mode
+            run = run.translate(self.charset)
+        written = 0
+        length = len(run)
+        while written < length:
+            if self.cursorX >= cols:
+                self.wrapped_rows[self.cursorY] = cols
+                self.cursorX = 0
+                self.newline()
+            cursorX = self.cursorX
+            if cursorX < 0 or self.cursorY < 0:
+                break # Let write() sort it out
+            try:
+                line = self.screen[self.cursorY]
+                rendition = self.renditions[self.cursorY]
+            except IndexError:
+                break # Let write() sort it out
+            end = cursorX + min(length - written, cols - cursorX)
+            if end > len(line) or end > len(rendition):
+                break # Ditto
+            n = end - cursorX
+            if self.wide_chars:
+                self._clear_wide(line, cursorX, end)
+            line[cursorX:end] = array('u', run[written:written+n])
+            rendition[cursorX:end] = array('u', cur_rendition * n)
+            self.dirty_rows.add(self.cursorY)
+            self.cursorX = end
+            written += n
+        return written
+
+    def _clear_wide(self, line, start, end):
+        """
+        Blanks out the other half of any double-width characters in *line* that
+        would get cut in half by writing to `line[start:end]`.
+        """
+        if start > 0 and line[start] == WIDE_PLACEHOLDER:
+            line[start-1] = u' '
+        if end < len(line) and line[end] == WIDE_PLACEHOLDER:
+            line[end] = u' '
+
+    def _combine_char(self, char):
+        """
+        Combines *char* (a combining character such as an accent) with the
+        character before the cursor if the result can be represented as a
+        single character (e.g. 'e' + U+0301 becomes 'é').  Otherwise *char*
+        gets dropped.
+        """
+        try:
+            line = self.screen[self.cursorY]
+        except IndexError: # Cursor went haywire
+            return
+        x = min(self.cursorX, len(line)) - 1
+        if x > 0 and line[x] == WIDE_PLACEHOLDER:
+            x -= 1 # It belongs to the double-width character
+        if x < 0:
+            return # Nothing to combine with
+        combined = unicodedata.normalize('NFC', line[x] + char)
+        if len(combined) == 1:
+            line[x] = combined
+            self.dirty_rows.add(self.cursorY)
+
     def flush(self):
         """
         Only here to make Terminal compatible with programs that want to use
@@ -2127,6 +3042,147 @@ class Terminal(object):
         """
         pass
 
+    def _scroll_up(self, n=1, rendition=None, lines=()):
+        """
+        Moves everything between :attr:`self.top_margin` and
+        :attr:`self.bottom_margin` up by *n* lines in one go.  The lines that
+        get moved past the top margin will be placed in the scrollback buffer.
+
+        The *n* new lines at the bottom will be blank unless *lines* (a list of
+        strings, none of which may be longer than :attr:`self.cols`) is given
+        in which case they will be used for the first `len(lines)` new lines.
+        The new lines will all get *rendition* (default: `unichr(1000)`).
+
+        Unlike :meth:`Terminal.scroll_up` this doesn't call any callbacks.
+        """
+        cols = self.cols
+        if rendition is None:
+            rendition = unichr(1000)
+        top, bottom = self.top_margin, self.bottom_margin + 1
+        count = bottom - top # Number of lines in the scrolling region
+        if not lines:
+            # No need to put more than a screenful of blank lines in there
+            n = min(n, count)
+        if n <= 0:
+            return
+        screen = self.screen
+        renditions = self.renditions
+        new_lines = [array('u', line.ljust(cols)) for line in lines]
+        if self.contiguous_screen:
+            # Rotate the rows inside the buffer instead of making new ones
+            scrolled = min(n, count)
+            old_lines = [screen[y].toarray() for y in xrange(top, top+scrolled)]
+            old_rends = [
+                renditions[y].toarray() for y in xrange(top, top+scrolled)]
+            if n > count: # Some of the new lines scroll right on past
+                extra = n - count
+                passed = new_lines[:extra]
+                passed.extend(
+                    array('u', u' ' * cols)
+                    for i in xrange(extra - len(passed)))
+                old_lines.extend(passed)
+                old_rends.extend(
+                    array('u', rendition * cols) for i in xrange(extra))
+                new_lines = new_lines[extra:]
+            self._add_scrollback(old_lines, old_rends)
+            screen.rotate(top, bottom - 1, scrolled)
+            renditions.rotate(top, bottom - 1, scrolled)
+            first = bottom - scrolled # First of the new lines
+            for y, line in enumerate(new_lines, first):
+                screen[y] = line
+            if rendition != renditions.fill:
+                rend = array('u', rendition * cols)
+                for y in xrange(first, bottom):
+                    renditions[y] = rend
+        else:
+            new_lines.extend(
+                array('u', u' ' * cols) for i in xrange(n - len(new_lines)))
+            region = screen[top:bottom] + new_lines
+            region_rends = renditions[top:bottom] + [
+                array('u', rendition * cols) for i in xrange(n)]
+            self._add_scrollback(region[:n], region_rends[:n])
+            screen[top:bottom] = region[n:]
+            renditions[top:bottom] = region_rends[n:]
+        if self.wrapped_rows:
+            self._move_wrapped_rows(top, bottom, n)
+        self.dirty_rows.update(xrange(top, bottom))
+
+    def _scroll_down(self, top, n=1):
+        """
+        Moves everything between *top* and :attr:`self.bottom_margin` down by
+        *n* lines in one go, discarding the lines that get moved past the
+        bottom margin and inserting blank lines at *top*.  Doesn't call any
+        callbacks.
+        """
+        bottom = self.bottom_margin + 1
+        n = min(n, bottom - top)
+        if n <= 0:
+            return
+        if self.contiguous_screen:
+            # Rotate the rows inside the buffer instead of making new ones
+            self.screen.rotate(top, bottom - 1, -n)
+            self.renditions.rotate(top, bottom - 1, -n)
+        else:
+            cols = self.cols
+            self.screen[top:bottom] = [
+                array('u', u' ' * cols) for i in xrange(n)
+            ] + self.screen[top:bottom-n]
+            self.renditions[top:bottom] = [
+                array('u', unichr(1000) * cols) for i in xrange(n)
+            ] + self.renditions[top:bottom-n]
+        if self.wrapped_rows:
+            self._move_wrapped_rows(top, bottom, -n)
+        self.dirty_rows.update(xrange(top, bottom))
+
+    def _delete_lines(self, top, n=1):
+        """
+        Moves everything between *top* + *n* and :attr:`self.bottom_margin` up
+        to *top* in one go, discarding the lines in between and adding blank
+        lines at the bottom margin.  Doesn't call any callbacks.
+
+        .. note:: Unlike :meth:`Terminal._scroll_up` the lines that get removed are *not* placed in the scrollback buffer.
+        """
+        bottom = self.bottom_margin + 1
+        n = min(n, bottom - top)
+        if n <= 0:
+            return
+        if self.contiguous_screen:
+            # Rotate the rows inside the buffer instead of making new ones
+            self.screen.rotate(top, bottom - 1, n)
+            self.renditions.rotate(top, bottom - 1, n)
+        else:
+            cols = self.cols
+            self.screen[top:bottom] = self.screen[top+n:bottom] + [
+                array('u', u' ' * cols) for i in xrange(n)]
+            self.renditions[top:bottom] = self.renditions[top+n:bottom] + [
+                array('u', unichr(1000) * cols) for i in xrange(n)]
+        if self.wrapped_rows:
+            self._move_wrapped_rows(top, bottom, n)
+        self.dirty_rows.update(xrange(top, bottom))
+
+    def _move_wrapped_rows(self, top, bottom, n):
+        """
+        Moves the rows in :attr:`self.wrapped_rows` that are between *top* and
+        *bottom* (exclusive) up by *n* rows (down if *n* is negative) to match
+        the lines that just got scrolled.  Rows that get moved outside of that
+        region are dropped.
+        """
+        wrapped_rows = {}
+        for y, end in self.wrapped_rows.items():
+            if top <= y < bottom:
+                y -= n
+                if not top <= y < bottom:
+                    continue
+            wrapped_rows[y] = end
+        self.wrapped_rows = wrapped_rows
+
+    def _send_scroll_update(self):
+        """
+        A convenience function for calling all CALLBACK_SCROLL_UP callbacks (via
+        :meth:`flush_updates`).
+        """
+        self._schedule_flush(CALLBACK_SCROLL_UP)
+
     def scroll_up(self, n=1):
         """
         Scrolls up the terminal screen by *n* lines (default: 1). The callbacks
@@ -2136,35 +3192,11 @@ class Terminal(object):
         .. note:: This will only scroll up the region within self.top_margin and self.bottom_margin (if set).
         """
         #logging.debug("scroll_up(%s)" % n)
-        empty_line = array('u', u' ' * self.cols) # Line full of spaces
-        empty_rend = array('u', unichr(1000) * self.cols)
-        for x in xrange(int(n)):
-            line = self.screen.pop(self.top_margin) # Remove the top line
-            self.scrollback_buf.append(line) # Add it to the scrollback buffer
-            if len(self.scrollback_buf) > 1000:
-                # 1000 lines ought to be enough for anybody
-                self.init_scrollback()
-                # NOTE:  This would only be if 1000 lines piled up before the
-                # next dump_html() or dump().
-            # Add it to the bottom of the window:
-            self.screen.insert(self.bottom_margin, empty_line[:]) # A copy
-            # Remove top line's rendition information
-            rend = self.renditions.pop(self.top_margin)
-            self.scrollback_renditions.append(rend)
-            # Insert a new empty rendition as well:
-            self.renditions.insert(self.bottom_margin, empty_rend[:])
+        self._scroll_up(int(n))
         # Execute our callback indicating lines have been updated
-        try:
-            for callback in self.callbacks[CALLBACK_CHANGED].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_update()
         # Execute our callback to scroll up the screen
-        try:
-            for callback in self.callbacks[CALLBACK_SCROLL_UP].values():
-                callback()
-        except TypeError:
-            pass
+        self._send_scroll_update()
 
     def scroll_down(self, n=1):
         """
@@ -2173,28 +3205,11 @@ class Terminal(object):
         scrolling the screen.
         """
         #logging.debug("scroll_down(%s)" % n)
-        for x in xrange(int(n)):
-            self.screen.pop(self.bottom_margin) # Remove the bottom line
-            empty_line = array('u', u' ' * self.cols) # Line full of spaces
-            self.screen.insert(self.top_margin, empty_line) # Add it to the top
-            # Remove bottom line's style information:
-            self.renditions.pop(self.bottom_margin)
-            # Insert a new empty one:
-            empty_line = array('u', unichr(1000) * self.cols)
-            self.renditions.insert(self.top_margin, empty_line)
+        self._scroll_down(self.top_margin, int(n))
         # Execute our callback indicating lines have been updated
-        try:
-            for callback in self.callbacks[CALLBACK_CHANGED].values():
-                callback()
-        except TypeError:
-            pass
-
+        self.send_update()
         # Execute our callback to scroll up the screen
-        try:
-            for callback in self.callbacks[CALLBACK_SCROLL_UP].values():
-                callback()
-        except TypeError:
-            pass
+        self._send_scroll_update()
 
     def insert_line(self, n=1):
         """
@@ -2203,16 +3218,7 @@ class Terminal(object):
         #logging.debug("insert_line(%s)" % n)
         if not n: # Takes care of an empty string
             n = 1
-        n = int(n)
-        for i in xrange(n):
-            self.screen.pop(self.bottom_margin) # Remove the bottom line
-            # Remove bottom line's style information as well:
-            self.renditions.pop(self.bottom_margin)
-            empty_line = array('u', u' ' * self.cols) # Line full of spaces
-            self.screen.insert(self.cursorY, empty_line) # Insert at cursor
-            # Insert a new empty rendition as well:
-            empty_rend = array('u', unichr(1000) * self.cols)
-            self.renditions.insert(self.cursorY, empty_rend) # Insert at cursor
+        self._scroll_down(self.cursorY, int(n))
 
     def delete_line(self, n=1):
         """
@@ -2221,19 +3227,7 @@ class Terminal(object):
         #logging.debug("delete_line(%s)" % n)
         if not n: # Takes care of an empty string
             n = 1
-        n = int(n)
-        for i in xrange(n):
-            self.screen.pop(self.cursorY) # Remove the line at the cursor
-            # Remove the line's style information as well:
-            self.renditions.pop(self.cursorY)
-            # Now add an empty line and empty set of renditions to the bottom of
-            # the view
-            empty_line = array('u', u' ' * self.cols) # Line full of spaces
-            # Add it to the bottom of the view:
-            self.screen.insert(self.bottom_margin, empty_line) # Insert at bottom
-            # Insert a new empty rendition as well:
-            empty_rend = array('u', unichr(1000) * self.cols)
-            self.renditions.insert(self.bottom_margin, empty_rend)
+        self._delete_lines(self.cursorY, int(n))
 
     def backspace(self):
         """Execute a backspace (\\x08)"""
@@ -2246,7 +3240,7 @@ class Terminal(object):
                 self.cursorX = stop + 1
                 break
         else:
-            self.cursorX = self.columns - 1
+            self.cursorX = self.cols - 1
 
     def _set_tabstop(self):
         """Sets a tabstop at the current position of :attr:`self.cursorX`."""
@@ -2290,25 +3284,31 @@ class Terminal(object):
 
     def newline(self):
         """
-        Increases :attr:`self.cursorY` by 1 and calls :meth:`Terminal.scroll_up`
-        if that action will move the curor past :attr:`self.bottom_margin`
-        (usually the bottom of the screen).
+        Increases :attr:`self.cursorY` by 1 and scrolls up the screen if that
+        action will move the curor past :attr:`self.bottom_margin` (usually the
+        bottom of the screen).
         """
         cols = self.cols
         self.cursorY += 1
         if self.cursorY > self.bottom_margin:
-            self.scroll_up()
+            # The new line gets cleared using the current rendition (same as
+            # clear_line()).  CALLBACK_SCROLL_UP gets called at the end of
+            # write() so that it only happens once no matter how many lines
+            # were scrolled.
+            self._scroll_up(1, self.cur_rendition)
+            self.scrolled = True
             self.cursorY = self.bottom_margin
-            self.clear_line()
+            self.cursorX = 0
         # Shorten the line if it is longer than the number of columns
         # NOTE: This lets us keep the width of existing lines even if the number
         # of columns is reduced while at the same time accounting for apps like
         # 'top' that merely overwrite existing lines.  If we didn't do this
         # the output from 'top' would get all messed up from leftovers at the
         # tail end of every line when self.cols had a larger value.
-        if len(self.screen[self.cursorY]) >= cols:
+        if len(self.screen[self.cursorY]) > cols:
             self.screen[self.cursorY] = self.screen[self.cursorY][:cols]
             self.renditions[self.cursorY] = self.renditions[self.cursorY][:cols]
+            self.dirty_rows.add(self.cursorY)
         # NOTE: The above logic is placed inside of this function instead of
         # inside self.write() in order to reduce CPU utilization.  There's no
         # point in performing a conditional check for every incoming character
@@ -2349,41 +3349,241 @@ class Terminal(object):
     def _cancel_esc_sequence(self):
         """
         Cancels any escape sequence currently being processed.  In other words
-        it empties :attr:`self.esc_buffer`.
+        it returns the parser to :attr:`self.STATE_GROUND` and empties
+        :attr:`self.esc_params`, :attr:`self.esc_intermediate`, and
+        :attr:`self.esc_string`.
         """
-        self.esc_buffer = ''
+        self.esc_state = self.STATE_GROUND
+        self.esc_params = ''
+        self.esc_intermediate = ''
+        self.esc_string = []
 
     def _sub_esc_sequence(self):
         """
-        Cancels any escape sequence currently in progress and replaces
-        :attr:`self.esc_buffer` with single question mark (?).
+        Cancels any escape sequence currently in progress and writes a single
+        question mark (?) in its place.
 
         .. note:: Nothing presently uses this function and I can't remember what it was supposed to be part of (LOL!).  Obviously it isn't very important.
         """
-        self.esc_buffer = ''
+        self._cancel_esc_sequence()
         self.write('?')
 
     def _escape(self):
         """
-        Handles the escape character as well as escape sequences that may end
-        with an escape character.
+        Handles the escape character by putting the parser into
+        :attr:`self.STATE_ESCAPE`.  Whatever sequence was in progress gets
+        abandoned (OSC and DCS strings are dispatched by
+        :meth:`Terminal._parse_string` before we get here).
         """
-        buf = self.esc_buffer
-        if buf.startswith('\x1bP') or buf.startswith('\x1b]'):
-            # CSRs and OSCs are special
-            self.esc_buffer += '\x1b'
-        else:
-            # Get rid of whatever's there since we obviously didn't know what to
-            # do with it
-            self.esc_buffer = '\x1b'
+        self.esc_state = self.STATE_ESCAPE
+        self.esc_intermediate = ''
 
     def _csi(self):
         """
         Marks the start of a CSI escape sequence (which is itself a character)
-        by setting :attr:`self.esc_buffer` to '\\\\x1b[' (which is the CSI
-        escape sequence).
+        by putting the parser into :attr:`self.STATE_CSI` (exactly as if we'd
+        received '\\x1b[').
+        """
+        self.esc_state = self.STATE_CSI
+        self.esc_params = ''
+        self.esc_intermediate = ''
+
+    def _parse_escape(self, chars, pos):
+        """
+        Handles the character at *pos* in *chars* when the previous character
+        was an ESC.  Returns the position of the next character to be handled.
+
+        Depending on the character this will either start a longer sequence
+        (CSI, OSC, DCS, etc) or call the matching handler in
+        :attr:`self.esc_handlers`.
+        """
+        char = chars[pos]
+        charnum = ord(char)
+        if charnum in self.specials:
+            # Control characters get executed in the middle of sequences
+            self.specials[charnum]()
+        elif char in self.esc_transitions:
+            self.esc_state = self.esc_transitions[char]
+            self.esc_params = ''
+            self.esc_intermediate = ''
+            self.esc_string = []
+        elif 0x20 <= charnum <= 0x2f: # Intermediate (e.g. '(' in ESC ( B)
+            self.esc_intermediate = char
+            self.esc_state = self.STATE_ESCAPE_INTERMEDIATE
+        elif charnum >= 0x20: # Everything else is a final character
+            self.esc_state = self.STATE_GROUND
+            self._esc_dispatch(char)
+        return pos + 1
+
+    def _parse_escape_intermediate(self, chars, pos):
+        """
+        Handles the character at *pos* in *chars* after an ESC and an
+        intermediate character (e.g. the 'B' in ESC ( B).  Returns the
+        position of the next character to be handled.
+        """
+        char = chars[pos]
+        charnum = ord(char)
+        if charnum in self.specials:
+            self.specials[charnum]()
+        elif 0x20 <= charnum <= 0x2f:
+            self.esc_intermediate += char
+        elif charnum >= 0x20:
+            self.esc_state = self.STATE_GROUND
+            self._esc_dispatch(char, self.esc_intermediate)
+        return pos + 1
+
+    def _esc_dispatch(self, final, intermediate=''):
+        """
+        Calls the handler in :attr:`self.esc_handlers` that matches the given
+        escape sequence.  For example, ESC 7 results in
+        ``self.esc_handlers['7']()`` and ESC ( B results in
+        ``self.esc_handlers['(']('B')``.
         """
-        self.esc_buffer = '\x1b['
+        try:
+            if intermediate:
+                self.esc_handlers[intermediate[0]](intermediate[1:] + final)
+            else:
+                self.esc_handlers[final]()
+        except KeyError:
+            logging.warning(_(
+                "Warning: No ESC sequence handler for %s"
+                % `'\x1b' + intermediate + final`
+            ))
+
+    def _parse_csi(self, chars, pos):
+        """
+        Collects the parameters (e.g. '0;1;37') of a CSI escape sequence
+        starting at *pos* in *chars* and calls the matching handler in
+        :attr:`self.csi_handlers` when the final character (e.g. 'm') arrives.
+        Returns the position of the next character to be handled.
+
+        CSI handlers get called with the parameters as a string::
+
+            self.csi_handlers['m']('0;1;37')
+        """
+        if not self.esc_intermediate:
+            match_obj = self.RE_CSI_PARAMS.match(chars, pos)
+            if match_obj:
+                self.esc_params += match_obj.group()
+                pos = match_obj.end()
+                if pos == len(chars):
+                    return pos
+        char = chars[pos]
+        charnum = ord(char)
+        if 0x40 <= charnum <= 0x7e: # Final character
+            self.esc_state = self.STATE_GROUND
+            params = self.esc_params
+            intermediate = self.esc_intermediate
+            if intermediate == '!':
+                # Handlers like reset() want to see it (e.g. '\x1b[!p')
+                params += intermediate
+            elif intermediate:
+                # Not supported (e.g. DECSCUSR: '\x1b[2 q')
+                return pos + 1
+            try:
+                self.csi_handlers[char](params)
+            except ValueError:
+                # Commented this out because it can be super noisy
+                #logging.error(_(
+                    #"CSI Handler Error: Type: %s, Values: %s" %
+                    #(char, params)
+                #))
+                pass
+            except KeyError:
+                logging.warning(_(
+                    "Warning: No ESC sequence handler for %s"
+                    % `'\x1b[' + params + char`
+                ))
+        elif 0x20 <= charnum <= 0x2f:
+            self.esc_intermediate += char
+        elif charnum in self.specials:
+            self.specials[charnum]()
+        elif charnum >= 0x20 and charnum != 0x7f:
+            # Parameters after an intermediate or some other garbage
+            self.esc_state = self.STATE_CSI_IGNORE
+        return pos + 1
+
+    def _parse_csi_ignore(self, chars, pos):
+        """
+        Skips over the remainder of a malformed CSI escape sequence (up to and
+        including its final character).  Returns the position of the next
+        character to be handled.
+        """
+        char = chars[pos]
+        charnum = ord(char)
+        if 0x40 <= charnum <= 0x7e:
+            self.esc_state = self.STATE_GROUND
+        elif charnum in self.specials:
+            self.specials[charnum]()
+        return pos + 1
+
+    def _parse_string(self, chars, pos):
+        """
+        Collects the contents of an OSC or DCS string (or skips over an SOS, PM,
+        or APC string) starting at *pos* in *chars*.  Returns the position of
+        the next character to be handled.
+
+        OSC strings end with a bell (\\x07) and DCS strings end with a string
+        terminator (ST aka ESC \\).  Once complete the string gets passed to
+        :meth:`Terminal._osc_handler` or ``self.esc_handlers['P']``,
+        respectively.  Since the contents are searched for the terminator in
+        bulk long titles and the like are cheap to handle.
+        """
+        state = self.esc_state
+        match_obj = self.RE_STRING_END.search(chars, pos)
+        if not match_obj: # Not done yet
+            if state != self.STATE_IGNORE_STRING:
+                self.esc_string.append(chars[pos:])
+            return len(chars)
+        end = match_obj.start()
+        char = chars[end]
+        if state != self.STATE_IGNORE_STRING:
+            self.esc_string.append(chars[pos:end])
+        if char == u'\x07' and state != self.STATE_OSC:
+            # Only OSC strings can be terminated with a bell
+            if state == self.STATE_DCS:
+                self.esc_string.append(char)
+            return end + 1
+        string = u''.join(self.esc_string)
+        self._cancel_esc_sequence()
+        if char == u'\x18': # CAN
+            return end + 1
+        if char == u'\x1b':
+            # The ESC of an ST (ESC \) or the start of some other sequence;
+            # either way this string is done.
+            self._escape()
+        if state == self.STATE_OSC:
+            self._osc_handler(string)
+        elif state == self.STATE_DCS:
+            self.esc_handlers['P'](string)
+        return end + 1
+
+    def _find_capture(self, spooled=0):
+        """
+        Looks for the end of the file being captured in :attr:`self.capture`,
+        setting :attr:`self.capture_match` to the (start, end) of the file
+        within it if found.  *spooled* is how much of :attr:`self.capture` had
+        already been searched by previous calls.
+
+        If the matching :class:`FileType` has a :attr:`~FileType.terminator`
+        only the new output (plus enough of the old to catch a terminator that
+        was split across writes) is searched for it and
+        :attr:`self.capture_regex` only gets run when one turns up.  Otherwise
+        :attr:`self.capture_regex` gets checked against all of
+        :attr:`self.capture` every time.
+        """
+        terminator = self.magic_map[self.matched_header].terminator
+        if terminator:
+            spooled = max(0, spooled - len(terminator) + 1)
+            if self.capture.find(terminator, spooled) == -1:
+                return # Nothing new
+        match = self.capture_regex.search(self.capture)
+        if match:
+            logging.debug(
+                "Matched %s format (%s, %s).  Capturing..." % (
+                self.magic_map[self.matched_header].name,
+                self.cursorY, self.cursorX))
+            self.capture_match = match.span()
 
     def _capture_file(self):
         """
@@ -2400,6 +3600,7 @@ class Terminal(object):
                 # Before doing anything else we need to mark the current cursor
                 # location as belonging to our file
                 self.screen[self.cursorY][self.cursorX] = ref
+                self.dirty_rows.add(self.cursorY)
                 # Create an instance of the filetype we can reference
                 filetype_instance = self.magic_map[magic_header](
                     path=self.temppath,
@@ -2407,53 +3608,131 @@ class Terminal(object):
                     icondir=self.icondir)
                 self.captured_files[ref] = filetype_instance
                 filetype_instance.capture(self.capture, self)
-                # Start up an open file watcher so leftover file objects get
-                # closed when they're no longer being used
-                if not self.watcher or not self.watcher.isAlive():
-                    import threading
-                    self.watcher = threading.Thread(
-                        name='watcher', target=self._captured_fd_watcher)
-                    self.watcher.setDaemon(True)
-                    self.watcher.start()
+                # The capture() method may have moved our reference around
+                self.dirty_rows.update(xrange(self.rows))
                 return
 
-    def _captured_fd_watcher(self):
+    def set_executor(self, executor):
         """
-        Meant to be run inside of a thread, calls close_captured_fds() until there
-        are no more open image file descriptors.
+        Makes slow, blocking work like decoding and thumbnailing captured images
+        happen in *executor* (e.g. a
+        :class:`concurrent.futures.ThreadPoolExecutor`) instead of inside of
+        :meth:`write`.  The results get applied from one of *executor*'s
+        threads unless a scheduler has been set (see :meth:`set_scheduler`).
         """
-        logging.debug("starting _captured_fd_watcher()")
-        import time
-        quitting = False
-        while not quitting:
-            if self.captured_files:
-                self.close_captured_fds()
-                time.sleep(5)
-            else:
-                quitting = True
-        logging.debug('_captured_fd_watcher() quitting: No more images.')
+        self.executor = executor
+
+    def run_in_executor(self, ref, callback, func, *args):
+        """
+        Calls *func(\*args)* in :attr:`self.executor` and then calls
+        *callback* with the result (or None if *func* raised an exception).
+        Afterwards, the rows containing *ref* (the captured file's reference
+        character) get re-rendered via :meth:`send_update`.
+
+        If there's no executor *func* and *callback* will be called
+        immediately.
+        """
+        def finished(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(_("Error processing captured file: %s" % e))
+                result = None
+            callback(result)
+            self._file_processed(ref)
+        if not self.executor:
+            try:
+                result = func(*args)
+            except Exception as e:
+                logging.error(_("Error processing captured file: %s" % e))
+                result = None
+            callback(result)
+            return
+        future = self.executor.submit(func, *args)
+        if self.call_soon:
+            future.add_done_callback(
+                lambda future: self.call_soon(lambda: finished(future)))
+        else:
+            future.add_done_callback(finished)
+
+    def _file_processed(self, ref):
+        """
+        Marks the rows containing *ref* as dirty and calls :meth:`send_update`
+        so the placeholder for the captured file gets replaced.
+        """
+        for y, line in enumerate(self.screen):
+            if ref in line:
+                self.dirty_rows.add(y)
+        # It may have been scrolled off the screen in the meantime
+        for i, line in enumerate(self.scrollback_buf):
+            if ref in line:
+                self.scrollback_html[i] = False
+        self.send_update()
 
     def close_captured_fds(self):
         """
-        Closes the file descriptors of any captured files that are no longer on
-        the screen.
+        Closes (which also removes the temporary files of) any captured files
+        that are no longer referenced on the screen, the saved (alternate)
+        screen, or in the scrollback buffer.
+
+        Rather than searching everything for every file, only the rows of the
+        screen that changed since the last call (according to
+        :attr:`self.dirty_rows`) get checked.  References in the scrollback
+        buffer are counted as lines enter and leave it.
+
+        This gets called once per IOLoop loop after :meth:`write` (see
+        :meth:`_schedule_fd_check`) whether or not anything ever renders the
+        screen and by :meth:`_spanify_screen` right before
+        :attr:`self.dirty_rows` gets emptied.
         """
-        #logging.debug('close_captured_fds()') # Commented because it's kinda noisy
-        if self.captured_files:
-            for ref in self.captured_files.keys():
-                found = False
-                for line in self.screen:
-                    if ref in line:
-                        found = True
-                        break
-                if self.alt_screen:
-                    for line in self.alt_screen:
-                        if ref in line:
-                            found = True
-                            break
-                if not found:
-                    #self.captured_files[ref].close()
-                    del self.captured_files[ref]
+        if not self.captured_files:
+            return
+        screen = self.screen
+        rows = len(screen)
+        screen_files = self.screen_files
+        html_cache = self.html_cache
+        if len(html_cache) != rows and html_cache is not self.full_scan:
+            # Everything will be re-rendered (no telling which rows changed)
+            self.full_scan = html_cache
+            screen_files.clear()
+            changed_rows = xrange(rows)
+        else:
+            changed_rows = set(row % rows for row in self.dirty_rows)
+        find_refs = self.RE_SPECIAL.findall
+        for y in changed_rows:
+            refs = find_refs(screen[y].tounicode())
+            if refs:
+                screen_files[y] = set(refs)
+            else:
+                screen_files.pop(y, None)
+        in_use = set(self.alt_screen_files)
+        in_use.update(self.scrollback_files)
+        for refs in screen_files.itervalues():
+            in_use.update(refs)
+        for ref in self.captured_files.keys():
+            if ref not in in_use:
+                self.captured_files.pop(ref).close()
+
+    def _schedule_fd_check(self):
+        """
+        Schedules a call to :meth:`close_captured_fds` (if one isn't already
+        scheduled) so that many writes in a row only result in one check.  If
+        there's no scheduler (see :meth:`set_scheduler`) it gets called
+        immediately.
+        """
+        if not self.call_soon:
+            self.close_captured_fds()
+        elif not self.fd_check_scheduled:
+            self.fd_check_scheduled = True
+            self.call_soon(self._scheduled_fd_check)
+
+    def _scheduled_fd_check(self):
+        """
+        Calls :meth:`close_captured_fds` (scheduled by
+        :meth:`_schedule_fd_check`).
+        """
+        self.fd_check_scheduled = False
+        self.close_captured_fds()
 
     def _string_terminator(self):
         """
@@ -2464,58 +3743,43 @@ class Terminal(object):
         # NOTE: Might this just call _cancel_esc_sequence?  I need to double-check.
         pass
 
-    def _osc_handler(self):
+    def _osc_handler(self, string):
         """
         Handles Operating System Command (OSC) escape sequences which need
         special care since they are of indeterminiate length and end with
-        either a bell (\\\\x07) or a sequence terminator (\\\\x9c aka ST).  This
-        will usually be called from :meth:`Terminal.bell` to set the title of
-        the terminal (just like an xterm) but it is also possible to be called
-        directly whenever an ST is encountered.
-        """
-        # Try the title sequence first
-        match_obj = self.RE_TITLE_SEQ.match(self.esc_buffer)
-        if match_obj:
-            self.esc_buffer = ''
-            title = match_obj.group(1)
-            self.set_title(title) # Sets self.title
+        either a bell (\\x07) or a sequence terminator (ESC \\ aka ST).  This
+        will be called by :meth:`Terminal._parse_string` with the complete
+        *string* (everything between '\\x1b]' and the terminator) to set the
+        title of the terminal (just like an xterm) or to pass the string along
+        to :meth:`Terminal._opt_handler`.
+        """
+        # Try the title sequence first (e.g. '0;title')
+        if string[:2] in (u'0;', u'1;', u'2;'):
+            self.set_title(string[2:]) # Sets self.title
             return
         # Next try our special optional handler sequence
-        match_obj = self.RE_OPT_SEQ.match(self.esc_buffer)
-        if match_obj:
-            self.esc_buffer = ''
-            text = match_obj.group(1)
-            self._opt_handler(text)
+        if string.startswith(u'_;') and len(string) > 2:
+            self._opt_handler(string[2:])
             return
         # At this point we've encountered something unusual
         logging.warning(_("Warning: No special ESC sequence handler for %s" %
-            `self.esc_buffer`))
-        self.esc_buffer = ''
+            `u'\x1b]' + string`))
 
     def bell(self):
         """
         Handles the bell character and executes
-        :meth:`Terminal.callbacks[CALLBACK_BELL]` (if we are not in the middle
-        of an escape sequence that ends with a bell character =).  If we *are*
-        in the middle of an escape sequence, calls :meth:`self._osc_handler`
-        since we can be nearly certain that we're simply terminating an OSC
-        sequence. Isn't terminal emulation grand? ⨀_⨀
-        """
-        # NOTE: A little explanation is in order: The bell character (\x07) by
-        #       itself should play a bell (pretty straighforward).  However, if
-        #       the bell character is at the tail end of a particular escape
-        #       sequence (string starting with \x1b]0;) this indicates an xterm
-        #       title (everything between \x1b]0;...\x07).
-        if not self.esc_buffer: # We're not in the middle of an esc sequence
-            logging.debug('Regular bell')
-            try:
-                for callback in self.callbacks[CALLBACK_BELL].values():
-                    callback()
-            except TypeError:
-                pass
-        else: # We're (likely) setting a title
-            self.esc_buffer += '\x07' # Add the bell char so we don't lose it
-            self._osc_handler()
+        :meth:`Terminal.callbacks[CALLBACK_BELL]`.  A bell character that
+        terminates an OSC sequence (e.g. '\\x1b]0;title\\x07') never makes it
+        here; :meth:`Terminal._parse_string` takes care of those.
+        """
+        logging.debug('Regular bell')
+        if self.fast_forward:
+            return # Nobody wants to hear a bell for every one of these
+        try:
+            for callback in self.callbacks[CALLBACK_BELL].values():
+                callback()
+        except TypeError:
+            pass
 
     def _device_status_report(self, n=None):
         """
@@ -2705,6 +3969,12 @@ class Terminal(object):
             # Save the existing screen and renditions
             self.alt_screen = self.screen[:]
             self.alt_renditions = self.renditions[:]
+            self.alt_screen_files = set()
+            if self.captured_files:
+                find_refs = self.RE_SPECIAL.findall
+                for line in self.alt_screen:
+                    self.alt_screen_files.update(find_refs(line.tounicode()))
+            self.alt_wrapped_rows = self.wrapped_rows
             # Make a fresh one
             self.clear_screen()
         else:
@@ -2712,13 +3982,14 @@ class Terminal(object):
             if self.alt_screen and self.alt_renditions:
                 self.screen = self.alt_screen[:]
                 self.renditions = self.alt_renditions[:]
+                self.wrapped_rows = self.alt_wrapped_rows
+            self.alt_wrapped_rows = {}
             # Empty out the alternate buffer (to save memory)
             self.alt_screen = None
             self.alt_renditions = None
+            self.alt_screen_files = set()
         # These all need to be reset no matter what
         self.cur_rendition = unichr(1000)
-        self.prev_dump = []
-        self.prev_dump_rend = []
         self.html_cache = []
 
     def toggle_alternate_screen_buffer_cursor(self, alt):
@@ -2782,6 +4053,7 @@ class Terminal(object):
         for i in xrange(n):
             self.screen[self.cursorY].pop() # Take one down, pass it around
             self.screen[self.cursorY].insert(self.cursorX, u' ')
+        self.dirty_rows.add(self.cursorY)
 
     def delete_characters(self, n=1):
         """
@@ -2809,6 +4081,7 @@ class Terminal(object):
                 # At edge of screen, ignore
                 #print('IndexError in delete_characters(): %s' % e)
                 pass
+        self.dirty_rows.add(self.cursorY)
 
     def _erase_characters(self, n=1):
         """
@@ -2827,26 +4100,15 @@ class Terminal(object):
         for i in xrange(n):
             self.screen[self.cursorY][self.cursorX+i] = u' '
             self.renditions[self.cursorY][self.cursorX+i] = unichr(1000)
+        self.dirty_rows.add(self.cursorY)
 
     def cursor_left(self, n=1):
         """ESCnD CUB (Cursor Back)"""
         # Commented out to save CPU (and the others below too)
         #logging.debug('cursor_left(%s)' % n)
         n = int(n)
-        # This logic takes care of double-width unicode characters
-        if self.double_width_left:
-            self.double_width_left = False
-            return
         self.cursorX = max(0, self.cursorX - n)
-        char = self.screen[self.cursorY][self.cursorX]
-        if unicodedata.east_asian_width(char) == 'W':
-            # This lets us skip the next call (get called 2x for 2x width)
-            self.double_width_left = True
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_right(self, n=1):
         """ESCnC CUF (Cursor Forward)"""
@@ -2854,20 +4116,8 @@ class Terminal(object):
         if not n:
             n = 1
         n = int(n)
-        # This logic takes care of double-width unicode characters
-        if self.double_width_right:
-            self.double_width_right = False
-            return
         self.cursorX += n
-        char = self.screen[self.cursorY][self.cursorX]
-        if unicodedata.east_asian_width(char) == 'W':
-            # This lets us skip the next call (get called 2x for 2x width)
-            self.double_width_right = True
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_up(self, n=1):
         """ESCnA CUU (Cursor Up)"""
@@ -2876,11 +4126,7 @@ class Terminal(object):
             n = 1
         n = int(n)
         self.cursorY = max(0, self.cursorY - n)
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_down(self, n=1):
         """ESCnB CUD (Cursor Down)"""
@@ -2889,11 +4135,7 @@ class Terminal(object):
             n = 1
         n = int(n)
         self.cursorY = min(self.rows, self.cursorY + n)
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_next_line(self, n):
         """ESCnE CNL (Cursor Next Line)"""
@@ -2903,11 +4145,7 @@ class Terminal(object):
         n = int(n)
         self.cursorY = min(self.rows, self.cursorY + n)
         self.cursorX = 0
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_previous_line(self, n):
         """ESCnF CPL (Cursor Previous Line)"""
@@ -2917,11 +4155,7 @@ class Terminal(object):
         n = int(n)
         self.cursorY = max(0, self.cursorY - n)
         self.cursorX = 0
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_horizontal_absolute(self, n):
         """ESCnG CHA (Cursor Horizontal Absolute)"""
@@ -2929,11 +4163,7 @@ class Terminal(object):
             n = 1
         n = int(n)
         self.cursorX = n - 1 # -1 because cols is 0-based
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_position(self, coordinates):
         """
@@ -2964,24 +4194,8 @@ class Terminal(object):
         row = max(0, row - 1)
         col = max(0, col - 1)
         self.cursorY = row
-        # The column needs special attention in case there's double-width
-        # characters.
-        double_width = 0
-        if self.cursorY < self.rows:
-            for i, char in enumerate(self.screen[self.cursorY]):
-                if i == col - double_width:
-                    # No need to continue further
-                    break
-                if unicodedata.east_asian_width(char) == 'W':
-                    double_width += 1
-            if double_width:
-                col = col - double_width
         self.cursorX = col
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_cursor_update()
 
     def cursor_position_vertical(self, n):
         """
@@ -3014,12 +4228,17 @@ class Terminal(object):
             # Bottom of screen; nothing to do
             return
         self.screen[self.cursorY+1:] = [
-            array('u', u' ' * self.cols) for a in self.screen[self.cursorY+1:]
+            array('u', u' ' * self.cols)
+            for a in xrange(self.cursorY + 1, len(self.screen))
         ]
         c = self.cur_rendition # Just to save space below
         self.renditions[self.cursorY+1:] = [
-            array('u', c * self.cols) for a in self.renditions[self.cursorY+1:]
+            array('u', c * self.cols)
+            for a in xrange(self.cursorY + 1, len(self.renditions))
         ]
+        self.wrapped_rows = dict((y, end)
+            for y, end in self.wrapped_rows.items() if y <= self.cursorY)
+        self.dirty_rows.update(xrange(self.cursorY + 1, len(self.screen)))
 
     def clear_screen_from_cursor_up(self):
         """
@@ -3027,12 +4246,15 @@ class Terminal(object):
         """
         #logging.debug('clear_screen_from_cursor_up()')
         self.screen[:self.cursorY+1] = [
-            array('u', u' ' * self.cols) for a in self.screen[:self.cursorY]
+            array('u', u' ' * self.cols) for a in xrange(self.cursorY + 1)
         ]
         c = self.cur_rendition
         self.renditions[:self.cursorY+1] = [
-            array('u', c * self.cols) for a in self.renditions[:self.cursorY]
+            array('u', c * self.cols) for a in xrange(self.cursorY + 1)
         ]
+        self.wrapped_rows = dict((y, end)
+            for y, end in self.wrapped_rows.items() if y > self.cursorY)
+        self.dirty_rows.update(xrange(self.cursorY + 1))
         self.cursorY = 0
 
     def clear_screen_from_cursor(self, n):
@@ -3061,16 +4283,8 @@ class Terminal(object):
         except KeyError:
             logging.error(_("Error: Unsupported number for escape sequence J"))
         # Execute our callbacks
-        try:
-            for callback in self.callbacks[CALLBACK_CHANGED].values():
-                callback()
-        except TypeError:
-            pass
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_update()
+        self.send_cursor_update()
 
     def clear_line_from_cursor_right(self):
         """
@@ -3085,6 +4299,8 @@ class Terminal(object):
         self.screen[self.cursorY] = saved + spaces
         # Reset the cursor position's rendition to the end of the line
         self.renditions[self.cursorY] = saved_renditions + renditions
+        self.wrapped_rows.pop(self.cursorY, None)
+        self.dirty_rows.add(self.cursorY)
 
     def clear_line_from_cursor_left(self):
         """
@@ -3098,6 +4314,7 @@ class Terminal(object):
             self.cur_rendition * len(self.screen[self.cursorY][:self.cursorX]))
         self.screen[self.cursorY] = spaces + saved
         self.renditions[self.cursorY] = renditions + saved_renditions
+        self.dirty_rows.add(self.cursorY)
 
     def clear_line(self):
         """
@@ -3107,6 +4324,8 @@ class Terminal(object):
         self.screen[self.cursorY] = array('u', u' ' * self.cols)
         c = self.cur_rendition
         self.renditions[self.cursorY] = array('u', c * self.cols)
+        self.wrapped_rows.pop(self.cursorY, None)
+        self.dirty_rows.add(self.cursorY)
         self.cursorX = 0
 
     def clear_line_from_cursor(self, n):
@@ -3137,16 +4356,8 @@ class Terminal(object):
             logging.error(_(
                 "Error: Unsupported number for CSI escape sequence K"))
         # Execute our callbacks
-        try:
-            for callback in self.callbacks[CALLBACK_CHANGED].values():
-                callback()
-        except TypeError:
-            pass
-        try:
-            for callback in self.callbacks[CALLBACK_CURSOR_POS].values():
-                callback()
-        except TypeError:
-            pass
+        self.send_update()
+        self.send_cursor_update()
 
     def set_led_state(self, n):
         """
@@ -3206,6 +4417,7 @@ class Terminal(object):
                     # Make it all longer
                     self.renditions[cursorY].append(u' ') # Make it longer
                     self.screen[cursorY].append(u'\x00') # This needs to match
+                    self.dirty_rows.add(cursorY)
             except IndexError:
                 # This can happen if the rate limiter kicks in and starts
                 # cutting off escape sequences at random.
@@ -3219,6 +4431,17 @@ class Terminal(object):
             # First char in PUA Plane 16 is always the default:
             self.cur_rendition = unichr(1000) # Should be reset (e.g. [0])
             return # No need for further processing; save some CPU
+        # Apps tend to use the same handful of renditions over and over again
+        # so check the cache before doing any real work
+        rendition_cache = self.rendition_cache
+        cache_key = (self.cur_rendition, n)
+        try:
+            # Pop and re-add it so it becomes the most recently used
+            self.cur_rendition = rendition_cache[cache_key] = (
+                rendition_cache.pop(cache_key))
+            return
+        except KeyError:
+            pass
         # Convert the string (e.g. '0;1;32') to a list (e.g. [0,1,32]
         new_renditions = [int(a) for a in n.split(';') if a != '']
         # Handle 256-color renditions by getting rid of the (38|48);5 part and
@@ -3255,37 +4478,91 @@ class Terminal(object):
             # If it starts with 0 there's no need to combine it with the
             # previous rendition...
             reduced = _reduce_renditions(out_renditions)
-            if reduced not in self.renditions_store.values():
-                new_ref_point = self.rend_counter.next()
-                self.renditions_store.update({new_ref_point: reduced})
-                self.cur_rendition = new_ref_point
-            else: # Find the right reference point to use
-                for k, v in self.renditions_store.items():
-                    if reduced == v:
-                        self.cur_rendition = k
-            return
-        new_renditions = out_renditions
-        cur_rendition_list = self.renditions_store[self.cur_rendition]
-        reduced = _reduce_renditions(cur_rendition_list + new_renditions)
-        if reduced not in self.renditions_store.values():
-            new_ref_point = self.rend_counter.next()
-            self.renditions_store.update({new_ref_point: reduced})
-            self.cur_rendition = new_ref_point
-        else: # Find the right reference point to use
-            for k, v in self.renditions_store.items():
-                if reduced == v:
-                    self.cur_rendition = k
+        else:
+            cur_rendition_list = self.renditions_store[self.cur_rendition]
+            reduced = _reduce_renditions(cur_rendition_list + out_renditions)
+        self.cur_rendition = rendition_cache[cache_key] = (
+            self._intern_rendition(reduced))
+        if len(rendition_cache) > self.RENDITION_CACHE_SIZE:
+            rendition_cache.popitem(last=False) # Least recently used
+
+    def _intern_rendition(self, renditions):
+        """
+        Returns the reference character in :attr:`self.renditions_store` that
+        matches the given list of (reduced) *renditions*.  If there isn't one a
+        new reference will be created.
+        """
+        key = tuple(renditions)
+        try:
+            return self.renditions_index[key]
+        except KeyError:
+            pass
+        if len(self.renditions_store) > self.renditions_gc_threshold:
+            self.collect_renditions()
+        if self.renditions_free:
+            ref = self.renditions_free.pop()
+        else:
+            ref = self.rend_counter.next()
+            if ref in self.renditions_store:
+                # The counter wrapped around; free up what we can
+                self.collect_renditions()
+                if self.renditions_free:
+                    ref = self.renditions_free.pop()
+                else: # Every last reference is in use
+                    logging.warning(_(
+                        "Ran out of rendition references; reusing %s" % `ref`))
+                    old = self.renditions_store[ref]
+                    self.renditions_index.pop(tuple(old), None)
+                    self.rendition_cache.clear()
+                    self.span_cache.clear()
+        self.renditions_store[ref] = renditions
+        self.renditions_index[key] = ref
+        return ref
+
+    def collect_renditions(self):
+        """
+        Removes renditions from :attr:`self.renditions_store` that are no
+        longer referenced anywhere (the screen, the alternate screen, the
+        scrollback buffer, etc) so their reference characters can be reused.
+        Returns the number of renditions that were removed.
+
+        .. note:: This gets called automatically whenever :attr:`self.renditions_store` grows past :attr:`self.renditions_gc_threshold` so there's usually no need to call it directly.
+        """
+        live = set([u' ', unichr(1000), self.cur_rendition])
+        if isinstance(self.saved_rendition, unicode):
+            live.add(self.saved_rendition)
+        for renditions in (
+                self.renditions,
+                self.alt_renditions or [],
+                self.scrollback_renditions):
+            for rendition in renditions:
+                live.update(rendition)
+        freed = [ref for ref in self.renditions_store if ref not in live]
+        for ref in freed:
+            renditions = self.renditions_store.pop(ref)
+            self.renditions_index.pop(tuple(renditions), None)
+        self.renditions_free.extend(freed)
+        if freed:
+            # Cached results may refer to the freed renditions
+            self.rendition_cache.clear()
+            self.span_cache.clear()
+        self.renditions_gc_threshold = max(
+            self.RENDITIONS_GC_THRESHOLD, len(self.renditions_store) * 2)
+        logging.debug(
+            "collect_renditions() freed %s renditions (%s left)" % (
+            len(freed), len(self.renditions_store)))
+        return len(freed)
 
     def _opt_handler(self, chars):
         """
-        Optional special escape sequence handler for sequences matching
-        RE_OPT_SEQ.  If CALLBACK_OPT is defined it will be called like so::
+        Optional special escape sequence handler for OSC sequences starting
+        with '_;'.  If CALLBACK_OPT is defined it will be called like so::
 
             self.callbacks[CALLBACK_OPT](chars)
 
         Applications can use this escape sequence to define whatever special
-        handlers they like.  It works like this: If an escape sequence is
-        encountered matching RE_OPT_SEQ this method will be called with the
+        handlers they like.  It works like this: If such an escape sequence is
+        encountered this method will be called with the
         inbetween *chars* (e.g. \x1b]_;<chars>\x07) as the argument.
 
         Applications can then do what they wish with *chars*.
@@ -3299,6 +4576,135 @@ class Terminal(object):
             # High likelyhood that nothing is defined.  No biggie.
             pass
 
+    def _rendition_classes(self, ref):
+        """
+        Returns the CSS classes (as a space-separated string) that correspond
+        to the rendition referenced by *ref* (a key in
+        :attr:`self.renditions_store`).  If *ref* is None an empty string will
+        be returned.
+        """
+        if ref is None:
+            return u''
+        foregrounds = ('f0','f1','f2','f3','f4','f5','f6','f7')
+        backgrounds = ('b0','b1','b2','b3','b4','b5','b6','b7')
+        current_classes = set()
+        for _class in imap(RENDITION_CLASSES.get, self.renditions_store[ref]):
+            if not _class or _class in current_classes:
+                continue
+            if 'reset' in _class:
+                if _class == 'reset':
+                    current_classes = set()
+                else:
+                    reset_class = _class.split('reset')[0]
+                    if reset_class == 'foreground':
+                        current_classes.difference_update(foregrounds)
+                    elif reset_class == 'background':
+                        current_classes.difference_update(backgrounds)
+                    else:
+                        # Trying to reset something that was never set is OK
+                        current_classes.discard(reset_class)
+            else:
+                if _class in foregrounds:
+                    current_classes.difference_update(foregrounds)
+                elif _class in backgrounds:
+                    current_classes.difference_update(backgrounds)
+                current_classes.add(_class)
+        return u" ".join(current_classes)
+
+    def _span_markup(self, prev_ref, ref):
+        """
+        Returns the markup required to switch from the rendition referenced by
+        *prev_ref* to the one referenced by *ref* (closing and opening <span>
+        elements as necessary).  Either may be None (start or end of a line).
+
+        The result gets stored in :attr:`self.span_cache` so we only have to
+        figure this out once for any given pair of renditions.
+        """
+        prev_classes = self._rendition_classes(prev_ref)
+        classes = self._rendition_classes(ref)
+        markup = u''
+        if classes != prev_classes:
+            if prev_classes:
+                markup = u'</span>'
+            if classes:
+                markup += u'<span class="%s">' % classes
+        self.span_cache[(prev_ref, ref)] = markup
+        return markup
+
+    def _htmlify(self, text, specials=False):
+        """
+        Converts ampersands and lt/gt in *text* to HTML entities.  If *specials*
+        is True any references to captured files will also be replaced with
+        their respective HTML.
+        """
+        if u'&' in text:
+            text = text.replace(u'&', u'&amp;')
+        if u'<' in text:
+            text = text.replace(u'<', u'&lt;')
+        if u'>' in text:
+            text = text.replace(u'>', u'&gt;')
+        if WIDE_PLACEHOLDER in text:
+            text = text.replace(WIDE_PLACEHOLDER, u'')
+        if specials:
+            captured_files = self.captured_files
+            text = u''.join(
+                captured_files[char].html() if char in captured_files else char
+                for char in text)
+        return text
+
+    def _spanify_line(self, line, rendition, cursorX=None):
+        """
+        Returns the given *line* (an array of characters) as HTML using
+        *rendition* (the matching array of rendition references) to wrap each
+        run of characters that share the same rendition in the appropriate
+        <span>.  If *cursorX* is given the character at that position will be
+        marked as the cursor via '<span class="cursor">'.
+
+        Returns None if the line is empty.
+
+        .. note:: Used by both `_spanify_screen` and `_spanify_scrollback`.
+        """
+        # NOTE: Why these duplicates of self.*?  Local variable lookups are
+        # faster--especially in loops.
+        span_cache = self.span_cache
+        htmlify = self._htmlify
+        line = line.tounicode()
+        rendition = rendition.tounicode()
+        specials = self.RE_SPECIAL.search(line)
+        if cursorX and line[cursorX:cursorX+1] == WIDE_PLACEHOLDER:
+            cursorX -= 1 # Draw the cursor over the whole double-width character
+        outline = []
+        prev_ref = None
+        # Handle each run of characters that share the same rendition in one go.
+        # The markup between runs comes from the span_cache.
+        for match_obj in self.RE_RUNS.finditer(rendition, 0, len(line)):
+            ref = match_obj.group(1)
+            if ref == u' ': # No rendition; keep using the last one
+                ref = prev_ref
+            if ref != prev_ref:
+                try:
+                    outline.append(span_cache[(prev_ref, ref)])
+                except KeyError:
+                    outline.append(self._span_markup(prev_ref, ref))
+                prev_ref = ref
+            start, end = match_obj.span()
+            if cursorX is not None and start <= cursorX < end:
+                outline.append(htmlify(line[start:cursorX], specials))
+                outline.append(u'<span class="cursor">%s</span>' %
+                    htmlify(line[cursorX], specials))
+                outline.append(htmlify(line[cursorX+1:end], specials))
+            else:
+                outline.append(htmlify(line[start:end], specials))
+        if prev_ref is not None:
+            # Make sure all renditions terminate at the end of the line
+            try:
+                outline.append(span_cache[(prev_ref, None)])
+            except KeyError:
+                outline.append(self._span_markup(prev_ref, None))
+        # NOTE: The client has been programmed to treat None (aka null in
+        #       JavaScript) as blank lines.
+        return u''.join(outline) or None # 'null' is shorter than 4 spaces
+
     def _spanify_screen(self):
         """
         Iterates over the lines in *screen* and *renditions*, applying HTML
@@ -3307,229 +4713,75 @@ class Terminal(object):
         appropriate location.
         """
         #logging.debug("_spanify_screen()")
+        if self.captured_files:
+            # Has to happen before self.dirty_rows gets emptied below
+            self.close_captured_fds()
         results = []
-        # NOTE: Why these duplicates of self.* and globals?  Local variable
-        # lookups are faster--especially in loops.
-        special = SPECIAL
-        rendition_classes = RENDITION_CLASSES
         screen = self.screen
-        renditions = self.renditions
-        renditions_store = self.renditions_store
+        html_cache = self.html_cache
+        spanify_line = self._spanify_line
         cursorX = self.cursorX
         cursorY = self.cursorY
-        if len(self.prev_dump) != len(screen):
+        # Only the rows that have been modified since the last dump (and the
+        # rows that the cursor is on or just left) need to be re-rendered
+        dirty_rows = self.dirty_rows
+        self.dirty_rows = set()
+        dirty_rows.add(cursorY)
+        if self.cursor_row is not None:
+            dirty_rows.add(self.cursor_row)
+        if len(html_cache) != len(screen):
             # Fix it to be equal--assume first time/screen reset/resize/etc
-            # Just fill it with empty strings (only the length matters here)
-            self.prev_dump = [[] for a in screen]
-            self.prev_dump_rend = [[] for a in screen]
-        # The html_cache may need to be fixed as well
-        if len(self.html_cache) != len(screen):
-            self.html_cache = [u'' for a in screen] # Essentially a reset
-        spancount = 0
-        current_classes = set()
-        prev_rendition = None
-        foregrounds = ('f0','f1','f2','f3','f4','f5','f6','f7')
-        backgrounds = ('b0','b1','b2','b3','b4','b5','b6','b7')
-        html_entities = {"&": "&amp;", '<': '&lt;', '>': '&gt;'}
-        for linecount, line_rendition in enumerate(izip(screen, renditions)):
-            line = line_rendition[0]
-            rendition = line_rendition[1]
-            if linecount != cursorY and self.prev_dump[linecount] == line:
-                if '<span class="cursor">' not in self.html_cache[linecount]:
-                    if self.prev_dump_rend[linecount] == rendition:
-                        # No change since the last dump.  Use the cache...
-                        results.append(self.html_cache[linecount])
-                        continue # Nothing changed so move on to the next line
-            outline = ""
-            if current_classes:
-                outline += '<span class="%s">' % " ".join(current_classes)
-            charcount = 0
-            # TODO: Figure out if there's a faster way to process each character
-            for char, rend in izip(line, rendition):
-                rend = renditions_store[rend] # Get actual rendition
-                if ord(char) >= special: # Special stuff =)
-                    # Obviously, not really a single character
-                    if char in self.captured_files:
-                        outline += self.captured_files[char].html()
-                        continue
-                changed = True
-                if char in "&<>":
-                    # Have to convert ampersands and lt/gt to HTML entities
-                    char = html_entities[char]
-                if rend == prev_rendition:
-                    # Shortcut...  So we can skip all the logic below
-                    changed = False
-                else:
-                    prev_rendition = rend
-                if changed and rend:
-                    classes = imap(rendition_classes.get, rend)
-                    for _class in classes:
-                        if _class and _class not in current_classes:
-                            # Something changed...  Start a new span
-                            if spancount:
-                                outline += "</span>"
-                                spancount -= 1
-                            if 'reset' in _class:
-                                if _class == 'reset':
-                                    current_classes = set()
-                                    if spancount:
-                                        for i in xrange(spancount):
-                                            outline += "</span>"
-                                        spancount = 0
-                                else:
-                                    reset_class = _class.split('reset')[0]
-                                    if reset_class == 'foreground':
-                                        # Remove any foreground classes
-                                        [current_classes.pop(i) for i, a in
-                                        enumerate(current_classes) if a in
-                                        foregrounds
-                                        ]
-                                    elif reset_class == 'background':
-                                        [current_classes.pop(i) for i, a in
-                                        enumerate(current_classes) if a in
-                                        backgrounds
-                                        ]
-                                    else:
-                                        try:
-                                            current_classes.remove(reset_class)
-                                        except KeyError:
-                                            # Trying to reset something that was
-                                            # never set.  Ignore
-                                            pass
-                            else:
-                                if _class in foregrounds:
-                                    [current_classes.pop(i) for i, a in
-                                    enumerate(current_classes) if a in
-                                    foregrounds
-                                    ]
-                                elif _class in backgrounds:
-                                    [current_classes.pop(i) for i, a in
-                                    enumerate(current_classes) if a in
-                                    backgrounds
-                                    ]
-                                current_classes.add(_class)
-                    if current_classes:
-                        outline += '<span class="%s">' % " ".join(current_classes)
-                        spancount += 1
-                if linecount == cursorY and charcount == cursorX: # Cursor position
-                    if self.show_cursor:
-                        outline += '<span class="cursor">%s</span>' % char
-                    else:
-                        outline += char
-                else:
-                    outline += char
-                charcount += 1
-            self.prev_dump[linecount] = line[:]
-            self.prev_dump_rend[linecount] = rendition[:]
-            if outline:
-                # Make sure all renditions terminate at the end of the line
-                for whatever in xrange(spancount):
-                    outline += "</span>"
-                results.append(outline)
-                self.html_cache[linecount] = outline
+            html_cache = self.html_cache = [u'' for a in screen]
+            dirty_rows = set(xrange(len(screen)))
+        elif min(dirty_rows) < 0: # Negative indices (cursor went haywire)
+            dirty_rows = set(row % len(screen) for row in dirty_rows)
+        self.text_rows.update(dirty_rows) # So dump_text() sees them too
+        self.cursor_row = None
+        for linecount, (line, rendition) in enumerate(
+                izip(screen, self.renditions)):
+            if linecount not in dirty_rows:
+                # No change since the last dump.  Use the cache...
+                results.append(html_cache[linecount])
+                continue # Nothing changed so move on to the next line
+            if linecount == cursorY and self.show_cursor:
+                outline = spanify_line(line, rendition, cursorX)
+                self.cursor_row = linecount
             else:
-                results.append(None) # 'null' is shorter than 4 spaces
-                self.html_cache[linecount] = None
-            # NOTE: The client has been programmed to treat None (aka null in
-            #       JavaScript) as blank lines.
-        for whatever in xrange(spancount): # Bit of cleanup to be safe
-            results[-1] += "</span>"
+                outline = spanify_line(line, rendition)
+            results.append(outline)
+            html_cache[linecount] = outline
         return results
 
-    def _spanify_scrollback(self):
+    def _spanify_scrollback(self, position=0):
         """
         Spanifies (turns renditions into `<span>` elements) everything inside
-        `self.scrollback` using `self.renditions`.  This differs from
-        `_spanify_screen` in that it doesn't apply any logic to detect the
-        location of the cursor (to make it just a tiny bit faster).
-        """
-        # NOTE: See the comments in _spanify_screen() for details on this logic
+        `self.scrollback_buf` (starting at *position*) using
+        `self.scrollback_renditions` and returns the result as a list of lines.
+        This differs from `_spanify_screen` in that it doesn't bother with the
+        cursor.
+
+        Lines are only rendered the first time they're requested.  After that
+        the HTML is kept in `self.scrollback_html` until the line falls out of
+        the scrollback buffer.
+        """
+        scrollback_html = self.scrollback_html
+        spanify_line = self._spanify_line
+        count = len(self.scrollback_buf) - position
+        # NOTE: The lines are copied out first since modifying a deque while
+        # iterating over it isn't allowed.  They're taken from the right (the
+        # end of the buffer) so only the new lines get looked at.
+        lines = list(islice(izip(reversed(scrollback_html),
+            reversed(self.scrollback_buf),
+            reversed(self.scrollback_renditions)), count))
+        lines.reverse()
         results = []
-        special = SPECIAL
-        screen = self.scrollback_buf
-        renditions = self.scrollback_renditions
-        rendition_classes = RENDITION_CLASSES
-        renditions_store = self.renditions_store
-        spancount = 0
-        current_classes = set()
-        prev_rendition = None
-        foregrounds = ('f0','f1','f2','f3','f4','f5','f6','f7')
-        backgrounds = ('b0','b1','b2','b3','b4','b5','b6','b7')
-        html_entities = {"&": "&amp;", '<': '&lt;', '>': '&gt;'}
-        for line, rendition in izip(screen, renditions):
-            outline = ""
-            if current_classes:
-                outline += '<span class="%s">' % " ".join(current_classes)
-            for char, rend in izip(line, rendition):
-                rend = renditions_store[rend] # Get actual rendition
-                if ord(char) >= special: # Special stuff =)
-                    # Obviously, not really a single character
-                    if char in self.captured_files:
-                        outline += self.captured_files[char].html()
-                        continue
-                changed = True
-                if char in "&<>":
-                    # Have to convert ampersands and lt/gt to HTML entities
-                    char = html_entities[char]
-                if rend == prev_rendition:
-                    changed = False
-                else:
-                    prev_rendition = rend
-                if changed and rend != None:
-                    classes = imap(rendition_classes.get, rend)
-                    for _class in classes:
-                        if _class and _class not in current_classes:
-                            if spancount:
-                                outline += "</span>"
-                                spancount -= 1
-                            if 'reset' in _class:
-                                if _class == 'reset':
-                                    current_classes = set()
-                                else:
-                                    reset_class = _class.split('reset')[0]
-                                    if reset_class == 'foreground':
-                                        [current_classes.pop(i) for i, a in
-                                        enumerate(current_classes) if a in
-                                        foregrounds
-                                        ]
-                                    elif reset_class == 'background':
-                                        [current_classes.pop(i) for i, a in
-                                        enumerate(current_classes) if a in
-                                        backgrounds
-                                        ]
-                                    else:
-                                        try:
-                                            current_classes.remove(reset_class)
-                                        except KeyError:
-                                            pass
-                            else:
-                                if _class in foregrounds:
-                                    [current_classes.pop(i) for i, a in
-                                    enumerate(current_classes) if a in
-                                    foregrounds
-                                    ]
-                                elif _class in backgrounds:
-                                    [current_classes.pop(i) for i, a in
-                                    enumerate(current_classes) if a in
-                                    backgrounds
-                                    ]
-                                current_classes.add(_class)
-                    if current_classes:
-                        outline += '<span class="%s">' % " ".join(current_classes)
-                        spancount += 1
-                outline += char
-            if outline:
-                # Make sure all renditions terminate at the end of the line
-                for whatever in xrange(spancount):
-                    outline += "</span>"
-                results.append(outline)
-            else:
-                results.append(None)
-        for whatever in xrange(spancount): # Bit of cleanup to be safe
-            results[-1] += "</span>"
+        for i, (html, line, rendition) in enumerate(lines, -count):
+            if html is False: # Not rendered yet
+                html = scrollback_html[i] = spanify_line(line, rendition)
+            results.append(html)
         return results
 
-    def dump_html(self, renditions=True):
+    def dump_html(self, renditions=True, client_id=None):
         """
         Dumps the terminal screen as a list of HTML-formatted lines.  If
         *renditions* is True (default) then terminal renditions will be
@@ -3537,13 +4789,19 @@ class Terminal(object):
         in a browser.  Otherwise only the cursor <span> will be added to mark
         its location.
 
+        Returns a tuple in the form of (scrollback, screen) where *scrollback*
+        contains the lines that have scrolled off the top of the screen since
+        the last time *client_id* called this method.  A *client_id* that is
+        new to us will get everything that is in the scrollback buffer.
+
         .. note:: This places <span class="cursor">(current character)</span> around the cursor location.
         """
+        position = self._read_scrollback(client_id)
+        scrollback = []
         if renditions: # i.e. Use stylized text (the default)
             screen = self._spanify_screen()
-            scrollback = []
-            if self.scrollback_buf:
-                scrollback = self._spanify_scrollback()
+            if position < len(self.scrollback_buf):
+                scrollback = self._spanify_scrollback(position)
         else:
             cursorX = self.cursorX
             cursorY = self.cursorY
@@ -3559,38 +4817,34 @@ class Terminal(object):
                     screen.append(cursor_row)
                 else:
                     screen.append("".join(row))
-        # Empty the scrollback buffer:
-        self.init_scrollback()
         self.modified = False
         return (scrollback, screen)
 
-    def dump_plain(self):
+    def dump_plain(self, client_id=None):
         """
-        Dumps the screen and the scrollback buffer as-is then empties the
-        scrollback buffer.
+        Dumps the screen and the lines in the scrollback buffer that
+        *client_id* hasn't seen yet as-is.
         """
         screen = self.screen
-        scrollback = self.scrollback_buf
-        # Empty the scrollback buffer:
-        self.init_scrollback()
+        position = self._read_scrollback(client_id)
+        scrollback = list(islice(self.scrollback_buf, position, None))
         self.modified = False
         return (scrollback, screen)
 
-    def dump_components(self):
+    def dump_components(self, client_id=None):
         """
-        Dumps the screen and renditions as-is, the scrollback buffer as HTML,
-        and the current cursor coordinates.  Also, empties the scrollback buffer
+        Dumps the screen and renditions as-is, the lines in the scrollback
+        buffer that *client_id* hasn't seen yet as HTML, and the current cursor
+        coordinates.
 
         .. note:: This was used in some performance-related experiments but might be useful for other patterns in the future so I've left it here.
         """
         screen = [a.tounicode() for a in self.screen]
         scrollback = []
-        if self.scrollback_buf:
+        position = self._read_scrollback(client_id)
+        if position < len(self.scrollback_buf):
             # Process the scrollback buffer into HTML
-            scrollback = self._spanify_scrollback(
-                self.scrollback_buf, self.scrollback_renditions)
-        # Empty the scrollback buffer:
-        self.init_scrollback()
+            scrollback = self._spanify_scrollback(position)
         self.modified = False
         return (scrollback, screen, self.renditions, self.cursorY, self.cursorX)
 
@@ -3602,18 +4856,50 @@ class Terminal(object):
 
         .. note:: This method does not empty the scrollback buffer.
         """
-        out = []
-        for line in self.screen:
-            line_out = ""
-            for char in line:
-                if len(char) > 1: # This is an image (or similar)
-                    line_out += u'⬚' # Use a dotted square as a placeholder
-                else:
-                    line_out += char
-            out.append(line_out)
+        out = [line.tounicode().replace(WIDE_PLACEHOLDER, u'')
+            for line in self.screen]
         self.modified = False
         return out
 
+    def dump_text(self):
+        """
+        Returns self.screen as a single string with trailing whitespace removed
+        from each line (and from the end of the screen).  This is what
+        :meth:`termio.BaseMultiplex.postprocess` searches for patterns.
+
+        The result is cached and only the rows that changed since the last call
+        (according to :attr:`self.dirty_rows`) get rebuilt so it is cheap to
+        call after every write.
+
+        .. note:: Like :meth:`dump` this does not touch the scrollback buffer.
+        """
+        screen = self.screen
+        rows = len(screen)
+        text_cache = self.text_cache
+        html_cache = self.html_cache
+        text_rows = self.text_rows
+        self.text_rows = set()
+        if len(text_cache) != rows or (
+                len(html_cache) != rows and html_cache is not self.text_scan):
+            # Screen reset/resize/etc--no telling which rows changed
+            self.text_scan = html_cache
+            text_cache = self.text_cache = [
+                line.tounicode().replace(WIDE_PLACEHOLDER, u'').rstrip()
+                for line in screen]
+        else:
+            changed = self.text_dump is None
+            for y in text_rows.union(self.dirty_rows):
+                y %= rows
+                text = screen[y].tounicode().replace(
+                    WIDE_PLACEHOLDER, u'').rstrip()
+                if text != text_cache[y]:
+                    text_cache[y] = text
+                    changed = True
+            if not changed:
+                return self.text_dump
+        self.text_dump = u"\n".join(text_cache).rstrip()
+        return self.text_dump
+
 # This is here to make it easier for someone to produce an HTML app that uses
 # terminal.py
 def css_renditions(selector=None):
@@ -96,7 +96,8 @@ Module Functions and Classes
 """
 
 # Stdlib imports
-import os, sys, time, struct, io, gzip, re, logging, signal
+import os, sys, time, struct, io, gzip, re, logging, signal, codecs
+import threading, atexit
 from datetime import timedelta, datetime
 from functools import partial
 from itertools import izip
@@ -104,16 +105,35 @@ from multiprocessing import Process
 from json import loads as json_decode
 from json import dumps as json_encode
 
+# Our stuff
+import golog
+
 # Inernationalization support
 import gettext
 gettext.install('termio')
 
+# Import 3rd party stuff
+try:
+    # Used to process captured files (e.g. thumbnailing images) outside of the
+    # IOLoop.  Without it that work happens inside of Terminal.write().
+    from concurrent import futures
+except ImportError:
+    futures = None
+    logging.info(_(
+        "TIP: Install the 'futures' module ('pip install futures') to have "
+        "captured images and PDFs processed in the background."))
+
 # Globals
 SEPARATOR = u"\U000f0f0f" # The character used to separate frames in the log
 # NOTE: That unicode character was carefully selected from only the finest
 # of the PUA.  I hereby dub thee, "U+F0F0F0, The Separator."
 CALLBACK_THREAD = None # Used by add_callback()
+EXECUTOR = None # Shared by all terminals (see get_executor())
 POSIX = 'posix' in sys.builtin_module_names
+READ_SIZE = 65536 # Size of the buffer MultiplexPOSIXIOLoop reads output into
+# How much output MultiplexPOSIXIOLoop will read per IOLoop event.  Whatever is
+# left gets read on the next loop (so other terminals get their turn).
+MAX_READ = READ_SIZE * 4
 MACOS = os.uname()[0] == 'Darwin'
 # Matches Gate One's special optional escape sequence (ssh plugin only)
 RE_OPT_SSH_SEQ = re.compile(
@@ -123,6 +143,17 @@ RE_TITLE_SEQ = re.compile(
     r'.*\x1b\][0-2]\;(.+?)(\x07|\x1b\\)', re.DOTALL|re.MULTILINE)
 
 # Helper functions
+def get_executor(max_workers=4):
+    """
+    Returns the :class:`concurrent.futures.ThreadPoolExecutor` (with
+    *max_workers* threads) that all terminals share for processing captured
+    files or None if the 'futures' module isn't available.
+    """
+    global EXECUTOR
+    if futures and not EXECUTOR:
+        EXECUTOR = futures.ThreadPoolExecutor(max_workers=max_workers)
+    return EXECUTOR
+
 def debug_expect(m_instance, match, pattern):
     """
     This method is used by :meth:`BaseMultiplex.expect` if :attr:`self.debug` is
@@ -146,45 +177,41 @@ def retrieve_first_frame(golog_path):
     """
     Retrieves the first frame from the given *golog_path*.
     """
-    found_first_frame = None
+    encoded_separator = SEPARATOR.encode('UTF-8')
     frame = b""
     f = gzip.open(golog_path)
-    while not found_first_frame:
-        frame += f.read(1) # One byte at a time
-        if frame.decode('UTF-8', "ignore").endswith(SEPARATOR):
-            # That's it; wrap this up
-            found_first_frame = True
-    distance = f.tell()
-    f.close()
-    return (frame.decode('UTF-8', "ignore").rstrip(SEPARATOR), distance)
+    try:
+        while encoded_separator not in frame:
+            chunk = f.read(4096) # Plenty for the metadata frame
+            if not chunk:
+                break
+            frame += chunk
+    finally:
+        f.close()
+    frame = frame.split(encoded_separator)[0]
+    distance = len(frame) + len(encoded_separator)
+    return (frame.decode('UTF-8', "ignore"), distance)
 
 def retrieve_last_frame(golog_path):
     """
-    Retrieves the last frame from the given *golog_path*.  It does this by
-    iterating over the log in reverse.
+    Retrieves the last frame from the given *golog_path*.  Logs with an index
+    (see :mod:`golog`) only need to have their last block decompressed.  Logs
+    without one have to be decompressed from start to finish.
     """
-    encoded_separator = SEPARATOR.encode('UTF-8')
-    golog = gzip.open(golog_path)
-    chunk_size = 1024*128
-    # Seek to the end of the file (gzip objects don't support negative seeking)
-    distance = chunk_size
-    prev_tell = None
-    while golog.tell() != prev_tell:
-        prev_tell = golog.tell()
-        try:
-            golog.seek(distance)
-        except IOError:
-            return # Something wrong with the file
-        distance += distance
-    # Now that we're at the end, go back a bit and split from there
-    golog.seek(golog.tell() - chunk_size*2)
-    end_frames = golog.read().split(encoded_separator)
-    if len(end_frames) > 1:
-        # Very last item will be empty
-        return end_frames[-2].decode('UTF-8', 'ignore')
-    else:
-        # Just a single frame here, return it as-is
-        return end_frames[0].decode('UTF-8', 'ignore')
+    try:
+        with open(golog_path, 'rb') as f:
+            indexed = golog.read_trailer(f)
+        if indexed:
+            with golog.Golog(golog_path) as log:
+                return log.frame(-1).decode('UTF-8', 'ignore')
+        last_frame = None
+        for frame in golog.iter_frames(golog_path):
+            last_frame = frame
+    except (IOError, IndexError):
+        return # Something wrong with the file
+    if last_frame is None:
+        return
+    return last_frame.decode('UTF-8', 'ignore')
 
 def get_or_update_metadata(golog_path, user, force_update=False):
     """
@@ -204,7 +231,8 @@ def get_or_update_metadata(golog_path, user, force_update=False):
         # Something wrong with the log...  Probably still being written to
         return
     metadata = {}
-    if first_frame[14:].startswith('{'):
+    has_metadata = first_frame[14:].startswith('{')
+    if has_metadata:
         # This is JSON, capture existing metadata
         metadata = json_decode(first_frame[14:])
         # end_date gets added by this function
@@ -212,7 +240,7 @@ def get_or_update_metadata(golog_path, user, force_update=False):
             return metadata # All done
     # '\xf3\xb0\xbc\x8f' <--UTF-8 encoded SEPARATOR (for reference)
     encoded_separator = SEPARATOR.encode('UTF-8')
-    golog = gzip.open(golog_path)
+    log_file = gzip.open(golog_path)
     # Loop over the file in big chunks (which is faster than read() by an order
     # of magnitude)
     chunk_size = 1024*128 # 128k should be enough for a 100x300 terminal full
@@ -222,13 +250,21 @@ def get_or_update_metadata(golog_path, user, force_update=False):
     max_data = chunk_size * 10 # Hopefully this is enough to capture a title
     while len(log_data) < max_data:
         try:
-            chunk = golog.read(chunk_size)
+            chunk = log_file.read(chunk_size)
         except IOError:
             return # Something wrong with the file
         total_frames += chunk.count(encoded_separator)
         log_data += chunk
         if len(chunk) < chunk_size:
             break
+    log_file.close()
+    try:
+        with open(golog_path, 'rb') as f:
+            trailer = golog.read_trailer(f)
+    except IOError:
+        return # Something wrong with the file
+    if trailer: # The index knows exactly how many frames there are
+        total_frames = trailer[1]
     # Remove the trailing incomplete frame
     log_data = encoded_separator.join(log_data.split(encoded_separator)[:-1])
     log_data = log_data.decode('UTF-8', 'ignore')
@@ -237,7 +273,7 @@ def get_or_update_metadata(golog_path, user, force_update=False):
     if not last_frame:
         return # Something wrong with log
     end_date = last_frame[:13]
-    version = u"1.0"
+    version = golog.VERSION # The log gets re-saved in the latest format
     connect_string = None
     # Try to find the host that was connected to by looking for the SSH
     # plugin's special optional escape sequence.  It looks like this:
@@ -267,38 +303,357 @@ def get_or_update_metadata(golog_path, user, force_update=False):
     first_frame += json_encode(metadata) + SEPARATOR
     first_frame = first_frame.encode('UTF-8')
     # Replace the first frame and re-save the log
-    temp_path = "%s.tmp" % golog_path
-    golog = gzip.open(golog_path) # Re-open
-    new_golog = gzip.open(temp_path, 'w')
-    new_golog.write(first_frame)
-    # Now write out the rest of it
-    count = 0
-    while True:
+    try:
+        golog.rewrite(golog_path, first_frame, replace=has_metadata)
+    except IOError:
+        return # Something wrong with the file
+    return metadata
+
+# Things in a regular expression that would change the meaning of the other
+# patterns (or of itself) when combined by combine_patterns():
+RE_UNCOMBINABLE = re.compile(r'\(\?[iLmsux]+\)|\(\?P=|\\[1-9]')
+
+def combine_patterns(patterns):
+    """
+    Compiles the given list of *patterns* (RegexObjects) into a single regular
+    expression that matches wherever any of them would match.  This lets
+    :meth:`BaseMultiplex.postprocess` find out if a set of patterns has any
+    match at all with a single search of the screen.
+
+    Returns `None` if the patterns can't be combined safely (they use different
+    flags, inline flags, backreferences, or contain something other than
+    RegexObjects).
+    """
+    if len(patterns) < 2:
+        return None
+    try:
+        flags = set(pattern.flags for pattern in patterns)
+        sources = [pattern.pattern for pattern in patterns]
+    except AttributeError: # Not a RegexObject
+        return None
+    if len(flags) != 1:
+        return None
+    for source in sources:
+        if RE_UNCOMBINABLE.search(source):
+            return None
+    try:
+        return re.compile(
+            u"|".join(u"(?:%s)" % source for source in sources), flags.pop())
+    except (re.error, UnicodeDecodeError):
+        return None
+
+def utf8_boundary(data, end):
+    """
+    Returns the position in *data* (a `bytearray`) where the UTF-8 character
+    that ``data[:end]`` ends in the middle of begins.  If ``data[:end]`` ends
+    with a complete character (or with something that isn't UTF-8 at all)
+    *end* is returned.
+
+    Used to avoid mangling multibyte characters that get split across reads.
+    """
+    for pos in xrange(end - 1, max(end - 4, -1), -1):
+        byte = data[pos]
+        if byte < 0x80: # ASCII
+            return end
+        if byte < 0xc0: # Continuation byte
+            continue
+        if byte < 0xe0:
+            length = 2
+        elif byte < 0xf0:
+            length = 3
+        elif byte < 0xf8:
+            length = 4
+        else: # Not valid UTF-8
+            return end
+        if end - pos < length:
+            return pos
+        return end
+    return end
+
+class TokenBucket(object):
+    """
+    A token bucket that fills up at *rate* tokens (bytes of output) per second
+    and holds at most one second's worth of them.  Taking more tokens out
+    than the bucket holds puts it into debt (see :meth:`consume`).
+    """
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.last = time.time()
+
+    def consume(self, amount, now=None):
+        """
+        Takes *amount* tokens out of the bucket and returns how many seconds it
+        will be until the bucket is out of debt (0 if it isn't in debt).  The
+        debt is capped at one second's worth of tokens so a burst of output
+        never postpones anything by more than a second.
+        """
+        if now is None:
+            now = time.time()
+        self.tokens = min(
+            self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens = max(-self.rate, self.tokens - amount)
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+class OutputScheduler(object):
+    """
+    Keeps track of how much output each terminal (:class:`BaseMultiplex`
+    instance) is producing so that terminals going over their budget can have
+    their screen updates (HTML dumps) postponed.  The output itself is never
+    held back; the terminal emulator keeps up with it no matter what.
+
+    Every terminal gets its own :class:`TokenBucket` and its rate is the
+    lowest of:
+
+        * Its own limit (*rate* as passed to :meth:`consume`).
+        * Its fair share of its user's limit (*user_rate* divided by the number of that user's terminals that are currently producing output).
+        * Its fair share of :attr:`rate` (the budget for all terminals combined) divided among all the terminals that are currently producing output.
+
+    All rates are in bytes per second.  `None` means unlimited.
+
+    Terminals that are fast-forwarding (see :meth:`BaseMultiplex.term_write`)
+    pass a *min_delay* to :meth:`consume` so their screen updates get postponed
+    the same way no matter how much budget they have left.
+    """
+    window = 1 # Terminals with output in the last second count as active
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.buckets = {}
+        self.active = {} # Terminal: (user, when it last produced output)
+        self.active_total = 0
+        self.active_users = {}
+        self.counted = 0 # When active_total and active_users were updated
+
+    def consume(self, key, amount, rate=None, user=None, user_rate=None,
+            min_delay=0):
+        """
+        Records that the terminal identified by *key* just produced *amount*
+        bytes of output and returns how many seconds its next screen update
+        should be postponed (0 if it's within its budget).  It will be
+        postponed by at least *min_delay* seconds.
+        """
+        if not (rate or user_rate or self.rate):
+            return min_delay # Unlimited
+        now = time.time()
+        self.active[key] = (user, now)
+        if now - self.counted > self.window:
+            self._count_active(now)
+        limits = []
+        if rate:
+            limits.append(rate)
+        if user_rate:
+            limits.append(
+                float(user_rate) / max(1, self.active_users.get(user, 0)))
+        if self.rate:
+            limits.append(float(self.rate) / max(1, self.active_total))
+        bucket = self.buckets.get(key)
+        if not bucket:
+            bucket = self.buckets[key] = TokenBucket(min(limits))
+        else:
+            bucket.rate = min(limits)
+        return max(min_delay, bucket.consume(amount, now))
+
+    def _count_active(self, now):
+        """
+        Forgets about terminals that haven't produced any output recently and
+        counts up the ones that have (in total and per user).
+        """
+        self.counted = now
+        self.active_users = {}
+        for key, (user, last) in list(self.active.items()):
+            if now - last > self.window:
+                # Its bucket would be full by now anyway
+                del self.active[key]
+                self.buckets.pop(key, None)
+                continue
+            self.active_users[user] = self.active_users.get(user, 0) + 1
+        self.active_total = len(self.active)
+
+# Shared by all terminals.  Set OUTPUT_SCHEDULER.rate to limit the output of
+# all terminals combined.
+OUTPUT_SCHEDULER = OutputScheduler()
+
+class GologWriter(object):
+    """
+    Writes frames to the Gate One log (.golog) at *path* without making the
+    caller wait on the disk (which can be really slow, e.g. on NFS).  Frames
+    get buffered in memory and written out by a background thread (shared by
+    all GologWriters) in batches:  Whenever more than :attr:`max_size` bytes
+    are waiting or the oldest frame has been waiting for :attr:`max_wait`
+    seconds.  Even closing the log happens in the background (see
+    :meth:`close`).
+
+    Batches get added to the log's unfinished block until it holds about
+    :data:`golog.BLOCK_SIZE` bytes (see :meth:`golog.BlockWriter.add`) and the
+    index gets written when the log is closed (see :mod:`golog`).  If *path*
+    doesn't exist when it gets opened *first_frame* (the metadata frame) gets
+    written (in a block of its own) before anything else.  If it does exist
+    the new blocks get added to the ones that are already there.
+    """
+    max_size = 65536 # Bytes
+    max_wait = 1 # Seconds
+    _writers = set() # Open GologWriters (see _flush_loop())
+    _condition = threading.Condition()
+    _thread = None
+
+    def __init__(self, path, first_frame=None):
+        self.path = path
+        self.lock = threading.Lock() # Protects self.frames
+        self.io_lock = threading.Lock() # Protects self.file
+        self.file = None # Gets opened by the first flush()
+        self.blocks = None # golog.BlockWriter for self.file
+        self.first_frame = first_frame
+        self.frames = []
+        self.size = 0
+        self.since = None # When the oldest frame in self.frames was written
+        self.closing = False # Set by close()
+        self.on_close = None # Called after the background thread closes us
+        self.closed = threading.Event() # Gets set once the log is closed
+        with self._condition:
+            self._writers.add(self)
+            if not GologWriter._thread:
+                GologWriter._thread = threading.Thread(
+                    target=GologWriter._flush_loop, name="GologWriter")
+                GologWriter._thread.daemon = True
+                GologWriter._thread.start()
+
+    def write(self, frame):
+        """
+        Adds *frame* (bytes) to the buffer.  Never blocks on I/O.
+        """
+        with self.lock:
+            if not self.frames:
+                self.since = time.time()
+            self.frames.append(frame)
+            self.size += len(frame)
+            full = self.size >= self.max_size
+        if full: # Don't wait for the next flush
+            with self._condition:
+                self._condition.notify()
+
+    def flush(self):
+        """
+        Writes out all the buffered frames (in one go).
+        """
+        with self.io_lock:
+            with self.lock:
+                frames = self.frames
+                self.frames = []
+                self.size = 0
+            if not frames:
+                return
+            try:
+                if not self.file:
+                    self._open() # Keeps even this off the caller's thread
+                self.blocks.add(frames)
+                # Gets the batch onto the disk (so a crash won't lose more than
+                # the last batch)
+                self.file.flush()
+            except (IOError, OSError) as e:
+                logging.error(_(
+                    "Could not write to %s: %s" % (self.path, e)))
+
+    def close(self, callback=None):
+        """
+        Has the background thread write out whatever is still buffered and
+        close the log.  Never blocks on I/O.  If given, *callback* will be
+        called (from the background thread) once the log is closed.  To wait
+        for all that to happen use ``self.closed.wait()``.
+        """
+        with self._condition:
+            self.closing = True
+            self.on_close = callback
+            self._condition.notify()
+
+    def _close(self):
+        """
+        Does the work of :meth:`close` (in the background thread).
+        """
+        with self._condition:
+            if self not in self._writers:
+                return # Already closed
+            self._writers.discard(self)
         try:
-            chunk = golog.read(chunk_size)
-        except IOError:
-            return # Something wrong with the file
-        if count == 0:
-            if chunk[14] == "{": # Old/incomplete metadata
-                # Need to keep reading until the next frame
-                while True:
+            self.flush()
+            with self.io_lock:
+                if self.file:
                     try:
-                        chunk += golog.read(chunk_size)
-                    except IOError:
-                        return # Something wrong with the file
-                    if encoded_separator in chunk:
-                        # This removes the first frame:
-                        chunk = encoded_separator.join(
-                            chunk.split(encoded_separator)[1:])
-                        break
-        new_golog.write(chunk)
-        if len(chunk) < chunk_size:
-            break # Everything must come to an end
-        count += 1
-    # Overwrite the old log
-    import shutil
-    shutil.move(temp_path, golog_path)
-    return metadata
+                        self.blocks.finish()
+                        self.file.close()
+                    except (IOError, OSError) as e:
+                        logging.error(_(
+                            "Could not write to %s: %s" % (self.path, e)))
+                    self.file = None
+            if self.on_close:
+                self.on_close()
+        finally:
+            self.closed.set()
+
+    def _open(self):
+        """
+        Opens the log for writing.  New logs start with the metadata frame.
+        Existing logs have their index removed (it gets written again by
+        :meth:`close`) or rebuilt if they don't have one (e.g. Gate One was
+        killed before it could be written).  See
+        :meth:`golog.BlockWriter.resume`.
+        """
+        if os.path.exists(self.path):
+            f = open(self.path, 'r+b')
+            try:
+                self.blocks = golog.BlockWriter.resume(f)
+            except IOError:
+                f.close()
+                raise
+        else:
+            f = open(self.path, 'wb')
+            self.blocks = golog.BlockWriter(f)
+            if self.first_frame:
+                self.blocks.write_block([self.first_frame])
+        self.file = f
+
+    @classmethod
+    def _flush_loop(cls):
+        """
+        Runs in the background thread:  Flushes every GologWriter that has
+        more than :attr:`max_size` bytes buffered or has had frames waiting
+        for :attr:`max_wait` seconds and closes the ones that are done.
+
+        .. note:: This thread is shared by every GologWriter so no matter what goes wrong with one of them it must keep running.
+        """
+        while True:
+            with cls._condition:
+                cls._condition.wait(cls.max_wait / 2.0)
+                writers = list(cls._writers)
+            now = time.time()
+            for writer in writers:
+                try:
+                    if writer.closing:
+                        writer._close()
+                    elif writer.size >= writer.max_size or (writer.frames
+                        and now - writer.since >= writer.max_wait):
+                        writer.flush()
+                except Exception:
+                    logging.exception(_(
+                        "Error writing to %s" % writer.path))
+
+    @classmethod
+    def flush_all(cls):
+        """
+        Flushes every open GologWriter (e.g. when Gate One is shutting down).
+        The ones waiting to be closed get closed.
+        """
+        with cls._condition:
+            writers = list(cls._writers)
+        for writer in writers:
+            if writer.closing:
+                writer._close()
+            else:
+                writer.flush()
+
+atexit.register(GologWriter.flush_all)
 
 # Exceptions
 class Timeout(Exception):
@@ -353,6 +708,11 @@ class Pattern(object):
             preprocess=False,
             timeout=30):
         self.pattern = pattern
+        # A single regex that matches wherever any of *pattern* (if it's a list)
+        # would match (see combine_patterns()):
+        self.combined = None
+        if isinstance(pattern, (list, tuple)):
+            self.combined = combine_patterns(pattern)
         if isinstance(callback, (str, unicode)):
             # Convert the string to a write() call
             self.callback = lambda m, match: m.write(unicode(callback))
@@ -377,9 +737,18 @@ class BaseMultiplex(object):
     :syslog_host: *string* - An optional syslog host to send session log information to (this is independent of the *syslog* option above--it does not require a syslog daemon be present on the host running Gate One).
     :syslog_facility: *integer* - The syslog facility to use when logging messages.  All possible facilities can be found in `utils.FACILITIES` (if you need a reference other than the syslog module).
     :debug: *boolean* - Used by the `expect` methods...  If set, extra debugging information will be output whenever a regular expression is matched.
+    :output_rate: *integer* - Bytes of output per second this terminal may produce before its screen updates start getting postponed (see :class:`OutputScheduler`).
+    :user_output_rate: *integer* - Same as *output_rate* but shared by all of *user*'s terminals.
+    :fast_forward_rate: *integer* - Bytes of output per second above which the terminal switches to fast-forward mode (see :meth:`term_write`).  `None` disables fast-forwarding.
+    :contiguous_screen: *boolean* - Passed to *terminal_emulator* (only if True) to have it store its screen in one contiguous buffer.
+    :reflow: *boolean* - Passed to *terminal_emulator* (only if True) to have it re-wrap long lines when the number of columns changes.
     """
     CALLBACK_UPDATE = 1 # Screen update
     CALLBACK_EXIT = 2   # When the underlying program exits
+    # Fast-forward mode (see term_write()) timings (in seconds):
+    FAST_FORWARD_WINDOW = 0.25 # How long output is measured before deciding
+    FAST_FORWARD_IDLE = 0.1 # How long output has to stop to end the burst
+    FAST_FORWARD_INTERVAL = 1 # How often the screen gets updated regardless
 
     def __init__(self,
             cmd,
@@ -390,8 +759,14 @@ class BaseMultiplex(object):
             syslog=False,
             syslog_host=None,
             syslog_facility=None,
+            scrollback_lines=None, # Lines of scrollback to keep in self.term
             encoding='utf-8',
-            debug=False):
+            debug=False,
+            output_rate=None, # Bytes/sec (see OutputScheduler)
+            user_output_rate=None,
+            fast_forward_rate=1048576, # Bytes/sec
+            contiguous_screen=False,
+            reflow=False):
         self.encoding = encoding
         self.debug = debug
         self.exitfunc = None
@@ -405,12 +780,19 @@ class BaseMultiplex(object):
         else:
             self.terminal_emulator = terminal_emulator
         self.log_path = log_path # Logs of the terminal output wind up here
+        self.scrollback_lines = scrollback_lines
+        self.contiguous_screen = contiguous_screen
+        self.reflow = reflow
         self.log = None # Just a placeholder until it is opened
         self.syslog = syslog # See "if self.syslog:" below
         self._alive = False
-        self.ratelimiter_engaged = False
-        self.capture_ratelimiter = False
-        self.ctrl_c_pressed = False
+        self.output_rate = output_rate
+        self.user_output_rate = user_output_rate
+        self.fast_forward_rate = fast_forward_rate
+        self.fast_forwarding = False
+        self.last_output = 0
+        self.output_window_start = 0 # See _measure_output()
+        self.output_window_bytes = 0
         self.capturing_timeout = timedelta(seconds=2)
         self.rows = 24
         self.cols = 80
@@ -418,6 +800,7 @@ class BaseMultiplex(object):
         self.started = "Never"
         self._patterns = []
         self._handling_match = False
+        self.update_scheduled = False # See _schedule_update()
         # Setup our callbacks
         self.callbacks = { # Defaults do nothing which saves some conditionals
             self.CALLBACK_UPDATE: {},
@@ -542,6 +925,14 @@ class BaseMultiplex(object):
         """
         callback()
 
+    def _call_later(self, seconds, callback):
+        """
+        Like :meth:`_call_callback` but *callback* should be called after
+        *seconds*.  Without some sort of event loop to schedule it with
+        there's no way to do that so it just calls :meth:`_call_callback`.
+        """
+        self._call_callback(callback)
+
     def spawn(self, rows=24, cols=80, env=None, em_dimensions=None):
         """
         This method must be overridden by suclasses of `BaseMultiplex`.  It is
@@ -569,6 +960,15 @@ class BaseMultiplex(object):
 
         :stream: A string or bytes containing the incoming output stream from the underlying terminal program.
 
+        If output comes in faster than :attr:`fast_forward_rate` the terminal
+        goes into fast-forward mode:  The terminal emulator keeps up with the
+        output without calling any of its screen update callbacks (see
+        :meth:`terminal.Terminal.set_fast_forward`) and :class:`OutputScheduler`
+        postpones the :obj:`CALLBACK_UPDATE` callbacks by at least
+        :attr:`FAST_FORWARD_INTERVAL` seconds each time.  When the burst of
+        output ends they get called right away so the final screen gets
+        rendered.
+
         .. note:: This kind of logging doesn't capture user keystrokes.  This is intentional as we don't want passwords winding up in the logs.
         """
         #logging.debug('term_write() stream: %s' % repr(stream))
@@ -577,10 +977,10 @@ class BaseMultiplex(object):
         if self.log_path:
             # Using .encode() below ensures the result will be bytes
             now = str(int(round(time.time() * 1000))).encode('UTF-8')
-            if not os.path.exists(self.log_path):
-                # Write the first frame as metadata
+            if not self.log:
+                # The first frame is metadata (only written to new logs)
                 metadata = {
-                    'version': '1.0', # Log format version
+                    'version': golog.VERSION, # Log format version
                     'rows': self.rows,
                     'cols': self.cols,
                     'start_date': now.decode('UTF-8') # JSON needs strings
@@ -595,10 +995,8 @@ class BaseMultiplex(object):
                 # Using concatenation of bytes below to ensure compatibility
                 # with both Python 2 and Python 3.
                 metadata_frame = now + b":" + metadata_frame + separator
-                self.log = gzip.open(self.log_path, mode='a')
-                self.log.write(metadata_frame)
-            if not self.log: # Only comes into play if the file already exists
-                self.log = gzip.open(self.log_path, mode='a')
+                # Frames get written in batches from a background thread
+                self.log = GologWriter(self.log_path, metadata_frame)
             # NOTE: I'm using an obscure unicode symbol in order to avoid
             # conflicts.  We need to do our best to ensure that we can
             # differentiate between terminal output and our log format...
@@ -633,9 +1031,100 @@ class BaseMultiplex(object):
         # Handle post-process patterns (for expect())
         if self._patterns:
             self.postprocess()
+        if self.fast_forward_rate:
+            self._measure_output(len(stream))
+        # Terminals producing more output than their budget allows (or that
+        # are fast-forwarding) get their screen updates postponed (skipping the
+        # ones in between)
+        min_delay = 0
+        if self.fast_forwarding:
+            min_delay = self.FAST_FORWARD_INTERVAL
+        delay = OUTPUT_SCHEDULER.consume(id(self), len(stream),
+            self.output_rate, self.user, self.user_output_rate, min_delay)
         if self.CALLBACK_UPDATE in self.callbacks:
-            for callback in self.callbacks[self.CALLBACK_UPDATE].values():
-                self._call_callback(callback)
+            self._schedule_update(delay)
+
+    def _measure_output(self, amount):
+        """
+        Keeps track of how fast output is coming in (*amount* bytes just came
+        in) and starts or stops fast-forward mode (see :meth:`term_write`)
+        depending on how that compares to :attr:`fast_forward_rate`.
+        """
+        now = time.time()
+        self.last_output = now
+        self.output_window_bytes += amount
+        elapsed = now - self.output_window_start
+        if elapsed < self.FAST_FORWARD_WINDOW:
+            return
+        rate = self.output_window_bytes / elapsed
+        self.output_window_start = now
+        self.output_window_bytes = 0
+        if rate >= self.fast_forward_rate:
+            if not self.fast_forwarding:
+                self._start_fast_forward()
+        elif self.fast_forwarding:
+            self._stop_fast_forward()
+
+    def _start_fast_forward(self):
+        """
+        Puts the terminal into fast-forward mode (see :meth:`term_write`).
+        """
+        logging.debug("Fast-forwarding %s" % self.pid)
+        self.fast_forwarding = True
+        if hasattr(self.term, 'set_fast_forward'):
+            self.term.set_fast_forward(True)
+
+    def _stop_fast_forward(self):
+        """
+        Takes the terminal out of fast-forward mode and arranges for the
+        :obj:`CALLBACK_UPDATE` callbacks to be called so the final state of
+        the screen gets rendered.
+        """
+        self.fast_forwarding = False
+        if hasattr(self.term, 'set_fast_forward'):
+            self.term.set_fast_forward(False)
+        if self.CALLBACK_UPDATE in self.callbacks:
+            # Don't wait for the postponed update (if any); it'll just wind up
+            # rendering the same screen again
+            self.update_scheduled = False
+            self._schedule_update()
+
+    def _check_fast_forward(self):
+        """
+        Stops fast-forwarding if there hasn't been any output for
+        :attr:`FAST_FORWARD_IDLE` seconds (i.e. the burst is over).  Returns
+        True if the terminal is still fast-forwarding.
+        """
+        if not self.fast_forwarding:
+            return False
+        if time.time() - self.last_output >= self.FAST_FORWARD_IDLE:
+            self._stop_fast_forward()
+            return False
+        return True
+
+    def _schedule_update(self, delay=0):
+        """
+        Arranges for the callbacks registered in :obj:`CALLBACK_UPDATE` to be
+        called via :meth:`_call_callback` (or :meth:`_call_later` if a *delay*
+        in seconds is given).  No matter how many times this gets called before
+        that happens (e.g. once per chunk of output) they'll only get called
+        once.
+        """
+        if self.update_scheduled:
+            return
+        self.update_scheduled = True
+        if delay:
+            self._call_later(delay, self._send_update)
+        else:
+            self._call_callback(self._send_update)
+
+    def _send_update(self):
+        """
+        Calls the callbacks registered in :obj:`CALLBACK_UPDATE`.
+        """
+        self.update_scheduled = False
+        for callback in self.callbacks[self.CALLBACK_UPDATE].values():
+            callback()
 
     def preprocess(self, stream):
         """
@@ -699,14 +1188,18 @@ class BaseMultiplex(object):
             # For convenience, trailing whitespace is removed from the lines
             # output from the terminal emulator.  This is so we don't have to
             # put '\w*' before every '$' to match the end of a line.
-            term_lines = "\n".join(
-                [a.rstrip() for a in self.term.dump()]).rstrip()
+            # NOTE: dump_text() is cached so this is cheap for every pattern
+            term_lines = self._screen_text()
             if isinstance(pattern_obj.pattern, (list, tuple)):
-                for pat in pattern_obj.pattern:
-                    match = pat.search(term_lines)
-                    if match:
-                        self._handle_match(pattern_obj, match)
-                        break
+                combined = pattern_obj.combined
+                # Only check them one by one (to find out which one matched
+                # first) if the combined regex says at least one of them will
+                if not combined or combined.search(term_lines):
+                    for pat in pattern_obj.pattern:
+                        match = pat.search(term_lines)
+                        if match:
+                            self._handle_match(pattern_obj, match)
+                            break
             else:
                 match = pattern_obj.pattern.search(term_lines)
                 if match:
@@ -715,6 +1208,17 @@ class BaseMultiplex(object):
                 # We only match the first non-optional pattern
                 finished_non_sticky = True
 
+    def _screen_text(self):
+        """
+        Returns the terminal emulator's screen as a single string with trailing
+        whitespace removed from each line (and from the end).  Uses the
+        emulator's (cached) `dump_text()` if it has one.
+        """
+        if hasattr(self.term, 'dump_text'):
+            return self.term.dump_text()
+        # Custom terminal emulators might only have dump()
+        return u"\n".join([a.rstrip() for a in self.term.dump()]).rstrip()
+
     def _handle_match(self, pattern_obj, match):
         """
         Handles a matched regex detected by :meth:`postprocess`.  It calls
@@ -774,7 +1278,8 @@ class BaseMultiplex(object):
         if *client_id* is given (string), this will be used as a unique client
         identifier for keeping track of screen differences (so you can have
         multiple clients getting their own unique diff output for the same
-        Multiplex instance).
+        Multiplex instance).  Each *client_id* also gets its own position in the
+        terminal's scrollback buffer so every client receives every line.
         """
         if client_id not in self.prev_output:
             self.prev_output[client_id] = [None for a in xrange(self.rows-1)]
@@ -782,7 +1287,7 @@ class BaseMultiplex(object):
             scrollback, html = ([], [])
             if self.term:
                 try:
-                    result = self.term.dump_html()
+                    result = self.term.dump_html(client_id=client_id)
                     if result:
                         scrollback, html = result
                         # Make a copy so we can save it to prev_output later
@@ -808,13 +1313,8 @@ class BaseMultiplex(object):
             return ([], [])
         except (IOError, TypeError) as e:
             logging.error(_("Unhandled exception in dump_html(): %s" % e))
-            if self.ratelimiter_engaged:
-                # Caused by the program being out of control
-                return([], [
-                    _("<b>Program output too noisy.  Sending Ctrl-c...</b>")])
-            else:
-                import traceback
-                traceback.print_exc(file=sys.stdout)
+            import traceback
+            traceback.print_exc(file=sys.stdout)
             return ([], [])
 
     def dump(self):
@@ -1140,6 +1640,7 @@ class BaseMultiplex(object):
         result = self._read(bytes)
         # Perform checks for timeouts in self._patterns (used by self.expect())
         self.timeout_check()
+        self._check_fast_forward()
         return result
 
     def write(self):
@@ -1169,16 +1670,16 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         self.sent_sigint = False
         self.env = {}
         self.io_loop = ioloop.IOLoop.instance() # Monitors child for activity
-        #self.io_loop.set_blocking_signal_threshold(2, self._blocked_io_handler)
-        #signal.signal(signal.SIGALRM, self._blocked_io_handler)
-        self.reenable_timeout = None
         interval = 100 # A 0.1 second interval should be fast enough
         self.scheduler = ioloop.PeriodicCallback(self._timeout_checker,interval)
         self.exitstatus = None
         self._checking_patterns = False
-        self.read_timeout = datetime.now()
-        self.capture_limit = -1 # Huge reads by default
-        self.restore_rate = None
+        # Output gets read into this buffer (see _read()) which is created
+        # when the child is spawned.  It gets reused for every read.
+        self.reader = None
+        self.read_buffer = None
+        self.read_view = None
+        self.read_pending = 0 # Bytes of a split character at its beginning
 
     def __del__(self):
         """
@@ -1200,49 +1701,39 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         else:
             callback()
 
-    def _reenable_output(self):
+    def _call_later(self, seconds, callback):
         """
-        Restarts capturing output from the underlying terminal program by
-        disengaging the rate limiter.
+        If the IOLoop is started, calls *callback* after *seconds* via
+        :meth:`IOLoop.add_timeout`.  Otherwise *callback* gets called
+        immediately (there'd be nothing to call it later).
         """
-        logging.debug("Disabling rate limiter")
-        self.ratelimiter_engaged = False
-        try:
-            self.io_loop.add_handler(
-                self.fd, self._ioloop_read_handler, self.io_loop.READ)
-        except IOError:
-            # Already been re-added...  Probably by write().  Ignore.
-            pass
-
-    def __reset_sent_sigint(self):
-        self.sent_sigint = False
+        if self.io_loop.running():
+            self.io_loop.add_timeout(timedelta(seconds=seconds), callback)
+        else:
+            callback()
 
-    def _blocked_io_handler(self, signum=None, frame=None, wait=None):
+    def _start_fast_forward(self):
         """
-        Handles the situation where a terminal is blocking IO (usually because
-        of too much output).  This method would typically get called inside of
-        `MultiplexPOSIXIOLoop._read` when the output of an fd is too noisy.
+        Puts the terminal into fast-forward mode and, if the IOLoop is running,
+        starts checking for the end of the burst (nothing calls :meth:`read`
+        once the output stops).
+        """
+        super(MultiplexPOSIXIOLoop, self)._start_fast_forward()
+        if self.io_loop.running():
+            self._fast_forward_checker()
 
-        If *wait* is given, will wait that many milliseconds long before
-        disengaging the rate limiter.
+    def _fast_forward_checker(self):
         """
-        if not self.isalive():
-            # This can happen if terminate() gets called too fast from another
-            # thread...  Strange stuff, mixing threading, signals, and
-            # multiprocessing!
-            return # Nothing to do
-        logging.warning(_(
-            "Noisy process (%s) kicked off rate limiter." % self.pid))
-        if not wait:
-            wait = 5000
-        self.ratelimiter_engaged = True
-        # CALLBACK_UPDATE is called here so the client can be made aware of the
-        # fact that the rate limiter was engaged.
-        for callback in self.callbacks[self.CALLBACK_UPDATE].values():
-            self._call_callback(callback)
-        self.io_loop.remove_handler(self.fd)
-        self.reenable_timeout = self.io_loop.add_timeout(
-            timedelta(milliseconds=wait), self._reenable_output)
+        Calls :meth:`_check_fast_forward` every :attr:`FAST_FORWARD_IDLE`
+        seconds until the terminal stops fast-forwarding.
+        """
+        if self._check_fast_forward():
+            self.io_loop.add_timeout(
+                timedelta(seconds=self.FAST_FORWARD_IDLE),
+                self._fast_forward_checker)
+
+    def __reset_sent_sigint(self):
+        self.sent_sigint = False
 
     def spawn(self,
             rows=24, cols=80, env=None, em_dimensions=None, exitfunc=None):
@@ -1321,24 +1812,45 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
             logging.debug("spawn() pid: %s" % pid)
             self._alive = True
             self.fd = fd
+            self.reader = io.FileIO(fd, 'rb', closefd=False)
+            self.read_buffer = bytearray(READ_SIZE)
+            self.read_view = memoryview(self.read_buffer)
+            self.read_pending = 0
             self.env = env
             self.exitfunc = exitfunc
             self.pid = pid
             self.time = time.time()
+            # Only passed when enabled so other emulators don't need to care:
+            options = {}
+            if self.contiguous_screen:
+                options['contiguous_screen'] = True
+            if self.reflow:
+                options['reflow'] = True
             try:
                 self.term = self.terminal_emulator(
                     rows=rows,
                     cols=cols,
                     em_dimensions=em_dimensions,
-                    encoding=self.encoding
+                    encoding=self.encoding,
+                    **options
                 )
             except TypeError:
                 # Terminal emulator doesn't support em_dimensions.  That's OK
                 self.term = self.terminal_emulator(
                     rows=rows,
                     cols=cols,
-                    encoding=self.encoding
+                    encoding=self.encoding,
+                    **options
                 )
+            if self.scrollback_lines is not None:
+                self.term.set_scrollback_lines(self.scrollback_lines)
+            if hasattr(self.term, 'set_scheduler'):
+                # Coalesces screen update notifications (once per IOLoop loop)
+                # and makes sure background work gets applied in the IOLoop
+                self.term.set_scheduler(self._call_callback)
+                executor = get_executor()
+                if executor:
+                    self.term.set_executor(executor)
             # Tell our IOLoop instance to start watching the child
             self.io_loop.add_handler(
                 fd, self._ioloop_read_handler, self.io_loop.READ)
@@ -1417,8 +1929,6 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         else:
             return # Something else already called it
         logging.debug("terminate() self.pid: %s" % self.pid)
-        if self.reenable_timeout:
-            self.io_loop.remove_timeout(self.reenable_timeout)
         # Unset our blocked IO handler so there's no references to self hanging
         # around preventing us from freeing up memory
         try:
@@ -1488,18 +1998,23 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         #del self.term
         # Kick off a process that finalizes the log (updates metadata and
         # recompresses everything to save disk space)
-        if not self.log_path:
+        if not self.log:
             return # No log to finalize so we're done.
-        self.log.close() # Write it out
-        logging.info(_(
-            "Finalizing the log for pid %s (this can take some time)."
-            % self.pid
-        ))
-        PROC = Process(
-            target=get_or_update_metadata,
-            args=(self.log_path, self.user),
-            kwargs={'force_update': True})
-        PROC.start()
+        log_path, user, pid = self.log_path, self.user, self.pid
+        def finalize():
+            logging.info(_(
+                "Finalizing the log for pid %s (this can take some time)."
+                % pid
+            ))
+            PROC = Process(
+                target=get_or_update_metadata,
+                args=(log_path, user),
+                kwargs={'force_update': True})
+            PROC.start()
+        # Finalizing has to wait until whatever is still buffered has been
+        # written out (which happens in GologWriter's background thread).
+        # The Process gets started from the IOLoop, not that thread.
+        self.log.close(partial(self.io_loop.add_callback, finalize))
 
     def _ioloop_read_handler(self, fd, event):
         """
@@ -1512,7 +2027,8 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         .. note:: This method is not meant to be called directly...  The IOLoop should be the one calling it when it detects any given event on the fd.
         """
         if event == self.io_loop.READ:
-            self._call_callback(self.read)
+            # Nothing needs the output returned from here
+            self._call_callback(partial(self.read, collect=False))
         else: # Child died
             logging.debug(_(
                 "Apparently fd %s just died (event: %s)" % (self.fd, event)))
@@ -1520,81 +2036,97 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
                 #print(repr("".join([a for a in self.term.dump() if a.strip()])))
             self.terminate()
 
-    def _read(self, bytes=-1):
+    def _fill_read_buffer(self, limit=-1):
+        """
+        Reads the output waiting on `self.fd` into `self.read_buffer` (after
+        any bytes carried over from the last read) until there's nothing left
+        to read, the buffer is full, or *limit* bytes have been read (if it
+        isn't -1).  Returns where the data in the buffer ends.
+        """
+        view = self.read_view
+        readinto = self.reader.readinto
+        end = self.read_pending
+        stop = len(view)
+        if limit != -1:
+            stop = min(stop, end + limit)
+        while end < stop:
+            count = readinto(view[end:stop])
+            if not count: # None means there's nothing more to read (for now)
+                break
+            end += count
+        return end
+
+    def _write_read_buffer(self, end):
+        """
+        Passes the complete characters in ``self.read_buffer[:end]`` to
+        `term_write` and returns them.  If the buffer ends in the middle of a
+        UTF-8 character its first bytes are moved to the beginning of the
+        buffer where they'll wait for the rest of the character to be read.
+
+        While the terminal emulator is capturing a file (e.g. an image) nothing
+        gets held back since the output isn't text (a JPEG ends in ``\\xd9``
+        which looks a lot like the start of a two-byte character).
+        """
+        cut = end
+        encoding = getattr(self.term, 'encoding', self.encoding)
+        if codecs.lookup(encoding).name == 'utf-8' and not self._capturing():
+            cut = utf8_boundary(self.read_buffer, end)
+        stream = self.read_view[:cut].tobytes()
+        self.read_pending = end - cut
+        if self.read_pending:
+            self.read_buffer[:self.read_pending] = self.read_view[
+                cut:end].tobytes()
+        if stream:
+            self.term_write(stream)
+            if self.read_pending and self._capturing():
+                # This output started a capture; the rest doesn't need to wait
+                pending = self.read_view[:self.read_pending].tobytes()
+                self.read_pending = 0
+                self.term_write(pending)
+                stream += pending
+        return stream
+
+    def _capturing(self):
+        """
+        Returns True if `self.term` is in the middle of capturing a file.
+        """
+        return bool(getattr(self.term, 'capture', None) or
+            getattr(self.term, 'matched_header', None))
+
+    def _read(self, bytes=-1, collect=True):
         """
         Reads at most *bytes* from the incoming stream, writes the result to
         the terminal emulator using `term_write`, and returns what was read.
         If *bytes* is -1 (default) it will read `self.fd` until there's no more
-        output.
+        output (or :data:`MAX_READ` bytes have been read).
 
-        Returns the result of all that reading.
+        Returns the result of all that reading.  If *collect* is False nothing
+        gets returned (saves keeping a copy of everything that was read when
+        the caller doesn't need it).
 
         .. note:: Non-blocking.
         """
         # Commented out because it can be really noisy.  Uncomment only if you
         # *really* need to debug this method.
         #logging.debug("MultiplexPOSIXIOLoop._read()")
-        result = b""
-        def restore_capture_limit():
-            self.capture_limit = -1
-            self.restore_rate = None
+        result = []
         try:
-            with io.open(self.fd, 'rb', closefd=False,buffering=1024) as reader:
-                if bytes == -1:
-                    # 2 seconds of blocking is too much.
-                    timeout = timedelta(seconds=2)
-                    loop_start = datetime.now()
-                    if self.ctrl_c_pressed:
-                        # If the user pressed Ctrl-C and the ratelimiter was
-                        # engaged then we'd best discard the (possibly huge)
-                        # buffer so we don't waste CPU cyles processing it.
-                        discard = reader.read(-1)
-                        self.ctrl_c_pressed = False
-                        return u'^C\n' # Let the user know what happened
-                    if self.restore_rate:
-                        # Need at least three seconds of inactivity to go back
-                        # to unlimited reads
-                        self.io_loop.remove_timeout(self.restore_rate)
-                        self.restore_rate = self.io_loop.add_timeout(
-                            timedelta(seconds=6), restore_capture_limit)
-                    while True:
-                        updated = reader.read(self.capture_limit)
-                        if not updated:
-                            break
-                        result += updated
-                        self.term_write(updated)
-                        if self.ratelimiter_engaged or self.capture_ratelimiter:
-                            break # Only allow one read per IOLoop loop
-                        if self.capture_limit == 2048:
-                            # Block for a little while: Enough to keep things
-                            # moving but not fast enough to slow everyone else
-                            # down
-                            self._blocked_io_handler(wait=1000)
-                            break
-                        if datetime.now() - loop_start > timeout:
-                            # Engage the rate limiter
-                            if self.term.capture:
-                                self.capture_ratelimiter = True
-                                self.capture_limit = 65536
-                                # Make sure we eventually get back to defaults:
-                                self.io_loop.add_timeout(
-                                    timedelta(seconds=10),
-                                    restore_capture_limit)
-                                # NOTE: The capture_ratelimiter doesn't remove
-                                # self.fd from the IOLoop (that's the diff)
-                            else:
-                                # Set the capture limit to a smaller value so
-                                # when we re-start output again the noisy
-                                # program won't be able to take over again.
-                                self.capture_limit = 2048
-                                self.restore_rate = self.io_loop.add_timeout(
-                                    timedelta(seconds=6),
-                                    restore_capture_limit)
-                                self._blocked_io_handler()
-                            break
-                elif bytes:
-                    result = reader.read(bytes)
-                    self.term_write(result)
+            if bytes == -1:
+                # Stopping at MAX_READ keeps one noisy terminal from hogging the
+                # IOLoop.  Whatever is left will be read on the next loop.
+                total = 0
+                while total < MAX_READ:
+                    end = self._fill_read_buffer()
+                    if end == self.read_pending: # Nothing new
+                        break
+                    total += end - self.read_pending
+                    updated = self._write_read_buffer(end)
+                    if collect:
+                        result.append(updated)
+            elif bytes:
+                end = self._fill_read_buffer(bytes)
+                if end != self.read_pending:
+                    result.append(self._write_read_buffer(end))
         except IOError as e:
             # IOErrors can happen when self.fd is closed before we finish
             # reading from it.  Not a big deal.
@@ -1609,6 +2141,9 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
             #traceback.print_exc(file=sys.stdout)
             #if self.isalive():
                 #self.terminate()
+        if not collect:
+            return None
+        result = b"".join(result)
         if self.debug:
             if result:
                 print("_read(): %s" % repr(result))
@@ -1636,7 +2171,7 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
                     pass
             self._checking_patterns = False
 
-    def read(self, bytes=-1):
+    def read(self, bytes=-1, collect=True):
         """
         .. note:: This is an override of `BaseMultiplex.read` in order to take advantage of the IOLoop for ensuring `BaseMultiplex.expect` patterns timeout properly.
 
@@ -1647,19 +2182,19 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
         executes :attr:`timeout_check` at a regular interval.  The
         `PeriodicCallback` will automatically cancel itself if there are no more
         non-sticky patterns in :attr:`self._patterns`.
-        """
-        # 50ms basic output rate limit on everything
-        rate_wait = timedelta(milliseconds=50)
-        if datetime.now() - self.read_timeout > rate_wait:
-            result = self._read(bytes)
-            self.read_timeout = datetime.now()
-            remaining_patterns = self.timeout_check()
-            if remaining_patterns and not self.scheduler._running:
-                # Start 'er up in case we don't get any more output
-                logging.debug("Starting self.scheduler to check for timeouts")
-                self.scheduler.start()
-            self.isalive() # This just ensures the exitfunc is called (if necessary)
-            return result
+
+        *collect* gets passed to :meth:`_read` (the IOLoop doesn't need the
+        output returned so it uses `collect=False`).
+        """
+        result = self._read(bytes, collect)
+        self._check_fast_forward()
+        remaining_patterns = self.timeout_check()
+        if remaining_patterns and not self.scheduler._running:
+            # Start 'er up in case we don't get any more output
+            logging.debug("Starting self.scheduler to check for timeouts")
+            self.scheduler.start()
+        self.isalive() # This just ensures the exitfunc is called (if necessary)
+        return result
 
     def _write(self, chars):
         """
@@ -1672,12 +2207,6 @@ class MultiplexPOSIXIOLoop(BaseMultiplex):
             with io.open(
                 self.fd, 'wt', encoding='UTF-8', closefd=False) as writer:
                     writer.write(chars)
-            if self.ratelimiter_engaged:
-                if u'\x03' in chars: # Ctrl-C
-                    # This will force self._read() to discard the buffer
-                    self.ctrl_c_pressed = True
-                # Reattach the fd so the user can continue immediately
-                self._reenable_output()
         except (IOError, OSError) as e:
             if self.isalive():
                 self.terminate()
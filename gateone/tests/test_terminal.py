@@ -12,7 +12,7 @@ Tests the terminal module.  This whole thing is a huge TODO.
 """
 
 # Import Python built-ins
-import os, sys, unittest, time
+import os, sys, unittest, time, logging
 from pprint import pprint
 cwd = os.getcwd()
 terminal_dir = os.path.abspath(os.path.join(cwd, '../'))
@@ -23,6 +23,23 @@ import terminal
 ROWS = 56
 COLS = 210
 
+class FooFile(terminal.FileType):
+    """
+    A simple FileType (FOO:<data>:FOO) for testing file captures.
+    """
+    name = 'Foo'
+    mimetype = 'text/x-foo'
+    re_header = terminal.re.compile('.*FOO:', terminal.re.DOTALL)
+    re_capture = terminal.re.compile('(FOO:.+:FOO)', terminal.re.DOTALL)
+    signature = 'FOO:'
+    terminator = ':FOO'
+    def __init__(self, path="", **kwargs):
+        self.path = path
+        self.file_obj = None
+    def capture(self, data, term):
+        terminal.FileType.capture(self, data, term)
+        term.cursor_right() # Don't overwrite our reference
+
 # Unit Tests
 class Test1Coding(unittest.TestCase):
     """
@@ -42,6 +59,744 @@ class Test1Coding(unittest.TestCase):
         print('It took %0.2fms to process the input' % (elapsed*1000.0))
         pprint(term.dump_html())
 
+    def test_2_plain_text_runs(self):
+        "\033[1mRunning plain text (fast path) test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        # Runs of plain text should wrap at the last column just like
+        # characters that are written one at a time.
+        term.write(u'0123456789ABCDE\r\n\x1b[1mbold\x1b[0m')
+        self.assertEqual(term.dump()[0], u'0123456789')
+        self.assertEqual(term.dump()[1], u'ABCDE     ')
+        self.assertEqual(term.dump()[2], u'bold      ')
+        self.assertEqual((term.cursorY, term.cursorX), (2, 4))
+        bold = term.renditions[2][0]
+        self.assertEqual(term.renditions_store[bold], [0, 1])
+        self.assertEqual(term.renditions[2][4], unichr(1000))
+        # Line drawing mode gets translated too
+        term.write(u'\x1b(0qqq\x1b(B')
+        self.assertEqual(term.dump()[2], u'bold\u2500\u2500\u2500   ')
+
+    def test_3_escape_sequences(self):
+        "\033[1mRunning escape sequence parser test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        opts = []
+        term.add_callback(terminal.CALLBACK_OPT, opts.append, 'test')
+        # Sequences split across writes should work the same as whole ones
+        for char in u'\x1b]0;split title\x07\x1b[2;3HX\x1b]_;opt\x1b\\':
+            term.write(char)
+        self.assertEqual(term.title, u'split title')
+        self.assertEqual(opts, [u'opt'])
+        self.assertEqual(term.dump()[1], u'  X       ')
+        # An ST-terminated title followed by a CSI in the same write
+        term.write(u'\x1b]2;%s\x1b\\\x1b[?25l' % (u'x' * 1000))
+        self.assertEqual(term.title, u'x' * 1000)
+        self.assertEqual(term.show_cursor, False)
+        # Unsupported sequences should be skipped without eating text
+        term.write(u'\x1b[H\x1b[2 qA\x1b^private\x1b\\B\x1b[1;2;3$zC')
+        self.assertEqual(term.dump()[0], u'ABC       ')
+
+    def test_4_rendition_performance(self):
+        "\033[1mRunning rendition (256color) performance test\033[0;0m"
+        term = terminal.Terminal(ROWS, COLS)
+        # Same sort of output as 256colors2.pl (but with lots of repetition)
+        output = u''
+        for color in xrange(256):
+            output += u'\x1b[0;1;38;5;%sm\x1b[48;5;%dm  ' % (color, 255-color)
+        output = (output + u'\x1b[0m\r\n') * 50
+        start = time.time()
+        term.write(output)
+        elapsed = time.time() - start
+        print('It took %0.2fms to process the input' % (elapsed*1000.0))
+        # Every unique rendition should only be stored once
+        self.assertEqual(len(term.renditions_store), 2 + 256 * 2)
+        for ref, renditions in term.renditions_store.items():
+            self.assertEqual(term.renditions_index[tuple(renditions)], ref)
+        rend = term.renditions[term.cursorY - 3][200] # Color 100
+        self.assertEqual(term.renditions_store[rend], [0, 1, 1100, 10155])
+
+    def test_5_rendition_garbage_collection(self):
+        "\033[1mRunning rendition garbage collection test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        term.RENDITIONS_GC_THRESHOLD = 100
+        term.renditions_gc_threshold = 100
+        # Lots of unique renditions that scroll off the screen (and out of the
+        # scrollback buffer) should not pile up in renditions_store
+        for i in xrange(2000):
+            term.write(u'\x1b[38;5;%dm\x1b[48;5;%dmX\x1b[m\r\n' % (i, i % 7))
+            term.init_scrollback()
+        self.assertTrue(len(term.renditions_store) <= 200)
+        # Whatever is still on the screen must still be intact
+        rend = term.renditions[term.cursorY - 1][0]
+        self.assertEqual(term.renditions_store[rend], [0, 2999, 10004])
+        term.clear_screen()
+        in_use = len(term.renditions_store)
+        self.assertEqual(term.collect_renditions(), in_use - 2)
+        self.assertEqual(term.collect_renditions(), 0)
+        self.assertEqual(sorted(term.renditions_store.values()), [[], [0]])
+
+    def test_6_dirty_rows(self):
+        "\033[1mRunning dirty row tracking test\033[0;0m"
+        term = terminal.Terminal(6, 10)
+        term.write(u'one\r\ntwo\r\nthree')
+        term.dump_html()
+        self.assertEqual(term.dirty_rows, set())
+        # Only modified rows (and the cursor's) should get re-rendered
+        term.html_cache[4] = u'cached'
+        term.write(u'\x1b[2;1HTWO')
+        self.assertEqual(term.dirty_rows, set([1]))
+        screen = term.dump_html()[1]
+        self.assertEqual(screen[1], u'TWO<span class="cursor"> </span>      ')
+        self.assertEqual(screen[2], u'three     ') # Cursor left this row
+        self.assertEqual(screen[4], u'cached')
+        term.write(u'\x1b[5;1H\x1b[K')
+        self.assertEqual(
+            term.dump_html()[1][4], u'<span class="cursor"> </span>' + u' '*9)
+        term.write(u'\x1b[1;1H\x1b[M') # Delete line shifts everything up
+        self.assertEqual(term.dirty_rows, set(range(6)))
+
+    def test_7_span_markup(self):
+        "\033[1mRunning HTML span markup test\033[0;0m"
+        term = terminal.Terminal(2, 20)
+        term.write(u'\x1b[1mbold\x1b[0m <plain> \x1b[31mred\x1b[0m\r\n')
+        term.write(u'\x1b[31mred')
+        screen = term.dump_html()[1]
+        # Every line should open and close its own spans
+        self.assertEqual(screen[0],
+            u'<span class="bold">bold</span> &lt;plain&gt; '
+            u'<span class="f1">red</span>' + u' ' * 4)
+        self.assertEqual(screen[1],
+            u'<span class="f1">red</span><span class="cursor"> </span>'
+            u'                ')
+        bold = term.renditions[0][0]
+        self.assertEqual(
+            term.span_cache[(None, bold)], u'<span class="bold">')
+        self.assertEqual(term.span_cache[(bold, unichr(1000))], u'</span>')
+        # So does the markup at the end of each line
+        self.assertEqual(term.span_cache[(unichr(1000), None)], u'')
+
+    def test_8_scrollback_markup(self):
+        "\033[1mRunning scrollback markup test\033[0;0m"
+        term = terminal.Terminal(2, 10)
+        term.write(u'\x1b[1mone\x1b[0m\r\n\r\ntwo\r\n')
+        scrollback, screen = term.dump_html()
+        # Scrollback lines get the same markup as screen lines (minus cursor)
+        self.assertEqual(scrollback,
+            [u'<span class="bold">one</span>       ', u' ' * 10])
+        self.assertEqual(screen[0], u'two       ')
+        self.assertEqual(screen[1], u'<span class="cursor"> </span>' + u' '*9)
+        empty = terminal.array('u')
+        self.assertEqual(term._spanify_line(empty, empty), None)
+
+    def test_9_scrollback_ring_buffer(self):
+        "\033[1mRunning scrollback ring buffer test\033[0;0m"
+        term = terminal.Terminal(2, 10)
+        term.set_scrollback_lines(5)
+        term.write(u''.join(u'%s\r\n' % i for i in xrange(10)))
+        # Only the last 5 lines that scrolled off the screen are kept
+        self.assertEqual(len(term.scrollback_buf), 5)
+        self.assertEqual(term.scrollback_html.count(False), 5) # Not rendered
+        scrollback = term.dump_html(client_id='a')[0]
+        self.assertEqual([line.strip() for line in scrollback],
+            [u'4', u'5', u'6', u'7', u'8'])
+        # Each client gets its own position in the buffer
+        term.write(u'10\r\n')
+        scrollback = term.dump_html(client_id='a')[0]
+        self.assertEqual([line.strip() for line in scrollback], [u'9'])
+        self.assertEqual(len(term.dump_html(client_id='a')[0]), 0)
+        self.assertEqual(len(term.dump_html(client_id='b')[0]), 5)
+        self.assertEqual(term.scrollback_html.count(False), 0)
+        # Clients that go away don't leave their positions behind
+        term.remove_scrollback_reader('a')
+        self.assertEqual(term.scrollback_readers.keys(), ['b'])
+        self.assertEqual(len(term.dump_html(client_id='a')[0]), 5)
+
+    def test_10_contiguous_screen(self):
+        "\033[1mRunning contiguous screen buffer test\033[0;0m"
+        term = terminal.Terminal(200, 10, contiguous_screen=True)
+        self.assertTrue(isinstance(term.screen, terminal.ScreenBuffer))
+        data = term.screen.data
+        offsets = sorted(row.offset for row in term.screen)
+        term.write(u'\x1b[1mtop\x1b[m\x1b[200;1Hbottom\n')
+        # Scrolling just moves rows around inside of the same buffer
+        self.assertTrue(term.screen.data is data)
+        self.assertEqual(len(data), 200 * 10)
+        self.assertEqual(sorted(row.offset for row in term.screen), offsets)
+        self.assertEqual(term.dump()[198], u'bottom    ')
+        self.assertEqual(term.dump()[199], u' ' * 10)
+        self.assertEqual(term.scrollback_buf[0].tounicode(), u'top       ')
+        # screen[y][x] works just like it does with a list of arrays
+        term.screen[5][2] = u'X'
+        self.assertEqual(term.screen[5][:4].tounicode(), u'  X ')
+        term.write(u'\x1b[6;1H\x1b[P\x1b[L')
+        self.assertEqual(term.dump()[5], u' ' * 10)
+        self.assertEqual(term.dump()[6], u' X        ')
+        term.resize(200, 12)
+        self.assertEqual(term.dump()[6], u' X          ')
+
+    def test_11_batched_scrolling(self):
+        "\033[1mRunning batched scrolling test\033[0;0m"
+        for contiguous in (False, True):
+            term = terminal.Terminal(3, 10, contiguous_screen=contiguous)
+            scrolls = []
+            term.add_callback(
+                terminal.CALLBACK_SCROLL_UP, lambda: scrolls.append(1), 'test')
+            term.write(u'\x1b[3;1Hfirst\r\n\n\x1b[41mred\r\nlast\r\n')
+            # Lots of lines should only result in a single callback
+            self.assertEqual(len(scrolls), 1)
+            self.assertEqual(
+                term.dump(), [u'red       ', u'last      ', u' ' * 10])
+            self.assertEqual(
+                [line.tounicode() for line in term.scrollback_buf],
+                [u' '*10, u' '*10, u'first     ', u' '*10])
+            # New lines get the current rendition (like clear_line())
+            self.assertEqual(
+                term.renditions_store[term.renditions[2][0]], [0, 41])
+            term.write(u'\x1b[2;1H\x1b[2L')
+            self.assertEqual(term.dump(), [u'red       ', u' '*10, u' '*10])
+            term.write(u'\x1b[1;1H\x1b[M')
+            self.assertEqual(term.dump(), [u' '*10, u' '*10, u' '*10])
+
+    def test_12_magic_detector(self):
+        "\033[1mRunning FileType magic detector test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        png = terminal.PNGFile.re_header
+        self.assertEqual(term._detect_magic('plain old text'), None)
+        self.assertEqual(term._detect_magic('text\x89PNG\r\n\x1a\n'), png)
+        # The PDF header won't match (no 'obj' yet) but the PNG one will
+        self.assertEqual(
+            term._detect_magic('%PDF-1.4 \x89PNG\r\n\x1a\n'), png)
+        term.remove_magic(terminal.PNGFile)
+        self.assertEqual(term._detect_magic('text\x89PNG\r\n\x1a\n'), None)
+        # FileTypes without a signature get checked the old fashioned way
+        class UnsignedFooFile(FooFile):
+            signature = None
+        term.add_magic(UnsignedFooFile)
+        self.assertEqual(
+            term._detect_magic('some FOO:'), UnsignedFooFile.re_header)
+
+    def test_13_streaming_capture(self):
+        "\033[1mRunning streaming file capture test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        term.add_magic(FooFile)
+        term.write('ab FOO:')
+        term.write('data' * 100)
+        term.write(':F') # Terminator split across writes
+        self.assertEqual(term.capture_match, None)
+        term.write('O')
+        self.assertEqual(term.capture_match, None)
+        term.write('O')
+        self.assertEqual(term.capture_match, (3, 411))
+        term.write('$ ')
+        self.assertFalse(term.capture)
+        ref = term.screen[0][3]
+        self.assertEqual(term.dump()[0], u'ab %s$     ' % ref)
+        captured = term.captured_files[ref].file_obj
+        captured.seek(0)
+        self.assertEqual(captured.read(), 'FOO:' + 'data' * 100 + ':FOO')
+        # Lots of output right after a file only holds it up for one write
+        term = terminal.Terminal(4, 10)
+        term.add_magic(FooFile)
+        term.write('ab FOO:data:FOO' + 'x' * 600)
+        self.assertTrue(term.matched_header)
+        term.write('hello\r\n')
+        self.assertEqual((term.matched_header, term.capture), (None, ''))
+        self.assertTrue(term.dump_text().endswith(u'xxxxhello'))
+
+    def test_14_background_file_processing(self):
+        "\033[1mRunning background file processing test\033[0;0m"
+        class Future(object):
+            def __init__(self, result):
+                self._result = result
+                self.callbacks = []
+            def result(self):
+                return self._result
+            def add_done_callback(self, callback):
+                self.callbacks.append(callback)
+        class Executor(object): # Runs everything when finish() is called
+            def __init__(self):
+                self.futures = []
+            def submit(self, func, *args):
+                self.futures.append(Future(func(*args)))
+                return self.futures[-1]
+            def finish(self):
+                for future in self.futures:
+                    for callback in future.callbacks:
+                        callback(future)
+        scheduled = []
+        updates = []
+        term = terminal.Terminal(4, 10)
+        term.add_callback(
+            terminal.CALLBACK_CHANGED, lambda: updates.append(1), 'test')
+        results = []
+        term.run_in_executor(u'x', results.append, lambda a: a * 2, 2)
+        self.assertEqual(results, [4]) # No executor: Called immediately
+        executor = Executor()
+        term.set_executor(executor)
+        term.set_scheduler(scheduled.append)
+        term.write(u'ab\U00100000\r\n')
+        scheduled.pop()()
+        term.dump_html()
+        del updates[:]
+        term.run_in_executor(u'\U00100000', results.append, len, 'abc')
+        self.assertEqual(results, [4])
+        executor.finish()
+        self.assertEqual((results, updates), ([4], []))
+        scheduled.pop()() # The "IOLoop" applies the result
+        self.assertEqual(results, [4, 3])
+        self.assertEqual(term.dirty_rows, set([0]))
+        scheduled.pop()() # ...and then flushes the update
+        self.assertEqual(updates, [1])
+
+    def test_15_captured_file_cleanup(self):
+        "\033[1mRunning captured file cleanup test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        term.set_scrollback_lines(2)
+        class HTMLFile(terminal.FileType):
+            def html(self):
+                return u'foo'
+        files = []
+        for i in xrange(2):
+            ref = term.file_counter.next()
+            files.append(HTMLFile('Foo', 'text/x-foo', None, None))
+            files[-1].capture('foo', term)
+            term.captured_files[ref] = files[-1]
+            term.write(u'%s\r\n' % ref)
+        self.assertEqual(len(term.captured_files), 2)
+        # Overwriting a file's reference closes it
+        term.write(u'\x1b[2;1HX')
+        self.assertEqual(term.captured_files.values(), [files[0]])
+        self.assertTrue(files[1].file_obj.closed)
+        # So does scrolling it out of the scrollback buffer (but not before)
+        term.write(u'\r\n' * 3)
+        self.assertEqual(term.scrollback_files.values(), [1])
+        self.assertFalse(files[0].file_obj.closed)
+        term.write(u'\r\n' * 2)
+        self.assertEqual(term.captured_files, {})
+        self.assertTrue(files[0].file_obj.closed)
+        # With a scheduler it's checked once per loop (even if nothing renders)
+        scheduled = []
+        term.set_scheduler(scheduled.append)
+        ref = term.file_counter.next()
+        files.append(HTMLFile('Foo', 'text/x-foo', None, None))
+        files[-1].capture('foo', term)
+        term.captured_files[ref] = files[-1]
+        term.write(u'%s\r\n' % ref)
+        term.write(u'\x1b[1AX')
+        term.write(u'\x1b[K')
+        self.assertFalse(files[-1].file_obj.closed)
+        for callback in scheduled: # Includes one flush_updates()
+            callback()
+        self.assertEqual(len(scheduled), 2)
+        self.assertTrue(files[-1].file_obj.closed)
+
+    def test_16_coalesced_updates(self):
+        "\033[1mRunning coalesced update notification test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        events = []
+        for event in (terminal.CALLBACK_CHANGED, terminal.CALLBACK_CURSOR_POS,
+                      terminal.CALLBACK_SCROLL_UP):
+            term.add_callback(event, lambda e=event: events.append(e), 'test')
+        # Without a scheduler everything gets called right away
+        term.write(u'a')
+        self.assertEqual(events, [
+            terminal.CALLBACK_CHANGED, terminal.CALLBACK_CURSOR_POS])
+        term.dump_html()
+        del events[:]
+        scheduled = []
+        term.set_scheduler(scheduled.append)
+        for char in u'bc\r\n\r\n\r\n\r\nd':
+            term.write(char)
+        self.assertEqual((len(scheduled), events), (1, []))
+        scheduled.pop()()
+        self.assertEqual(events, [
+            terminal.CALLBACK_SCROLL_UP, terminal.CALLBACK_CHANGED,
+            terminal.CALLBACK_CURSOR_POS])
+        self.assertEqual(term.dirty_rows, set([0, 1, 2, 3]))
+        scheduled.append(term.flush_updates) # Nothing new to report
+        scheduled.pop()()
+        self.assertEqual(len(events), 3)
+
+    def test_17_plain_text_cache(self):
+        "\033[1mRunning plain text cache test\033[0;0m"
+        term = terminal.Terminal(4, 10)
+        term.write(u'foo   \r\nbar')
+        self.assertEqual(term.dump_text(), u'foo\nbar')
+        text = term.dump_text()
+        self.assertTrue(term.dump_text() is text) # Nothing changed
+        term.dump_html() # Consumes dirty_rows; dump_text() must still notice
+        term.write(u'\x1b[1;1Hbaz')
+        term.dump_html()
+        self.assertEqual(term.dump_text(), u'baz\nbar')
+        self.assertEqual(term.dump(), [u'baz' + u' ' * 7, u'bar' + u' ' * 7,
+            u' ' * 10, u' ' * 10])
+        term.write(u'\x1bc') # Full reset
+        self.assertEqual(term.dump_text(), u'')
+        # Patterns work with terminal emulators that only have dump() too
+        import termio
+        class DumpOnlyTerminal(object):
+            def __init__(self):
+                self.screen = [u'', u'']
+            def write(self, chars):
+                self.screen = chars.split(u'\n')
+            def dump(self):
+                return [line + u'   ' for line in self.screen]
+        m = termio.BaseMultiplex('true')
+        m.term = DumpOnlyTerminal()
+        matches = []
+        m.expect(u'^bar$', lambda m, match: matches.append(match),
+            preprocess=False)
+        m.term_write(u'foo\nbar')
+        self.assertEqual(matches, [u'bar'])
+
+    def test_18_character_widths(self):
+        "\033[1mRunning character width table test\033[0;0m"
+        import widths
+        self.assertEqual([widths.char_width(c) for c in u'a\xe9\u0301\u65e5'],
+            [1, 1, 0, 2])
+        term = terminal.Terminal(3, 6)
+        term.write(u'\u65e5\u672cab')
+        # Each double-width character takes up two cells
+        self.assertEqual(term.cursorX, 6)
+        self.assertEqual(term.dump()[0], u'\u65e5\u672cab')
+        term.write(u'\u8a9e') # Doesn't fit; wraps to the next line
+        self.assertEqual((term.cursorY, term.cursorX), (1, 2))
+        # Overwriting half of a double-width character blanks the other half
+        term.write(u'\x1b[1;2Hx')
+        self.assertEqual(term.dump()[0], u' x\u672cab')
+        # Combining characters modify the character before them
+        term.write(u'\x1b[3;1He\u0301')
+        self.assertEqual((term.dump()[2], term.cursorX), (u'\xe9     ', 1))
+        self.assertTrue(terminal.WIDE_PLACEHOLDER not in term.dump_html()[1][0])
+        # A cursor on the right half of a double-width character gets drawn
+        # over the left half (rather than over the invisible placeholder)
+        term = terminal.Terminal(3, 6)
+        term.write(u'\u65e5\u672c\x1b[1;2H')
+        self.assertTrue(u'<span class="cursor">\u65e5</span>' in
+            term.dump_html()[1][0])
+        # Stray placeholders in the output stream are ignored
+        term.write(u'\x1b[2;1Ha\ufdd0b')
+        self.assertEqual(term.dump()[1], u'ab    ')
+
+    def test_19_resize_reflow(self):
+        "\033[1mRunning resize reflow test\033[0;0m"
+        for contiguous in (False, True):
+            term = terminal.Terminal(4, 10,
+                reflow=True, contiguous_screen=contiguous)
+            term.write(u'$ abcdefghijkl\r\nfoo\r\n$ ')
+            self.assertEqual(term.wrapped_rows, {0: 10})
+            term.resize(4, 20) # The wrapped line should get joined back up
+            self.assertEqual(term.dump()[:3],
+                [u'$ abcdefghijkl'.ljust(20), u'foo'.ljust(20), u'$'.ljust(20)])
+            self.assertEqual((term.cursorY, term.cursorX), (2, 2))
+            term.resize(4, 5) # ...and wrapped again
+            self.assertEqual(term.dump(),
+                [u'defgh', u'ijkl ', u'foo  ', u'$    '])
+            self.assertEqual(term.wrapped_rows, {0: 5})
+            self.assertEqual((term.cursorY, term.cursorX), (3, 2))
+            self.assertEqual(len(term.scrollback_buf), 1)
+        # Rows that wrapped early (a double-width character didn't fit) don't
+        # keep their padding when joined back up
+        term = terminal.Terminal(3, 5, reflow=True)
+        term.write(u'abcd\u65e5x')
+        self.assertEqual(term.dump_text(), u'abcd\n\u65e5x')
+        self.assertEqual(term.wrapped_rows, {0: 4})
+        term.resize(3, 10)
+        self.assertEqual(term.dump_text(), u'abcd\u65e5x')
+        term.resize(3, 5) # Wraps early again
+        self.assertEqual(term.wrapped_rows, {0: 4})
+        term.resize(3, 10)
+        self.assertEqual(term.dump_text(), u'abcd\u65e5x')
+        # ...but spaces that were actually written stay put
+        term = terminal.Terminal(3, 5, reflow=True)
+        term.write(u'abcd \u65e5x')
+        self.assertEqual(term.wrapped_rows, {0: 5})
+        term.resize(3, 10)
+        self.assertEqual(term.dump_text(), u'abcd \u65e5x')
+        # Without reflow rows just get longer (in one go)
+        term = terminal.Terminal(2, 4)
+        term.write(u'abcdef')
+        term.resize(2, 6)
+        self.assertEqual(term.dump(), [u'abcd  ', u'ef    '])
+        term.resize(1, 6) # The top row goes into the scrollback buffer
+        self.assertEqual((term.dump(), term.cursorY), ([u'ef    '], 0))
+
+    def test_20_benchmark_harness(self):
+        "\033[1mRunning benchmark harness test\033[0;0m"
+        import bench, tempfile, shutil
+        frames = dict(bench.builtin_workloads(['top', 'vim']))['vim'][:20]
+        temp_dir = tempfile.mkdtemp()
+        try:
+            golog_path = os.path.join(temp_dir, 'vim.golog')
+            bench.write_golog(golog_path, frames)
+            self.assertEqual(bench.find_workloads([temp_dir]),
+                [('vim', frames)])
+        finally:
+            shutil.rmtree(temp_dir)
+        result = bench.run_terminal_workload(frames)
+        self.assertEqual(result['frames'], 20)
+        self.assertEqual(result['bytes'], sum(len(f[1]) for f in frames))
+        self.assertTrue(result['mb_per_sec'] > 0)
+        self.assertEqual(sorted(result['dump_html_ms']),
+            ['max', 'p50', 'p90', 'p99'])
+        self.assertEqual(bench.percentile([3, 1, 2, 4], 50), 2)
+
+    def test_21_split_utf8_reads(self):
+        "\033[1mRunning split UTF-8 read test\033[0;0m"
+        import termio
+        self.assertEqual(termio.utf8_boundary(bytearray('a\xe2\x94'), 3), 1)
+        self.assertEqual(termio.utf8_boundary(bytearray('a\xe2\x94\x80'), 4), 4)
+        # The box drawing character gets split between two reads
+        m = termio.MultiplexPOSIXIOLoop(
+            "printf 'a\\342\\224'; sleep 0.5; printf '\\200b'")
+        m.spawn(rows=2, cols=10)
+        try:
+            output = []
+            deadline = time.time() + 5
+            while time.time() < deadline and len(output) < 2:
+                time.sleep(0.1)
+                result = m.read()
+                if result:
+                    output.append(result)
+            self.assertEqual(output, ['a', '\xe2\x94\x80b'])
+            self.assertEqual(m.term.dump()[0], u'a─b'.ljust(10))
+        finally:
+            m.terminate()
+        # Nothing gets held back while a file is being captured
+        m = termio.MultiplexPOSIXIOLoop('sleep 5')
+        m.spawn(rows=2, cols=10)
+        try:
+            m.term.add_magic(FooFile)
+            for data in ('FOO:\xff\xd9', '\xe2\x94'):
+                m.read_buffer[:len(data)] = data
+                self.assertEqual(m._write_read_buffer(len(data)), data)
+                self.assertEqual(m.read_pending, 0)
+            self.assertEqual(bytes(m.term.capture), 'FOO:\xff\xd9\xe2\x94')
+        finally:
+            m.terminate()
+
+    def test_22_output_scheduler(self):
+        "\033[1mRunning output scheduler test\033[0;0m"
+        import termio
+        bucket = termio.TokenBucket(100)
+        now = bucket.last
+        self.assertEqual(bucket.consume(50, now), 0)
+        self.assertEqual(bucket.consume(100, now), 0.5) # 50 bytes in debt
+        self.assertEqual(bucket.consume(1000, now), 1) # Debt is capped
+        self.assertEqual(bucket.consume(0, now + 1), 0)
+        scheduler = termio.OutputScheduler()
+        self.assertEqual(scheduler.consume('a', 10 ** 9), 0) # Unlimited
+        self.assertEqual(scheduler.consume('a', 10 ** 9, min_delay=1), 1)
+        self.assertEqual(scheduler.active, {})
+        # Terminals get a fair share of their user's budget...
+        scheduler.consume('a', 0, user='bob', user_rate=1000)
+        scheduler.consume('b', 0, user='bob', user_rate=1000)
+        scheduler.counted = 0 # Force a recount of the active terminals
+        scheduler.consume('a', 0, user='bob', user_rate=1000)
+        self.assertEqual(scheduler.buckets['a'].rate, 500)
+        # ...and of the overall budget (unless their own limit is lower)
+        scheduler.rate = 900
+        scheduler.consume('c', 0, rate=100, user='alice')
+        scheduler.counted = 0
+        scheduler.consume('a', 0, user='bob', user_rate=1000)
+        self.assertEqual(scheduler.buckets['a'].rate, 300)
+        self.assertEqual(scheduler.buckets['c'].rate, 100)
+
+    def test_23_fast_forward(self):
+        "\033[1mRunning fast-forward test\033[0;0m"
+        import termio
+        term = terminal.Terminal(3, 10)
+        changes = []
+        term.add_callback(terminal.CALLBACK_CHANGED, lambda: changes.append(1))
+        term.set_fast_forward(True)
+        term.write(u'a\r\nb\x07\r\nc')
+        self.assertEqual(changes, [])
+        term.set_fast_forward(False) # Catches up in one go
+        self.assertEqual(changes, [1])
+        self.assertEqual(term.dump_text(), u'a\nb\nc')
+        m = termio.BaseMultiplex('true', fast_forward_rate=1000)
+        m.term = terminal.Terminal(3, 10)
+        updates, later = [], []
+        m.add_callback(m.CALLBACK_UPDATE, lambda: updates.append(1))
+        m._call_later = lambda seconds, callback: later.append(seconds)
+        m.output_window_start = time.time() - m.FAST_FORWARD_WINDOW
+        m.term_write('x' * 1000) # Way more than 1000 bytes/sec
+        self.assertTrue(m.fast_forwarding and m.term.fast_forward)
+        m.term_write('y')
+        # Updates get postponed by the output scheduler (just one of them)...
+        self.assertEqual((updates, later), ([], [m.FAST_FORWARD_INTERVAL]))
+        m.last_output -= m.FAST_FORWARD_IDLE
+        self.assertFalse(m._check_fast_forward())
+        self.assertEqual(updates, [1]) # ...until the burst is over
+        self.assertEqual(m.term.dump_text(), u'xxxxxxxxxx\nxxxxxxxxxx\ny')
+
+    def test_24_buffered_golog_writer(self):
+        "\033[1mRunning buffered golog writer test\033[0;0m"
+        import termio, tempfile, shutil, gzip
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'test.golog')
+            writer = termio.GologWriter(path, b'metadata;')
+            writer.max_size = 10
+            writer.write(b'one;')
+            self.assertFalse(os.path.exists(path)) # Still in memory
+            writer.write(b'two, three;') # Over max_size
+            deadline = time.time() + 5
+            while writer.frames and time.time() < deadline:
+                time.sleep(0.01) # Wait for the background thread
+            self.assertEqual(writer.frames, [])
+            writer.write(b'four;')
+            closed = []
+            writer.close(lambda: closed.append(writer.file))
+            self.assertTrue(writer.closed.wait(5)) # Closed in the background
+            self.assertEqual(closed, [None])
+            with gzip.open(path) as f:
+                self.assertEqual(f.read(), b'metadata;one;two, three;four;')
+            # The metadata frame only goes at the beginning of new logs
+            writer = termio.GologWriter(path, b'metadata;')
+            writer.write(b'five;')
+            writer.close()
+            self.assertTrue(writer.closed.wait(5))
+            with gzip.open(path) as f:
+                self.assertEqual(f.read(), b'metadata;one;two, three;four;five;')
+            # One writer going wrong doesn't stop the others from being written
+            def fail():
+                raise OSError("Can't start finalizing")
+            writer = termio.GologWriter(os.path.join(temp_dir, 'bad.golog'))
+            writer.write(b'six;')
+            logging.disable(logging.ERROR)
+            try:
+                writer.close(fail)
+                self.assertTrue(writer.closed.wait(5))
+                writer = termio.GologWriter(os.path.join(temp_dir, 'ok.golog'))
+                writer.max_size = 1
+                writer.write(b'seven;')
+                deadline = time.time() + 5
+                while writer.frames and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(writer.frames, [])
+            finally:
+                logging.disable(logging.NOTSET)
+            writer.close()
+            self.assertTrue(writer.closed.wait(5))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_25_seekable_golog(self):
+        "\033[1mRunning seekable golog test\033[0;0m"
+        import termio, golog, tempfile, shutil, gzip, json
+        temp_dir = tempfile.mkdtemp()
+        separator = golog.ENCODED_SEPARATOR
+        metadata = b'1356998400000:' + json.dumps({'version': '2.0'}) # Frame 0
+        frames = [metadata] + [
+            b'%d:line %d\r\n' % (1356998400000 + i * 10, i) + b'x' * 100
+            for i in xrange(1, 2000)]
+        try:
+            path = os.path.join(temp_dir, 'v2.golog')
+            writer = termio.GologWriter(path, metadata + separator)
+            writer.max_size = writer.max_wait = 10**9 # Only flush() writes
+            for frame in frames[1:]:
+                writer.write(frame + separator)
+                writer.flush() # Like a slow trickle of output
+            writer.close()
+            self.assertTrue(writer.closed.wait(5))
+            data = separator.join(frames) + separator
+            with gzip.open(path) as f: # Still just gzip
+                self.assertEqual(f.read(), data)
+            # Flushes don't get blocks of their own (each one costs a few bytes)
+            self.assertTrue(
+                os.path.getsize(path) < 3 * len(golog.compress_block(data)))
+            with golog.Golog(path) as log:
+                self.assertTrue(log.indexed)
+                self.assertEqual(len(log), 2000)
+                self.assertEqual(len(log.index), 5) # Metadata is on its own
+                for number in xrange(1, 4):
+                    block = log.block(number)
+                    self.assertTrue(
+                        len(separator.join(block) + separator) >= 65536)
+                self.assertEqual(log.block(0), [metadata])
+                self.assertEqual(log.frame(1234), frames[1234])
+                self.assertEqual(log.frame(-1), frames[-1])
+                self.assertEqual(log.frame_at(1356998400000 + 12345), 1234)
+                self.assertEqual(list(log.iter_frames(1990)), frames[1990:])
+            self.assertEqual(
+                termio.retrieve_last_frame(path), frames[-1].decode('UTF-8'))
+            # A log that got cut off in the middle of a block (e.g. Gate One
+            # got killed) keeps the complete frames of that block
+            with open(path, 'r+b') as f:
+                f.truncate(golog.Golog(path).index[-1][0] + 2000)
+            with golog.Golog(path) as log:
+                self.assertFalse(log.indexed)
+                salvaged = len(log)
+                self.assertTrue(1500 < salvaged < 2000)
+                self.assertEqual(log.frame(-1), frames[salvaged - 1])
+            writer = termio.GologWriter(path, metadata + separator)
+            writer.write(b'1356998500000:more' + separator)
+            writer.close()
+            self.assertTrue(writer.closed.wait(5))
+            with gzip.open(path) as f:
+                self.assertEqual(f.read(), separator.join(
+                    frames[:salvaged] + [b'1356998500000:more']) + separator)
+            with golog.Golog(path) as log:
+                self.assertTrue(log.indexed)
+                self.assertEqual(len(log), salvaged + 1)
+            # Version 1.0 logs are a single gzip stream
+            path = os.path.join(temp_dir, 'v1.golog')
+            with gzip.open(path, 'wb') as f:
+                f.write(separator.join(frames) + separator)
+            first_frame, distance = termio.retrieve_first_frame(path)
+            self.assertEqual(first_frame, metadata.decode('UTF-8'))
+            self.assertEqual(
+                termio.retrieve_last_frame(path), frames[-1].decode('UTF-8'))
+            with golog.Golog(path) as log:
+                self.assertFalse(log.indexed)
+                self.assertEqual(len(log.index), 1)
+                self.assertEqual(log.frame(1234), frames[1234])
+            # Updating the metadata converts them to version 2.0
+            result = termio.get_or_update_metadata(path, 'user')
+            self.assertEqual(result['version'], golog.VERSION)
+            self.assertEqual(result['end_date'], frames[-1][:13])
+            with golog.Golog(path) as log:
+                self.assertTrue(log.indexed)
+                self.assertEqual(list(log.iter_frames(1)), frames[1:])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_26_image_html(self):
+        "\033[1mRunning image HTML test\033[0;0m"
+        import tempfile
+        opened = []
+        class FakeImage(object): # Stands in for PIL's Image module
+            format = 'PNG'
+            size = (10, 20)
+            @classmethod
+            def open(cls, file_obj):
+                opened.append(file_obj)
+                return cls()
+        orig_image = terminal.Image
+        terminal.Image = FakeImage
+        try:
+            image = terminal.PNGFile(linkpath='/downloads')
+            image.file_obj = tempfile.NamedTemporaryFile(suffix='.png')
+            image.path = image.file_obj.name
+            image.file_obj.write('png data')
+            image.file_obj.flush()
+            html = image.html()
+            self.assertEqual(html,
+                '<img src="data:image/png;base64,cG5nIGRhdGE=" width="10" '
+                'height="20">')
+            self.assertTrue(image.html() is html) # Cached
+            self.assertEqual(len(opened), 1)
+            # Big images get linked to instead of being inlined
+            image.html_cache = None
+            image.max_inline_size = 4
+            self.assertEqual(image.html(),
+                '<img src="/downloads/%s" width="10" height="20">' %
+                os.path.split(image.path)[1])
+            self.assertEqual(len(opened), 2)
+            image.file_obj.close()
+        finally:
+            terminal.Image = orig_image
+
     #def test_2_parsing_performance(self):
         #"\033[1mRunning Performance Test 2\033[0;0m"
         #term = terminal.Terminal(ROWS, COLS)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+#       Copyright 2011 Liftoff Software Corporation
+#
+# For license information see LICENSE.txt
+
+# Meta
+__version__ = '1.1'
+__version_info__ = (1, 1)
+__license__ = "AGPLv3 or Proprietary (see LICENSE.txt)"
+__author__ = 'Dan McDougall <daniel.mcdougall@liftoffsoftware.com>'
+
+__doc__ = """\
+Character width tables for the terminal emulator.  Instead of asking
+:mod:`unicodedata` about every character that gets written to the screen,
+:mod:`terminal` looks characters up in the (much smaller and faster) tables
+below to find out if they're double-width (East Asian Wide or Fullwidth) or
+combining characters (diacritics).
+
+Each table is an :class:`array.array` of `start, end, start, end, ...` code
+point pairs (the end being exclusive) so a character is in the table if
+:func:`bisect.bisect_right` returns an odd number for it.
+
+The tables are generated from :mod:`unicodedata`.  To regenerate them (e.g. for
+a newer version of Python with a newer version of the Unicode database) just
+run this module::
+
+    python widths.py
+"""
+
+from array import array
+from bisect import bisect_right
+
+# <generated> (everything up to </generated> gets replaced by generate())
+# Generated from Unicode 5.2.0
+COMBINING = array('l', [
+    0x300, 0x34f, 0x350, 0x370, 0x483, 0x488, 0x591, 0x5be,
+    0x5bf, 0x5c0, 0x5c1, 0x5c3, 0x5c4, 0x5c6, 0x5c7, 0x5c8,
+    0x610, 0x61b, 0x64b, 0x65f, 0x670, 0x671, 0x6d6, 0x6dd,
+    0x6df, 0x6e5, 0x6e7, 0x6e9, 0x6ea, 0x6ee, 0x711, 0x712,
+    0x730, 0x74b, 0x7eb, 0x7f4, 0x816, 0x81a, 0x81b, 0x824,
+    0x825, 0x828, 0x829, 0x82e, 0x93c, 0x93d, 0x94d, 0x94e,
+    0x951, 0x955, 0x9bc, 0x9bd, 0x9cd, 0x9ce, 0xa3c, 0xa3d,
+    0xa4d, 0xa4e, 0xabc, 0xabd, 0xacd, 0xace, 0xb3c, 0xb3d,
+    0xb4d, 0xb4e, 0xbcd, 0xbce, 0xc4d, 0xc4e, 0xc55, 0xc57,
+    0xcbc, 0xcbd, 0xccd, 0xcce, 0xd4d, 0xd4e, 0xdca, 0xdcb,
+    0xe38, 0xe3b, 0xe48, 0xe4c, 0xeb8, 0xeba, 0xec8, 0xecc,
+    0xf18, 0xf1a, 0xf35, 0xf36, 0xf37, 0xf38, 0xf39, 0xf3a,
+    0xf71, 0xf73, 0xf74, 0xf75, 0xf7a, 0xf7e, 0xf80, 0xf81,
+    0xf82, 0xf85, 0xf86, 0xf88, 0xfc6, 0xfc7, 0x1037, 0x1038,
+    0x1039, 0x103b, 0x108d, 0x108e, 0x135f, 0x1360, 0x1714, 0x1715,
+    0x1734, 0x1735, 0x17d2, 0x17d3, 0x17dd, 0x17de, 0x18a9, 0x18aa,
+    0x1939, 0x193c, 0x1a17, 0x1a19, 0x1a60, 0x1a61, 0x1a75, 0x1a7d,
+    0x1a7f, 0x1a80, 0x1b34, 0x1b35, 0x1b44, 0x1b45, 0x1b6b, 0x1b74,
+    0x1baa, 0x1bab, 0x1c37, 0x1c38, 0x1cd0, 0x1cd3, 0x1cd4, 0x1ce1,
+    0x1ce2, 0x1ce9, 0x1ced, 0x1cee, 0x1dc0, 0x1de7, 0x1dfd, 0x1e00,
+    0x20d0, 0x20dd, 0x20e1, 0x20e2, 0x20e5, 0x20f1, 0x2cef, 0x2cf2,
+    0x2de0, 0x2e00, 0x302a, 0x3030, 0x3099, 0x309b, 0xa66f, 0xa670,
+    0xa67c, 0xa67e, 0xa6f0, 0xa6f2, 0xa806, 0xa807, 0xa8c4, 0xa8c5,
+    0xa8e0, 0xa8f2, 0xa92b, 0xa92e, 0xa953, 0xa954, 0xa9b3, 0xa9b4,
+    0xa9c0, 0xa9c1, 0xaab0, 0xaab1, 0xaab2, 0xaab5, 0xaab7, 0xaab9,
+    0xaabe, 0xaac0, 0xaac1, 0xaac2, 0xabed, 0xabee, 0xfb1e, 0xfb1f,
+    0xfe20, 0xfe27, 0x101fd, 0x101fe, 0x10a0d, 0x10a0e, 0x10a0f, 0x10a10,
+    0x10a38, 0x10a3b, 0x10a3f, 0x10a40, 0x110b9, 0x110bb, 0x1d165, 0x1d16a,
+    0x1d16d, 0x1d173, 0x1d17b, 0x1d183, 0x1d185, 0x1d18c, 0x1d1aa, 0x1d1ae,
+    0x1d242, 0x1d245,
+])
+WIDE = array('l', [
+    0x1100, 0x1160, 0x11a3, 0x11a8, 0x11fa, 0x1200, 0x2329, 0x232b,
+    0x2e80, 0x2e9a, 0x2e9b, 0x2ef4, 0x2f00, 0x2fd6, 0x2ff0, 0x2ffc,
+    0x3000, 0x303f, 0x3041, 0x3097, 0x3099, 0x3100, 0x3105, 0x312e,
+    0x3131, 0x318f, 0x3190, 0x31b8, 0x31c0, 0x31e4, 0x31f0, 0x321f,
+    0x3220, 0x3248, 0x3250, 0x32ff, 0x3300, 0x4dc0, 0x4e00, 0xa48d,
+    0xa490, 0xa4c7, 0xa960, 0xa97d, 0xac00, 0xd7a4, 0xd7b0, 0xd7c7,
+    0xd7cb, 0xd7fc, 0xf900, 0xfb00, 0xfe10, 0xfe1a, 0xfe30, 0xfe53,
+    0xfe54, 0xfe67, 0xfe68, 0xfe6c, 0xff01, 0xff61, 0xffe0, 0xffe7,
+    0x1f200, 0x1f201, 0x1f210, 0x1f232, 0x1f240, 0x1f249, 0x20000, 0x3fffe,
+])
+# Everything below this code point is single-width
+FIRST = 0x300
+# </generated>
+
+def is_combining(char):
+    """
+    Returns True if *char* is a combining character (e.g. an accent that
+    modifies the character before it).
+    """
+    return bisect_right(COMBINING, ord(char)) & 1 == 1
+
+def is_wide(char):
+    """
+    Returns True if *char* takes up two cells on the screen (e.g. CJK).
+    """
+    return bisect_right(WIDE, ord(char)) & 1 == 1
+
+def char_width(char):
+    """
+    Returns the number of cells *char* will occupy on the screen:  0 for
+    combining characters, 2 for double-width characters, and 1 for everything
+    else.
+    """
+    charnum = ord(char)
+    if charnum < FIRST:
+        return 1 # Nothing interesting below this point (e.g. ASCII)
+    if bisect_right(COMBINING, charnum) & 1:
+        return 0
+    if bisect_right(WIDE, charnum) & 1:
+        return 2
+    return 1
+
+# Unassigned code points in these blocks are wide (see UAX #11)
+CJK_BLOCKS = (
+    (0x3400, 0x4dbf), (0x4e00, 0x9fff), (0xf900, 0xfaff), (0x20000, 0x3fffd))
+
+def _ranges(test):
+    """
+    Returns the code points (up to `sys.maxunicode`) for which *test* returns
+    True as a list of `start, end` pairs.
+    """
+    import sys
+    ranges = []
+    start = None
+    for charnum in xrange(sys.maxunicode + 1):
+        if test(unichr(charnum)):
+            if start is None:
+                start = charnum
+        elif start is not None:
+            ranges.extend((start, charnum))
+            start = None
+    if start is not None:
+        ranges.extend((start, sys.maxunicode + 1))
+    return ranges
+
+def _format_table(name, ranges):
+    """
+    Returns the Python source for a table called *name* containing *ranges*.
+    """
+    lines = ["%s = array('l', [" % name]
+    pairs = ["0x%x, 0x%x," % (ranges[i], ranges[i+1])
+        for i in xrange(0, len(ranges), 2)]
+    for i in xrange(0, len(pairs), 4):
+        lines.append("    " + " ".join(pairs[i:i+4]))
+    lines.append("])")
+    return "\n".join(lines)
+
+def generate(path=__file__):
+    """
+    Regenerates the tables in this module (at *path*) using the
+    :mod:`unicodedata` database of the running Python.
+    """
+    import unicodedata
+    if path.endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    def wide_char(char):
+        if unicodedata.category(char) == 'Cn': # Unassigned
+            # Only the CJK blocks default to wide (Python 2 says everything
+            # unassigned is 'F')
+            return any(start <= ord(char) <= end for start, end in CJK_BLOCKS)
+        return unicodedata.east_asian_width(char) in ('W', 'F')
+    combining = _ranges(unicodedata.combining)
+    wide = _ranges(wide_char)
+    tables = [
+        "# Generated from Unicode %s" % unicodedata.unidata_version,
+        _format_table('COMBINING', combining),
+        _format_table('WIDE', wide),
+        "# Everything below this code point is single-width",
+        "FIRST = 0x%x" % min(combining[0], wide[0]),
+    ]
+    with open(path) as f:
+        source = f.read()
+    begin = source.index('# <generated>')
+    begin = source.index('\n', begin) + 1
+    end = source.index('# </generated>')
+    with open(path, 'w') as f:
+        f.write(source[:begin] + "\n".join(tables) + "\n" + source[end:])
+
+if __name__ == "__main__":
+    generate()
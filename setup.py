@@ -81,13 +81,16 @@ def walk_data_files(path, install_path=prefix):
 gateone_files=[ # Start with the basics...
     (os.path.join(prefix, 'gateone'), [
         os.path.join(setup_dir, 'gateone', 'auth.py'),
+        os.path.join(setup_dir, 'gateone', 'bench.py'),
         os.path.join(setup_dir, 'gateone', 'gateone.py'),
+        os.path.join(setup_dir, 'gateone', 'golog.py'),
         os.path.join(setup_dir, 'gateone', 'gopam.py'),
         os.path.join(setup_dir, 'gateone', 'logviewer.py'),
         os.path.join(setup_dir, 'gateone', 'sso.py'),
         os.path.join(setup_dir, 'gateone', 'terminal.py'),
         os.path.join(setup_dir, 'gateone', 'termio.py'),
         os.path.join(setup_dir, 'gateone', 'utils.py'),
+        os.path.join(setup_dir, 'gateone', 'widths.py'),
         os.path.join(setup_dir, 'gateone', 'authpam.py'),
         os.path.join(setup_dir, 'gateone', 'remote_syslog.py'),
         os.path.join(setup_dir, 'README.rst'),